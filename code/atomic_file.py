@@ -0,0 +1,78 @@
+# atomic_file.py
+"""
+状态文件的原子写入与读改写互斥
+写入时先写到同目录下用 tempfile.mkstemp 创建的临时文件，再用 os.replace 覆盖目标文件，
+并发写入的任务各用各的临时文件，读取方永远不会读到写了一半的内容；
+读改写期间用 profile_lock 的文件锁（<文件>.lock）互斥，多个进程同时更新也不会丢失彼此的修改
+"""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from profile_lock import ProfileLock
+
+# 等待其他进程释放文件锁时的重试间隔（秒），读改写通常只需几毫秒
+LOCK_POLL_INTERVAL = 0.05
+
+
+def write_text(path, content, mode=0o644):
+    """
+    以原子替换的方式写出文本文件
+
+    Args:
+        path (str): 目标文件路径
+        content (str): 文件内容
+        mode (int): 文件权限
+
+    Raises:
+        OSError: 写入失败（目标文件保持原样）
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_json(path, data, mode=0o644, **kwargs):
+    """
+    以原子替换的方式写出JSON文件
+
+    Args:
+        path (str): 目标文件路径
+        data: 要保存的数据
+        mode (int): 文件权限
+        **kwargs: 传给 json.dumps 的参数（如 indent、ensure_ascii）
+
+    Raises:
+        OSError: 写入失败（目标文件保持原样）
+    """
+    write_text(path, json.dumps(data, **kwargs), mode)
+
+
+@contextmanager
+def locked(path, timeout=None):
+    """
+    在读改写一个状态文件期间持有它的锁（进程内 + 跨进程），锁不可重入
+
+    Args:
+        path (str): 状态文件路径，锁文件为 <path>.lock
+        timeout (float): 最长等待秒数，None表示一直等待
+
+    Raises:
+        TimeoutError: 超时仍未获得锁
+    """
+    lock = ProfileLock(path)
+    if not lock.acquire(timeout=timeout, poll_interval=LOCK_POLL_INTERVAL):
+        raise TimeoutError(f"等待文件锁超时: {lock.lock_path}")
+    try:
+        yield
+    finally:
+        lock.release()
@@ -0,0 +1,192 @@
+# bench_engines.py
+"""
+对比HTTP接口引擎与Playwright浏览器引擎的资源开销
+
+对本地Kimi替身服务器（mock_kimi_server.py）分别用两种引擎完成一次完整问答，
+每次都在独立的子进程中冷启动，记录：
+    - 耗时：从子进程启动到拿到完整回复
+    - 内存峰值：子进程及其全部后代进程（浏览器、驱动）的常驻内存之和（读取 /proc，仅Linux）
+    - CPU时间：子进程及其后代进程的用户态+内核态CPU时间
+
+    python benchmarks/bench_engines.py
+    python benchmarks/bench_engines.py --engines http --runs 5 --json result.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+
+TOKEN = 'bench-access-token'
+
+
+def _children_map():
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError):
+            continue
+    return children
+
+
+def _rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def tree_rss_kb(root_pid):
+    """
+    Returns:
+        int: 进程及其全部后代进程的常驻内存之和（KB）
+    """
+    children = _children_map()
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += _rss_kb(pid)
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class RssSampler(threading.Thread):
+    """定时采样进程树的内存，记录峰值"""
+
+    def __init__(self, pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak_kb = max(self.peak_kb, tree_rss_kb(self.pid))
+            self.stopped.wait(self.interval)
+
+
+def run_child(engine, base_url, state_path):
+    """在子进程中用指定引擎完成一次问答，把结果以JSON写到标准输出"""
+    import config
+    config.LOG_LEVEL = 'WARNING'
+    config.LOG_TO_FILE = False
+    from logger import setup_logger_from_config
+    setup_logger_from_config(config)
+
+    if engine == 'http':
+        import kimi_api
+        client = kimi_api.KimiApiClient.from_storage_state(state_path, base_url=base_url)
+        response = client.ask("基准测试", target_chat_name='email_return')
+    else:
+        import kimi_handler
+        kimi_handler.KIMI_URL = base_url
+        config.CAPTURE_MODE = 'network' if engine == 'browser-network' else 'dom'
+        with tempfile.TemporaryDirectory() as user_data_dir:
+            session = kimi_handler.KimiSession(user_data_dir, headless=True)
+            response = kimi_handler.get_kimi_response("基准测试", session=session, target_chat_name='email_return')
+    if "失败" in response or "无法获取" in response:
+        raise SystemExit(response)
+    print(json.dumps({'length': len(response)}))
+
+
+def measure(engine, base_url, state_path):
+    """
+    Returns:
+        dict: 一次冷启动问答的耗时、内存峰值和CPU时间
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--child', engine, '--base-url', base_url, '--state', state_path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=CODE_DIR
+    )
+    sampler = RssSampler(process.pid)
+    sampler.start()
+    stdout, stderr = process.communicate()
+    duration = time.perf_counter() - start_time
+    sampler.stopped.set()
+    sampler.join()
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    result = {
+        'engine': engine,
+        'ok': process.returncode == 0,
+        'seconds': round(duration, 3),
+        'peak_rss_mb': round(sampler.peak_kb / 1024, 1),
+        'cpu_seconds': round((after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime), 3),
+    }
+    if process.returncode != 0:
+        result['error'] = stderr.decode('utf-8', errors='replace').strip()[:200]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比HTTP接口引擎与浏览器引擎的耗时和内存")
+    parser.add_argument("--engines", nargs="+", default=['http', 'browser-network', 'browser-dom'],
+                        choices=['http', 'browser-network', 'browser-dom'])
+    parser.add_argument("--runs", type=int, default=3, help="每个引擎的运行次数")
+    parser.add_argument("--json", help="把全部结果写入JSON文件")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--state", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.base_url, args.state)
+        return 0
+
+    from mock_kimi_server import MockKimiState, start_in_thread
+
+    server = start_in_thread(state=MockKimiState(chunk_delay=0.005, token=TOKEN))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        state_path = os.path.join(tmp_dir, 'state.json')
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump({'cookies': [], 'origins': [{'origin': server.base_url.rstrip('/'),
+                                                   'localStorage': [{'name': 'access_token', 'value': TOKEN}]}]}, f)
+        try:
+            for engine in args.engines:
+                for _ in range(args.runs):
+                    results.append(measure(engine, server.base_url, state_path))
+        finally:
+            server.shutdown()
+
+    print(f"{'引擎':<18}{'成功':>6}{'耗时中位数(秒)':>16}{'内存峰值(MB)':>14}{'CPU(秒)':>10}")
+    for engine in args.engines:
+        runs = [r for r in results if r['engine'] == engine]
+        ok_runs = [r for r in runs if r['ok']]
+        if not ok_runs:
+            print(f"{engine:<18}{0:>6}  失败: {runs[0].get('error', '').splitlines()[0]}")
+            continue
+        seconds = sorted(r['seconds'] for r in ok_runs)[len(ok_runs) // 2]
+        peak = max(r['peak_rss_mb'] for r in ok_runs)
+        cpu = sum(r['cpu_seconds'] for r in ok_runs) / len(ok_runs)
+        print(f"{engine:<18}{len(ok_runs):>6}{seconds:>16.2f}{peak:>14.1f}{cpu:>10.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+# bench_render.py
+"""
+邮件渲染热路径的基准测试：format_text_to_html → generate_email_html → MIME报文构建
+
+用随机生成、结构与真实回复一致的Kimi回复（①–⑤ 问题、领域标注、回答与来源、金句、延伸、关键词行），
+模拟给 1 到数千个收件人各渲染一封个性化邮件，分别统计三个阶段的耗时。
+计时方式与 pytest-benchmark 相同：先预热，再按单轮耗时自动决定轮数，报告中位数、最小值和标准差
+
+基线保存在 benchmarks/baselines/render.json，每个用例每个阶段记录「每封邮件耗时」的最小值
+（最小值受机器上其他负载的干扰最小）；
+比较时超出基线 --threshold（默认20%）视为性能回退，退出码为1。
+单轮耗时不到 --min-gate-ms（默认5ms）的用例（如1个收件人）计时抖动就可能超过20%，只报告不判定；
+基线不是在当前机器和Python版本上保存的也只报告不判定
+
+    python benchmarks/bench_render.py                          # 运行并与基线比较
+    python benchmarks/bench_render.py --recipients 1 100       # 只运行指定规模
+    python benchmarks/bench_render.py --save-baseline          # 更新基线
+    python benchmarks/bench_render.py --profile cprofile       # 附带每个阶段的cProfile热点
+    python benchmarks/bench_render.py --profile tracemalloc    # 附带每个阶段的内存分配
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'render.json')
+
+DEFAULT_RECIPIENTS = (1, 100, 1000)
+
+DOMAINS = ('政治', '经济', '民生', '历史', '文化', '市场', '科技', '环境', '体育', '娱乐')
+
+SOURCES = ('国家统计局官网', '工信部官网', '新华社', '财新网', '澎湃新闻', '路透社', '第一财经', '人民日报')
+
+# 基线中单轮耗时（每封耗时×收件人数）低于此值的用例不参与回退判定（毫秒）
+DEFAULT_MIN_GATE_MS = 5.0
+
+# 生成回答用的字表，含常见标点和需要HTML转义的字符
+_WORDS = ('数据显示', '同比增长', '业内人士认为', '产业链', '新能源', '出口', '消费', '政策', '地方特色', '竞争力',
+          '市场份额', '技术突破', '投资', '就业', '文旅', '供应链', '“新质生产力”', 'AI', 'R&D', '<1%', '约12.5%')
+
+
+def make_reply(seed, items=5, answer_chars=200):
+    """
+    生成一条结构与真实回复一致的Kimi回复
+
+    Args:
+        seed (int): 随机种子，相同种子生成相同内容
+        items (int): 问题数量
+        answer_chars (int): 每个回答的大致字数
+
+    Returns:
+        str: 回复文本
+    """
+    rng = random.Random(seed)
+    marks = '①②③④⑤⑥⑦⑧⑨⑩'
+    blocks = ["以下是本次为你精选的热点话题："]
+    keywords = []
+    for index in range(items):
+        keyword = ''.join(rng.sample(_WORDS[:16], 2))
+        keywords.append(keyword)
+        answer = ''
+        while len(answer) < answer_chars:
+            answer += '，'.join(rng.choice(_WORDS) for _ in range(rng.randint(2, 5))) + '。'
+        day = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        blocks.append('\n'.join([
+            f"{marks[index]} 问题：{keyword}的最新进展意味着什么？（{rng.choice(DOMAINS)}）",
+            "• 回答：",
+            answer,
+            f"（一级：{rng.choice(SOURCES)} {day}；二级：{rng.choice(SOURCES)} {day}）",
+            rng.choice(('▲', '▼', '')),
+            f"• 金句：{rng.choice(_WORDS)}不是终点，而是**新的起点**。",
+            f"• 延伸：{keyword}会如何影响普通人的生活？",
+        ]).replace('\n\n', '\n'))
+    blocks.append("本次话题关键词：" + ' '.join(f"[{keyword}]" for keyword in keywords))
+    return '\n\n'.join(blocks)
+
+
+class BenchmarkResult:
+    """一个用例一个阶段的计时结果（秒）"""
+
+    def __init__(self, name, stage, units, timings):
+        self.name = name
+        self.stage = stage
+        self.units = units
+        self.timings = timings
+
+    @property
+    def median(self):
+        return statistics.median(self.timings)
+
+    @property
+    def per_unit(self):
+        """每封邮件的最短耗时，用于与基线比较"""
+        return min(self.timings) / self.units
+
+    def row(self):
+        stddev = statistics.stdev(self.timings) if len(self.timings) > 1 else 0.0
+        return (f"{self.name:<16}{self.stage:<8}{self.median * 1000:>12.2f}{min(self.timings) * 1000:>12.2f}"
+                f"{stddev * 1000:>10.2f}{self.per_unit * 1e6:>14.1f}{len(self.timings):>7}")
+
+
+class Benchmark:
+    """
+    与 pytest-benchmark 的 benchmark fixture 用法相同的计时器：benchmark(func, *args) 返回 func 的结果
+
+    先运行 warmup 次，再按单轮耗时决定轮数，使总计时约为 max_time 秒（至少 min_rounds 轮）
+    """
+
+    def __init__(self, name, stage, units, min_rounds=3, max_rounds=100, max_time=1.0, warmup=1):
+        self.name = name
+        self.stage = stage
+        self.units = units
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self.max_time = max_time
+        self.warmup = warmup
+        self.result = None
+
+    def __call__(self, func, *args):
+        for _ in range(self.warmup):
+            value = func(*args)
+        start_time = time.perf_counter()
+        value = func(*args)
+        timings = [time.perf_counter() - start_time]
+        rounds = max(self.min_rounds, min(self.max_rounds, int(self.max_time / max(timings[0], 1e-9))))
+        for _ in range(rounds - 1):
+            start_time = time.perf_counter()
+            value = func(*args)
+            timings.append(time.perf_counter() - start_time)
+        self.result = BenchmarkResult(self.name, self.stage, self.units, timings)
+        return value
+
+
+def stage_funcs():
+    """
+    Returns:
+        dict: {阶段名: 处理一批邮件的函数}，每个函数接收上一阶段的输出列表
+    """
+    from html_formatter import format_text_to_html, generate_email_html
+    from mime_message import build_message
+
+    def mime(pages):
+        return [build_message("今日咨询推送", page, "sender@example.com", [f"reader{i}@example.com"], text=reply)
+                for i, (reply, page) in enumerate(pages)]
+
+    return {
+        'format': lambda replies: [(reply, format_text_to_html(reply)) for reply in replies],
+        'page': lambda formatted: [(reply, generate_email_html(content)) for reply, content in formatted],
+        'mime': mime,
+    }
+
+
+def run_case(recipients, max_time):
+    """
+    给 recipients 个收件人各渲染一封邮件，分阶段计时
+
+    Returns:
+        tuple[list[BenchmarkResult], list]: (各阶段结果, 各阶段的输入)
+    """
+    name = f"recipients={recipients}"
+    data = [make_reply(seed) for seed in range(recipients)]
+    results, inputs = [], []
+    for stage, func in stage_funcs().items():
+        benchmark = Benchmark(name, stage, recipients, max_time=max_time)
+        inputs.append((stage, func, data))
+        data = benchmark(func, data)
+        results.append(benchmark.result)
+    return results, inputs
+
+
+def profile_stages(inputs, mode, top=8):
+    """
+    在计时之外再把每个阶段单独运行一次，报告cProfile热点或tracemalloc内存分配
+
+    Args:
+        inputs (list): run_case 返回的各阶段输入
+        mode (str): "cprofile" 或 "tracemalloc"
+        top (int): 每个阶段列出的条目数
+    """
+    for stage, func, data in inputs:
+        print(f"\n--- {stage} ({mode}) ---")
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.runcall(func, data)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+            print('\n'.join(line for line in stream.getvalue().splitlines()[4:] if line.strip()))
+        else:
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot().filter_traces(ignore)
+            start_size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            # 结果在快照之后才释放，计入保留的内存
+            output = func(data)
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            tracemalloc.stop()
+            print(f"保留 {(current - start_size) / 1024:.1f}KB，峰值 {(peak - start_size) / 1024:.1f}KB")
+            for stat in after.compare_to(before, 'lineno')[:top]:
+                print(f"  {stat}")
+            print(f"  输出 {len(output)} 项")
+
+
+def load_baseline(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def machine():
+    """当前机器的描述，基线只在同一描述下判定回退"""
+    return f"{platform.system()} {platform.machine()} / Python {platform.python_version()}"
+
+
+def save_baseline(path, results):
+    baseline = {
+        'machine': machine(),
+        'saved_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'cases': {},
+    }
+    for result in results:
+        baseline['cases'].setdefault(result.name, {})[result.stage] = round(result.per_unit, 9)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+    print(f"\n已保存基线: {path}")
+
+
+def compare(results, baseline, threshold, min_gate=DEFAULT_MIN_GATE_MS / 1000):
+    """
+    Args:
+        results (list[BenchmarkResult]): 本次结果
+        baseline (dict): load_baseline 读取的基线
+        threshold (float): 超出基线多少视为回退
+        min_gate (float): 基线单轮耗时（秒）低于此值的用例只报告不判定
+
+    Returns:
+        list[str]: 超出基线 threshold 的用例说明；基线来自其他机器时始终为空
+    """
+    regressions = []
+    print(f"\n与基线比较（{baseline.get('machine')}，{baseline.get('saved_at')}），阈值 +{threshold:.0%}：")
+    gated = baseline.get('machine') == machine()
+    if not gated:
+        print(f"  ⚠️ 基线不是在当前机器（{machine()}）上保存的，只报告不判定回退")
+    for result in results:
+        expected = baseline['cases'].get(result.name, {}).get(result.stage)
+        if not expected:
+            continue
+        change = result.per_unit / expected - 1
+        if not gated:
+            flag = ''
+        elif expected * result.units < min_gate:
+            flag = '  （耗时过短，不判定）'
+        else:
+            flag = '  ⚠️ 回退' if change > threshold else ''
+        print(f"  {result.name:<16}{result.stage:<8}{expected * 1e6:>10.1f} → {result.per_unit * 1e6:>8.1f} µs"
+              f"  ({change:+.1%}){flag}")
+        if flag.endswith('回退'):
+            regressions.append(f"{result.name} {result.stage} {change:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件渲染热路径基准测试")
+    parser.add_argument("--recipients", nargs="+", type=int, default=list(DEFAULT_RECIPIENTS),
+                        help="收件人数量（每人一封个性化邮件）")
+    parser.add_argument("--max-time", type=float, default=1.0, help="每个阶段大约计时多少秒")
+    parser.add_argument("--profile", choices=['cprofile', 'tracemalloc'], help="附带每个阶段的性能剖析")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="用本次结果更新基线")
+    parser.add_argument("--threshold", type=float, default=0.2, help="超出基线多少视为回退（0.2表示20%%）")
+    parser.add_argument("--min-gate-ms", type=float, default=DEFAULT_MIN_GATE_MS,
+                        help="基线单轮耗时低于多少毫秒的用例只报告不判定")
+    args = parser.parse_args()
+
+    import config
+    config.LOG_LEVEL = 'WARNING'
+    config.LOG_TO_FILE = False
+    from logger import setup_logger_from_config
+    setup_logger_from_config(config)
+
+    print(f"{'用例':<16}{'阶段':<8}{'中位数(ms)':>12}{'最小(ms)':>12}{'标准差':>10}{'每封最短(µs)':>12}{'轮数':>7}")
+    results = []
+    for recipients in args.recipients:
+        case_results, inputs = run_case(recipients, args.max_time)
+        for result in case_results:
+            print(result.row())
+        results.extend(case_results)
+        if args.profile:
+            profile_stages(inputs, args.profile)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        return 0
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"\n没有基线文件 {args.baseline}，使用 --save-baseline 保存")
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.min_gate_ms / 1000)
+    if regressions:
+        print(f"\n性能回退: {'; '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# check_import_time.py
+"""
+导入耗时预算检查
+用 python -X importtime 测量入口模块的导入耗时，防止重量级依赖
+（Playwright、yagmail等）再次被无意中放到模块顶层导入。
+
+用法：
+    python check_import_time.py              # 检查默认的入口模块
+    python check_import_time.py --budget-ms 300
+超出预算或导入了禁止的模块时，以非零退出码结束。
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# 不涉及浏览器的入口模块，以及它们不应在导入时加载的模块
+DEFAULT_TARGETS = ['main', 'mailer', 'prefetch', 'html_formatter']
+FORBIDDEN_MODULES = ['playwright', 'yagmail', 'kimi_handler']
+
+# 默认的导入耗时预算（毫秒，累计耗时）
+DEFAULT_BUDGET_MS = 250
+
+_LINE_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure(module):
+    """
+    在全新的解释器中导入模块并解析 -X importtime 的输出
+
+    Args:
+        module (str): 模块名
+
+    Returns:
+        tuple[float, set[str]]: (该模块的累计导入耗时毫秒数, 导入过程中加载的全部模块)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+    cumulative_ms = 0.0
+    imported = set()
+    for line in result.stderr.splitlines():
+        match = _LINE_PATTERN.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        imported.add(name)
+        if name == module and len(match.group(3)) == 1:  # 顶层导入只缩进一个空格
+            cumulative_ms = int(match.group(2)) / 1000
+    return cumulative_ms, imported
+
+
+def check(targets, budget_ms):
+    """
+    Returns:
+        bool: 全部模块都在预算内且没有导入禁止的模块
+    """
+    ok = True
+    for module in targets:
+        cumulative_ms, imported = measure(module)
+        forbidden = sorted(
+            name for name in imported
+            if any(name == bad or name.startswith(bad + '.') for bad in FORBIDDEN_MODULES)
+        )
+        status = "OK"
+        if forbidden:
+            status = f"导入了禁止的模块: {', '.join(forbidden[:5])}"
+            ok = False
+        elif cumulative_ms > budget_ms:
+            status = f"超出预算 {budget_ms:.0f}ms"
+            ok = False
+        print(f"{module:<16} {cumulative_ms:8.1f} ms  {status}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查入口模块的导入耗时")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_TARGETS, help="要检查的模块")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="每个模块的累计导入耗时预算")
+    args = parser.parse_args()
+    sys.exit(0 if check(args.modules, args.budget_ms) else 1)
@@ -0,0 +1,148 @@
+# deadline.py
+"""
+运行时间预算模块
+一次运行（获取内容 → 渲染 → 发送邮件）共用一个截止时间，
+每次等待和网络请求的超时都从剩余预算中扣除，预算用完或被取消时协作式地停止剩余工作，
+定时调度据此保证每次运行在自己的时间槽内结束
+"""
+
+import threading
+import time
+import config
+
+
+class DeadlineExceeded(Exception):
+    """运行时间预算已用完，或运行已被取消"""
+
+
+class Deadline:
+    """
+    一次运行的截止时间，可跨线程共享
+
+    seconds 为None表示不限时：timeout 原样返回默认值，check 只检查是否被取消。
+    reserve 派生的子预算提前结束，与父预算共享取消状态。
+    """
+
+    def __init__(self, seconds=None, parent=None):
+        """
+        Args:
+            seconds (float): 从现在起可用的秒数，为None时不限时
+            parent (Deadline): 父预算，子预算不会晚于父预算结束
+        """
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self.parent = parent
+        if parent is not None and parent.expires_at is not None:
+            if self.expires_at is None or parent.expires_at < self.expires_at:
+                self.expires_at = parent.expires_at
+        # 取消状态在父子预算间共享：{'event': 取消事件, 'reason': 取消原因}
+        self._cancel_state = {'event': threading.Event(), 'reason': None} if parent is None else parent._cancel_state
+
+    @classmethod
+    def from_config(cls):
+        """
+        Returns:
+            Deadline: 按 config.RUN_DEADLINE_SECONDS 创建的运行预算
+        """
+        return cls(getattr(config, 'RUN_DEADLINE_SECONDS', None))
+
+    @property
+    def limited(self):
+        return self.expires_at is not None
+
+    def remaining(self):
+        """
+        Returns:
+            float: 剩余秒数（不小于0），不限时为 float('inf')
+        """
+        if self.cancelled:
+            return 0.0
+        if self.expires_at is None:
+            return float('inf')
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def cancelled(self):
+        return self._cancel_state['event'].is_set()
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def cancel(self, reason="运行已被取消"):
+        """取消运行：所有共享该预算的等待都会尽快结束"""
+        self._cancel_state['reason'] = reason
+        self._cancel_state['event'].set()
+
+    def check(self, step=""):
+        """
+        Args:
+            step (str): 当前步骤，用于错误信息
+
+        Raises:
+            DeadlineExceeded: 预算已用完或已被取消
+        """
+        suffix = f"，中止{step}" if step else ""
+        if self.cancelled:
+            raise DeadlineExceeded(f"{self._cancel_state['reason']}{suffix}")
+        if self.expired:
+            raise DeadlineExceeded(f"超出运行时间预算{suffix}")
+
+    def timeout(self, default=None, step=""):
+        """
+        从剩余预算中取出一次等待的超时
+
+        Args:
+            default (float): 原本的超时秒数，为None表示不限时
+            step (str): 当前步骤，用于错误信息
+
+        Returns:
+            float: min(default, 剩余秒数)，两者都不限时为None
+
+        Raises:
+            DeadlineExceeded: 预算已用完或已被取消
+        """
+        self.check(step)
+        if self.expires_at is None:
+            return default
+        remaining = self.remaining()
+        return remaining if default is None else min(default, remaining)
+
+    def timeout_ms(self, default_ms, step=""):
+        """与 timeout 相同，单位为毫秒（Playwright的超时参数）"""
+        return self.timeout(default_ms / 1000, step) * 1000
+
+    def sleep(self, seconds):
+        """
+        等待指定秒数，预算用完或被取消时提前返回
+
+        Returns:
+            bool: 是否完整等待了指定时间
+        """
+        wait_seconds = min(seconds, self.remaining())
+        if self._cancel_state['event'].wait(wait_seconds):
+            return False
+        return wait_seconds >= seconds
+
+    def reserve(self, seconds):
+        """
+        为后续步骤预留时间
+
+        Args:
+            seconds (float): 预留给后续步骤（如发送邮件）的秒数
+
+        Returns:
+            Deadline: 比本预算提前 seconds 秒结束的子预算
+        """
+        if self.expires_at is None:
+            return Deadline(parent=self)
+        child = Deadline(parent=self)
+        child.expires_at = self.expires_at - seconds
+        return child
+
+
+def ensure(deadline):
+    """
+    Returns:
+        Deadline: 传入的预算，为None时返回一个不限时的预算
+    """
+    return deadline if deadline is not None else Deadline()
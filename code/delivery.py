@@ -0,0 +1,102 @@
+# delivery.py
+"""
+尽早交付模块
+回复提取完成后立即在后台线程中渲染并发送邮件，修改对话标题、关闭浏览器等收尾工作同时进行，
+收尾工作失败只记录日志，不会推迟或阻止邮件送达。
+
+Playwright同步接口只能在创建它的线程中使用，所以浏览器收尾工作留在原线程，发送邮件放到后台线程。
+"""
+
+import threading
+import time
+import metrics
+from logger import get_logger
+
+logger = get_logger()
+
+
+class EarlyDelivery:
+    """
+    一次任务的邮件交付
+
+    把 start 作为获取回复时的回调传入，回复一提取出来就开始发送；
+    获取回复的函数返回后（收尾工作已完成）调用 finish 等待发送结束。
+    回调没有被调用（例如获取失败）时，finish 在当前线程中发送。
+
+    获取回复的函数可以同时传入生成期间已格式化好的HTML（rendered），deliver 直接使用，不再重新格式化。
+
+    deliver 在 send_email 成功返回后立即调用 mark_sent 记录送达时间，
+    之后的汇总、归档等步骤不计入邮件送达耗时；发送失败时不调用。
+    """
+
+    def __init__(self, deliver, start_time=None):
+        """
+        Args:
+            deliver (callable): 接收回复和已格式化的HTML（rendered，可能为None）、渲染并发送邮件的函数，
+                返回运行结果（用于指标标签），邮件发出后调用 mark_sent
+            start_time (float): 任务开始时间（time.time()），默认为现在
+        """
+        self._deliver = deliver
+        self.start_time = start_time or time.time()
+        self.delivered_at = None
+        self._thread = None
+        self._result = None
+        self._error = None
+
+    def start(self, response, rendered=None):
+        """
+        在后台线程中开始发送，重复调用时忽略
+
+        Args:
+            response: 获取到的回复（单个回复为字符串，多栏目为 {栏目: 回复}）
+            rendered: 生成期间已格式化好的HTML（单个回复为字符串，多栏目为 {栏目: HTML}），没有时为None
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(response, rendered), name="early-delivery",
+                                        daemon=True)
+        self._thread.start()
+
+    def mark_sent(self):
+        """邮件发出后由 deliver 调用，记录送达时间"""
+        self.delivered_at = time.time()
+        logger.info(f"邮件已发出，距任务开始 {self.delivered_at - self.start_time:.1f} 秒")
+
+    def _run(self, response, rendered):
+        try:
+            self._result = self._send(response, rendered)
+        except BaseException as e:
+            self._error = e
+
+    def _send(self, response, rendered=None):
+        result = self._deliver(response, rendered)
+        if self.delivered_at is not None:
+            metrics.TIME_TO_INBOX_SECONDS.observe(self.delivered_at - self.start_time, result=result)
+        return result
+
+    def finish(self, response):
+        """
+        等待发送结束（尚未开始时在当前线程中发送），并记录任务总耗时
+
+        Args:
+            response (str): 获取到的回复，只在尚未开始发送时使用
+
+        Returns:
+            str: deliver 返回的运行结果
+        """
+        if self._thread is None:
+            result = self._send(response)
+        else:
+            self._thread.join()
+            if self._error is not None:
+                raise self._error
+            result = self._result
+
+        job_seconds = time.time() - self.start_time
+        metrics.JOB_SECONDS.observe(job_seconds, result=result)
+        if self.delivered_at is not None:
+            logger.info(f"任务执行完毕，邮件送达用时 {self.delivered_at - self.start_time:.1f} 秒，"
+                        f"总用时 {job_seconds:.1f} 秒")
+        else:
+            logger.info(f"任务执行完毕，总用时 {job_seconds:.1f} 秒")
+        return result
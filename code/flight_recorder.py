@@ -0,0 +1,238 @@
+# flight_recorder.py
+"""
+故障记录模块
+运行期间在内存中滚动记录页面事件、控制台输出和各阶段耗时；
+运行失败或明显变慢时，把截图、页面DOM、事件记录（以及可选的Playwright trace）保存到磁盘，
+不必再花一次完整运行去复现问题。保存的记录按数量和总大小封顶，超出时先删除最旧的
+"""
+
+import json
+import os
+import shutil
+import time
+from collections import deque
+from datetime import datetime
+import config
+from logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_RECORD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flight_records')
+
+# 单条事件文本的最大长度，避免个别超长的控制台输出占满内存
+MAX_EVENT_TEXT = 500
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ArtifactRing:
+    """
+    磁盘上的故障记录环形缓冲区：每条记录是一个子目录，
+    超过 max_records 条或总大小超过 max_bytes 时，从最旧的记录开始删除
+    """
+
+    def __init__(self, root=None, max_records=None, max_bytes=None):
+        """
+        Args:
+            root (str): 记录目录，默认为 config.FLIGHT_RECORDER_DIR
+            max_records (int): 最多保留的记录数，默认为 config.FLIGHT_RECORDER_MAX_RECORDS
+            max_bytes (int): 全部记录的总大小上限，默认为 config.FLIGHT_RECORDER_MAX_MB
+        """
+        self.root = root or getattr(config, 'FLIGHT_RECORDER_DIR', None) or DEFAULT_RECORD_DIR
+        self.max_records = max_records or getattr(config, 'FLIGHT_RECORDER_MAX_RECORDS', 20)
+        if max_bytes is None:
+            max_bytes = getattr(config, 'FLIGHT_RECORDER_MAX_MB', 200) * 1024 * 1024
+        self.max_bytes = max_bytes
+
+    def new_record(self, reason):
+        """
+        创建一条新记录的目录
+
+        Returns:
+            str: 目录路径（名称以时间开头，按名称排序即按时间排序）
+        """
+        name = f"{datetime.now():%Y%m%d_%H%M%S_%f}_{reason}"
+        path = os.path.join(self.root, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def records(self):
+        """
+        Returns:
+            list[str]: 全部记录目录，从旧到新
+        """
+        try:
+            names = sorted(os.listdir(self.root))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.root, name) for name in names if os.path.isdir(os.path.join(self.root, name))]
+
+    def enforce(self, keep=None):
+        """
+        按数量和总大小删除最旧的记录
+
+        Args:
+            keep (str): 刚写入的记录，即使单独超出大小上限也保留
+
+        Returns:
+            list[str]: 被删除的记录
+        """
+        records = self.records()
+        sizes = {path: _dir_size(path) for path in records}
+        total = sum(sizes.values())
+        evicted = []
+        while records and (len(records) > self.max_records or total > self.max_bytes):
+            oldest = records[0]
+            if oldest == keep:
+                break
+            records.pop(0)
+            shutil.rmtree(oldest, ignore_errors=True)
+            total -= sizes[oldest]
+            evicted.append(oldest)
+        if evicted:
+            logger.debug("删除了 %s 条旧的故障记录", len(evicted))
+        return evicted
+
+
+class FlightRecorder:
+    """
+    一次运行的故障记录器
+
+    attach 到页面后记录控制台输出、页面错误、失败的请求和页面跳转；
+    phase 记录各阶段耗时。事件只保存在内存中（最多 max_events 条），
+    只有调用 dump 时才写入磁盘。
+    """
+
+    def __init__(self, max_events=None, ring=None, trace=None):
+        """
+        Args:
+            max_events (int): 内存中保留的最近事件数，默认为 config.FLIGHT_RECORDER_MAX_EVENTS
+            ring (ArtifactRing): 保存记录的环形缓冲区
+            trace (bool): 是否录制Playwright trace，默认为 config.FLIGHT_RECORDER_TRACE
+        """
+        self.events = deque(maxlen=max_events or getattr(config, 'FLIGHT_RECORDER_MAX_EVENTS', 500))
+        self.phases = []
+        self.ring = ring or ArtifactRing()
+        self.trace = getattr(config, 'FLIGHT_RECORDER_TRACE', False) if trace is None else trace
+        self.start_time = time.time()
+        self._tracing_context = None
+
+    def event(self, kind, text):
+        """记录一条事件"""
+        self.events.append({
+            'at': round(time.time() - self.start_time, 3),
+            'kind': kind,
+            'text': str(text)[:MAX_EVENT_TEXT],
+        })
+
+    def phase(self, name, seconds):
+        """记录一个阶段的耗时"""
+        self.phases.append({'phase': name, 'seconds': round(seconds, 3)})
+        self.event('phase', f"{name} {seconds:.2f}s")
+
+    def attach(self, page):
+        """
+        监听页面事件
+
+        Returns:
+            FlightRecorder: 自身，便于链式调用
+        """
+        page.on('console', lambda message: self.event(f"console.{message.type}", message.text))
+        page.on('pageerror', lambda error: self.event('pageerror', error))
+        page.on('requestfailed', lambda request: self.event(
+            'requestfailed', f"{request.method} {request.url} {request.failure}"))
+        page.on('response', lambda response: response.status >= 400 and self.event(
+            'http', f"{response.status} {response.request.method} {response.url}"))
+        page.on('framenavigated', lambda frame: frame.parent_frame is None and self.event('navigate', frame.url))
+        return self
+
+    def start_tracing(self, context):
+        """开启Playwright trace（未启用 trace 时什么都不做）"""
+        if not self.trace or self._tracing_context is not None:
+            return
+        try:
+            context.tracing.start(screenshots=True, snapshots=True)
+            self._tracing_context = context
+        except Exception as e:
+            logger.debug("开启trace失败: %s", e)
+
+    def stop_tracing(self, path=None):
+        """停止trace，提供 path 时保存为zip，否则丢弃"""
+        context, self._tracing_context = self._tracing_context, None
+        if context is None:
+            return
+        try:
+            if path:
+                context.tracing.stop(path=path)
+            else:
+                context.tracing.stop()
+        except Exception as e:
+            logger.debug("停止trace失败: %s", e)
+
+    def dump(self, page, reason, error=None):
+        """
+        把当前页面和内存中的记录保存到磁盘
+
+        Args:
+            page: Playwright页面对象，为None时只保存事件记录
+            reason (str): 保存原因（用于目录名），如 "input_box"、"extraction"、"slow"
+            error (str): 错误信息
+
+        Returns:
+            str: 记录目录，保存失败时为None
+        """
+        try:
+            path = self.ring.new_record(reason)
+        except OSError as e:
+            logger.warning(f"无法创建故障记录目录: {e}")
+            return None
+
+        if page is not None:
+            try:
+                page.screenshot(path=os.path.join(path, 'screenshot.png'), full_page=True, timeout=5000)
+            except Exception as e:
+                self.event('recorder', f"截图失败: {e}")
+            try:
+                with open(os.path.join(path, 'dom.html'), 'w', encoding='utf-8') as f:
+                    f.write(page.content())
+            except Exception as e:
+                self.event('recorder', f"保存DOM失败: {e}")
+            try:
+                self.event('recorder', f"页面地址: {page.url}")
+            except Exception:
+                pass
+        if self._tracing_context is not None:
+            self.stop_tracing(os.path.join(path, 'trace.zip'))
+
+        with open(os.path.join(path, 'events.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'reason': reason,
+                'error': error,
+                'started_at': datetime.fromtimestamp(self.start_time).isoformat(timespec='seconds'),
+                'elapsed_seconds': round(time.time() - self.start_time, 3),
+                'phases': self.phases,
+                'events': list(self.events),
+            }, f, ensure_ascii=False, indent=2)
+
+        self.ring.enforce(keep=path)
+        logger.warning(f"已保存故障记录: {path}")
+        return path
+
+
+def new_recorder():
+    """
+    Returns:
+        FlightRecorder: 按配置创建的记录器，未启用时为None
+    """
+    if not getattr(config, 'FLIGHT_RECORDER_ENABLED', True):
+        return None
+    return FlightRecorder()
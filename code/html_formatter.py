@@ -62,21 +62,48 @@ def format_text_to_html(text):
             formatted_paragraphs.append(f'<p class="content-para">{para}</p>')
     
     result = '\n'.join(formatted_paragraphs)
-    logger.debug(f"文本格式化完成，生成了 {len(formatted_paragraphs)} 个段落")
+    logger.debug("文本格式化完成，生成了 %s 个段落", len(formatted_paragraphs))
     return result
 
-def generate_email_html(content, title="今日咨询推送"):
+def format_sections_to_html(sections, rendered=None):
+    """
+    将多个主题的回复格式化为分栏目的HTML
+
+    Args:
+        sections (list[tuple[str, str]]): (栏目标题, Kimi原始回复) 列表；
+            回复为None表示该栏目获取失败
+        rendered (dict): {栏目标题: 已格式化好的回复HTML}，其中的栏目不再重新格式化
+
+    Returns:
+        str: 格式化后的HTML内容
+    """
+    rendered = rendered or {}
+    parts = []
+    for title, text in sections:
+        if text:
+            body = rendered.get(title) or format_text_to_html(text)
+        else:
+            body = '<p class="content-para section-failed">本栏目今日获取失败</p>'
+        parts.append(
+            f'<div class="digest-section">'
+            f'<h3 class="digest-section-title">{html.escape(title)}</h3>\n{body}</div>'
+        )
+    logger.debug("生成了 %s 个栏目", len(parts))
+    return '\n'.join(parts)
+
+def generate_email_html(content, title="今日咨询推送", date=None):
     """
     生成完整的邮件HTML内容
     
     Args:
         content (str): 已格式化的HTML内容
         title (str): 邮件标题
+        date (datetime): 邮件上显示的日期，默认为当前日期
         
     Returns:
         str: 完整的HTML邮件内容
     """
-    today_str = datetime.now().strftime('%Y年%m月%d日')
+    today_str = (date or datetime.now()).strftime('%Y年%m月%d日')
     
     html_content = f"""
     <html>
@@ -135,6 +162,20 @@ def generate_email_html(content, title="今日咨询推送"):
                 color: #444;
                 font-size: 16px;
             }}
+            .digest-section {{
+                margin-bottom: 30px;
+            }}
+            .digest-section-title {{
+                margin: 0 0 10px 0;
+                padding-bottom: 8px;
+                font-size: 20px;
+                color: #2c3e50;
+                border-bottom: 2px solid #4CAF50;
+            }}
+            .section-failed {{
+                color: #888;
+                font-style: italic;
+            }}
             .footer {{ 
                 margin-top: 20px; 
                 font-size: 12px; 
@@ -0,0 +1,636 @@
+# kimi_api.py
+"""
+Kimi HTTP接口模块
+不启动浏览器，直接使用登录状态文件（没有时使用浏览器目录）中的令牌和cookie调用Kimi网页版的对话接口：
+按名称查找会话、发送消息并以流式方式接收回复。连接在进程内复用。
+认证失败或接口异常时自动回退到浏览器方式
+"""
+
+import codecs
+import http.client
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import config
+import metrics
+from deadline import DeadlineExceeded, ensure as ensure_deadline
+from logger import get_logger
+from reply_spec import ReplySpec, repair as repair_reply
+from stream_capture import KimiStreamParser, plain_text
+
+logger = get_logger()
+
+DEFAULT_BASE_URL = "https://kimi.moonshot.cn/"
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+
+
+class KimiApiError(Exception):
+    """调用Kimi接口失败（接口变化、网络错误、返回错误事件等）"""
+
+
+class KimiAuthError(KimiApiError):
+    """登录状态无效：令牌缺失、过期或被拒绝"""
+
+
+class KimiReplyError(KimiApiError):
+    """消息已经发出后接口出错；此时不能回退到浏览器方式重新发送，否则目标会话中会出现重复的提问"""
+
+    def __init__(self, message, partial=''):
+        """
+        Args:
+            message (str): 错误信息
+            partial (str): 出错前已收到的回复内容
+        """
+        super().__init__(message)
+        self.partial = partial
+
+
+def create_new_if_not_found():
+    """
+    Returns:
+        bool: 找不到目标会话时是否新建会话（否则使用最近的会话），浏览器方式和接口方式共用
+    """
+    return getattr(config, 'CREATE_NEW_IF_NOT_FOUND', False)
+
+
+class ConnectionPool:
+    """
+    按主机复用的HTTP(S)长连接池，线程安全
+
+    连接用完后放回池中，下次请求直接复用，省去重复的TCP和TLS握手。
+    """
+
+    def __init__(self, base_url, timeout=60, max_idle=4):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def get(self):
+        """
+        Returns:
+            tuple[HTTPConnection, bool]: (连接, 是否为复用的连接)
+        """
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def put(self, connection, response=None):
+        """归还连接；服务端要求关闭或池已满时直接关闭"""
+        if response is not None and response.will_close:
+            connection.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(base_url, timeout=60):
+    """
+    Returns:
+        ConnectionPool: 该地址和超时设置在本进程内共享的连接池
+    """
+    with _pools_lock:
+        pool = _pools.get((base_url, timeout))
+        if pool is None:
+            pool = _pools[(base_url, timeout)] = ConnectionPool(base_url, timeout)
+        return pool
+
+
+class KimiApiClient:
+    """Kimi网页版对话接口的客户端"""
+
+    def __init__(self, access_token, refresh_token=None, cookies=None, base_url=None,
+                 timeout=None, state_path=None, deadline=None):
+        """
+        Args:
+            access_token (str): 访问令牌
+            refresh_token (str): 刷新令牌，访问令牌过期时用于换取新令牌
+            cookies (dict): 随请求发送的cookie
+            base_url (str): Kimi网站地址，默认为 config.KIMI_URL
+            timeout (float): 单次读写超时秒数（流式回复中相邻数据块的最长间隔）
+            state_path (str): 登录状态文件路径，刷新令牌后写回该文件
+            deadline (Deadline): 运行时间预算，每次请求的超时不超过剩余预算
+        """
+        self.base_url = base_url or getattr(config, 'KIMI_URL', None) or DEFAULT_BASE_URL
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.cookies = cookies or {}
+        self.state_path = state_path
+        self.deadline = ensure_deadline(deadline)
+        self.last_chat_id = None
+        self.sent = False  # 是否已有消息被接口接受（之后出错不能再重发）
+        timeout = timeout or getattr(config, 'KIMI_API_TIMEOUT', 60)
+        self.pool = get_pool(self.base_url, timeout)
+
+    @classmethod
+    def from_storage_state(cls, path=None, base_url=None, deadline=None):
+        """
+        从登录状态文件创建客户端
+
+        Raises:
+            KimiAuthError: 文件不存在或其中没有登录令牌
+        """
+        import storage_state
+
+        path = path or storage_state.state_file_path()
+        state = storage_state.load_storage_state(path)
+        if state is None:
+            raise KimiAuthError(f"登录状态文件不存在: {path}，请先运行 python main.py state export")
+        tokens = storage_state.find_tokens(state)
+        if not tokens.get('access_token') and not tokens.get('refresh_token'):
+            raise KimiAuthError("登录状态文件中没有Kimi的登录令牌")
+
+        base_url = base_url or getattr(config, 'KIMI_URL', None) or DEFAULT_BASE_URL
+        host = urlsplit(base_url).hostname or ''
+        cookies = {
+            cookie['name']: cookie['value'] for cookie in state.get('cookies', [])
+            if host.endswith(cookie.get('domain', '').lstrip('.'))
+        }
+        return cls(tokens.get('access_token'), tokens.get('refresh_token'), cookies, base_url,
+                   state_path=path, deadline=deadline)
+
+    @classmethod
+    def from_profile(cls, user_data_dir=None, base_url=None, deadline=None):
+        """
+        从持久化浏览器目录中的访问令牌创建客户端
+
+        浏览器目录中的cookie是加密的，只能使用localStorage中的令牌；刷新令牌由网页自己轮换，
+        这里只使用尚未过期的访问令牌，不刷新，避免与浏览器中的令牌不一致。
+
+        Raises:
+            KimiAuthError: 目录中没有尚未过期的访问令牌
+        """
+        import storage_state
+
+        user_data_dir = user_data_dir or config.USER_DATA_DIR
+        access_token = storage_state.profile_tokens(user_data_dir).get('access_token')
+        if not access_token:
+            raise KimiAuthError(f"浏览器目录中没有Kimi的访问令牌: {user_data_dir}")
+        expires_at = storage_state.decode_jwt_expiry(access_token)
+        if expires_at is not None and expires_at <= time.time() + 60:
+            raise KimiAuthError("浏览器目录中的访问令牌已过期，需由浏览器刷新")
+        return cls(access_token, base_url=base_url, deadline=deadline)
+
+    def _headers(self, token):
+        headers = {
+            'User-Agent': USER_AGENT,
+            'Accept': '*/*',
+            'Origin': self.base_url.rstrip('/'),
+            'Referer': self.base_url,
+        }
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+        return headers
+
+    def _open(self, method, path, payload=None, token=None):
+        """
+        发送请求并返回响应（响应体尚未读取），复用的连接已失效时换新连接重试一次
+
+        Returns:
+            tuple[HTTPConnection, HTTPResponse]
+
+        Raises:
+            DeadlineExceeded: 运行预算已用完
+        """
+        body = None
+        headers = self._headers(token if token is not None else self.access_token)
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        for attempt in range(2):
+            timeout = self.deadline.timeout(self.pool.timeout, f"请求 {path}")
+            connection, reused = self.pool.get()
+            # 复用的连接同样按本次剩余预算设置读写超时
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.BadStatusLine) as e:
+                connection.close()
+                if not reused or attempt:
+                    raise KimiApiError(f"请求 {path} 失败: {e}")
+                logger.debug("复用的连接已失效，重新连接: %s", e)
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                self.deadline.check(f"请求 {path}")
+                raise KimiApiError(f"请求 {path} 失败: {e}")
+
+    def _read(self, connection, response, path):
+        """读取完整的响应体并归还连接，读取失败时关闭连接"""
+        try:
+            data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            self.deadline.check(f"请求 {path}")
+            raise KimiApiError(f"读取 {path} 的响应失败: {e}")
+        self.pool.put(connection, response)
+        return data
+
+    @staticmethod
+    def _parse_json(data, path):
+        try:
+            return json.loads(data.decode('utf-8')) if data else {}
+        except ValueError as e:
+            raise KimiApiError(f"{path} 返回的数据无法解析: {e}")
+
+    def _request_json(self, method, path, payload=None, retry_auth=True):
+        connection, response = self._open(method, path, payload)
+        data = self._read(connection, response, path)
+
+        if response.status == 401 and retry_auth and self.refresh():
+            return self._request_json(method, path, payload, retry_auth=False)
+        self._check_status(response.status, data, path)
+        result = self._parse_json(data, path)
+        if not isinstance(result, dict):
+            raise KimiApiError(f"{path} 返回的数据格式不正确")
+        return result
+
+    @staticmethod
+    def _check_status(status, data, path):
+        if status in (401, 403):
+            raise KimiAuthError(f"Kimi拒绝了登录令牌 ({status})，请重新登录后运行 python main.py state export")
+        if status >= 400:
+            raise KimiApiError(f"请求 {path} 返回 {status}: {data[:200].decode('utf-8', errors='replace')}")
+
+    def refresh(self):
+        """
+        使用刷新令牌换取新的访问令牌，并写回登录状态文件
+
+        Returns:
+            bool: 是否刷新成功
+        """
+        if not self.refresh_token:
+            return False
+        logger.info("访问令牌已失效，尝试刷新...")
+        path = '/api/auth/token/refresh'
+        connection, response = self._open('GET', path, token=self.refresh_token)
+        data = self._read(connection, response, path)
+        if response.status != 200:
+            logger.warning(f"刷新令牌失败 ({response.status})")
+            return False
+
+        tokens = self._parse_json(data, path)
+        if not isinstance(tokens, dict):
+            logger.warning("刷新令牌失败: 返回的数据格式不正确")
+            return False
+        self.access_token = tokens.get('access_token') or self.access_token
+        self.refresh_token = tokens.get('refresh_token') or self.refresh_token
+        if self.state_path:
+            import storage_state
+            try:
+                storage_state.update_tokens({'access_token': self.access_token,
+                                             'refresh_token': self.refresh_token}, self.state_path)
+            except Exception as e:
+                logger.warning(f"新令牌写回登录状态文件失败: {e}")
+        logger.info("访问令牌刷新成功")
+        return True
+
+    def get_user(self):
+        """
+        获取当前登录用户信息（开销最小的带认证请求，用于检查令牌是否有效）
+
+        Returns:
+            dict: 用户信息
+        """
+        return self._request_json('GET', '/api/user')
+
+    def list_chats(self, size=50):
+        """
+        Returns:
+            list[dict]: 最近的会话，每项至少包含 id 和 name
+        """
+        return self._request_json('POST', '/api/chat/list', {'offset': 0, 'size': size}).get('items', [])
+
+    def find_chat(self, name):
+        """
+        按名称查找会话（与浏览器方式一致：只查看最近5个，不区分大小写的包含匹配）
+
+        Returns:
+            dict: 匹配的会话，找不到时返回None
+        """
+        for chat in self.list_chats()[:5]:
+            if name.lower() in (chat.get('name') or '').lower():
+                logger.info(f"找到匹配的会话: '{chat.get('name')}'")
+                return chat
+        return None
+
+    def create_chat(self, name):
+        """
+        Returns:
+            dict: 新建的会话
+        """
+        logger.info(f"创建新对话: {name}")
+        return self._request_json('POST', '/api/chat', {'name': name, 'is_example': False, 'kimiplus_id': 'kimi'})
+
+    def stream_reply(self, chat_id, prompt, max_wait_time=None, retry_auth=True):
+        """
+        发送消息并以流式方式接收回复
+
+        Args:
+            chat_id (str): 会话ID
+            prompt (str): 消息内容
+            max_wait_time (float): 整个回复的最长等待秒数，默认为 config.GENERATION_MAX_SECONDS
+
+        Returns:
+            str: 回复内容
+
+        Raises:
+            KimiAuthError: 令牌被拒绝且刷新失败
+            KimiApiError: 接口返回错误，消息未被接受
+            KimiReplyError: 消息已被接受，但数据流出错或未正常结束（附带已收到的部分）
+            DeadlineExceeded: 运行预算已用完或已被取消
+        """
+        if max_wait_time is None:
+            max_wait_time = getattr(config, 'GENERATION_MAX_SECONDS', 900)
+        max_wait_time = self.deadline.timeout(max_wait_time, "等待Kimi生成")
+        path = f"/api/chat/{chat_id}/completion/stream"
+        payload = {'messages': [{'role': 'user', 'content': prompt}], 'refs': [], 'use_search': True}
+        start_time = time.time()
+        connection, response = self._open('POST', path, payload)
+        reusable = False
+        try:
+            if response.status == 401 and retry_auth:
+                response.read()
+                reusable = True
+                if self.refresh():
+                    return self.stream_reply(chat_id, prompt, max_wait_time, retry_auth=False)
+            if response.status >= 400:
+                data = response.read()
+                reusable = True
+                self._check_status(response.status, data, path)
+
+            # 接口已接受消息，之后出错只能返回已收到的部分，不能重发
+            self.sent = True
+            parser = KimiStreamParser()
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            first_chunk = True
+            while not parser.done:
+                try:
+                    chunk = response.read1(8192)
+                except (OSError, http.client.HTTPException) as e:
+                    self.deadline.check("接收回复")
+                    raise KimiReplyError(f"读取回复失败: {e}", plain_text(parser.text))
+                if not chunk:
+                    break
+                if first_chunk:
+                    logger.info(f"收到回复的第一段数据 (耗时: {time.time() - start_time:.1f}秒)")
+                    first_chunk = False
+                parser.feed(decoder.decode(chunk))
+                if time.time() - start_time > max_wait_time:
+                    self.deadline.check("接收回复")
+                    raise KimiReplyError(f"等待{max_wait_time}秒后回复仍未结束", plain_text(parser.text))
+            parser.feed(decoder.decode(b'', final=True))
+            parser.close()
+            if parser.done and not parser.error:
+                # 服务端可能在 all_done 之后还有少量数据，读完才能复用连接
+                response.read()
+                reusable = True
+        finally:
+            if reusable:
+                self.pool.put(connection, response)
+            else:
+                connection.close()
+
+        metrics.GENERATION_SECONDS.observe(time.time() - start_time)
+        if parser.error:
+            raise KimiReplyError(f"Kimi返回错误: {parser.error}", plain_text(parser.text))
+        if not parser.done:
+            raise KimiReplyError("数据流意外结束", plain_text(parser.text))
+        logger.info(f"数据流结束，Kimi回复生成完成 (总耗时: {time.time() - start_time:.1f}秒)")
+        return plain_text(parser.text)
+
+    def ask(self, prompt, use_existing_chat=True, target_chat_name=None, continue_prompt=None):
+        """
+        选择目标会话并发送提示词（与浏览器方式的会话选择规则一致），
+        使用的会话记在 last_chat_id 中，便于在同一对话中追问
+
+        Returns:
+            str: 回复内容
+        """
+        if continue_prompt is None:
+            continue_prompt = getattr(config, 'KIMI_CONTINUE_PROMPT', None)
+
+        chat = None
+        if use_existing_chat:
+            if target_chat_name:
+                chat = self.find_chat(target_chat_name)
+            if chat is None and not create_new_if_not_found():
+                chats = self.list_chats(size=1)
+                chat = chats[0] if chats else None
+
+        if chat is not None:
+            actual_prompt = continue_prompt or prompt
+        else:
+            chat = self.create_chat(target_chat_name or '未命名会话')
+            actual_prompt = prompt
+        if not chat.get('id'):
+            raise KimiApiError("接口返回的会话没有ID")
+        self.last_chat_id = chat['id']
+        return self.stream_reply(chat['id'], actual_prompt)
+
+
+def _engine():
+    return getattr(config, 'KIMI_ENGINE', 'browser')
+
+
+def _client(session=None, deadline=None):
+    """
+    创建接口客户端：优先使用登录状态文件，没有时使用会话（或默认）浏览器目录中的访问令牌
+
+    Raises:
+        KimiAuthError: 两处都没有可用的登录令牌
+    """
+    import storage_state
+
+    state_path = (session.storage_state if session is not None else None) or storage_state.state_file_path()
+    if os.path.exists(state_path):
+        return KimiApiClient.from_storage_state(state_path, deadline=deadline)
+    return KimiApiClient.from_profile(session.user_data_dir if session is not None else None, deadline=deadline)
+
+
+def _api_response(prompt, use_existing_chat, target_chat_name, continue_prompt=None, deadline=None, session=None):
+    """
+    Raises:
+        KimiApiError: 消息发出之前出错，可以回退到浏览器方式
+        KimiReplyError: 消息已经发出后出错，不能回退
+    """
+    start_time = time.perf_counter()
+    client = None
+    try:
+        client = _client(session, deadline)
+        response_text = client.ask(prompt, use_existing_chat, target_chat_name, continue_prompt)
+        if len(response_text) <= 50:
+            raise KimiReplyError("接口返回的回复过短", response_text)
+        response_text = repair_reply(response_text, ReplySpec.from_prompt(prompt),
+                                     lambda followup: client.stream_reply(client.last_chat_id, followup), deadline)
+    except (KeyError, TypeError, ValueError, http.client.HTTPException) as e:
+        # 接口返回了意料之外的数据，按接口异常处理；消息尚未发出时回退到浏览器方式
+        message = f"接口返回的数据无法处理: {type(e).__name__}: {e}"
+        if client is not None and client.sent:
+            raise KimiReplyError(message) from e
+        raise KimiApiError(message) from e
+    logger.info(f"成功获取Kimi回复 (总长度: {len(response_text)} 字符, 提取方案: http, "
+                f"耗时 {time.perf_counter() - start_time:.1f} 秒)")
+    metrics.EXTRACTION_PATH.inc(path="http")
+    metrics.RESPONSE_LENGTH.observe(len(response_text))
+    return response_text
+
+
+def _salvage(error):
+    """
+    消息发出后接口出错时，与浏览器方式的中断处理一致：用已收到的部分拼出摘要，没有可用内容时返回错误信息
+
+    Returns:
+        str: 摘要或错误信息
+    """
+    from partial_reply import PartialReply
+
+    logger.error(f"消息已发出后接口出错，不回退到浏览器方式（避免重复提问）: {error}")
+    metrics.FAILURES.inc(type="api")
+    progress = PartialReply.start('http') if error.partial else None
+    if progress is not None:
+        progress.update(re.split(r'\n\s*\n', error.partial), final=True)
+        digest = progress.digest()
+        if digest:
+            return digest
+    return f"自动化获取内容失败，错误信息: {error}"
+
+
+def get_kimi_response(prompt, use_existing_chat=True, session=None, target_chat_name=None, deadline=None,
+                      on_response=None):
+    """
+    按 config.KIMI_ENGINE 获取Kimi回复，参数和返回值同 kimi_handler.get_kimi_response
+
+    使用 "http" 引擎时直接调用接口，不启动浏览器；消息发出之前认证失败或接口异常时回退到浏览器方式。
+    消息已经发出后出错、或运行预算用完时不再回退，返回已收到的部分或错误信息。
+    """
+    if target_chat_name is None:
+        target_chat_name = getattr(config, 'TARGET_CHAT_NAME', None)
+
+    if _engine() == 'http':
+        try:
+            response_text = _api_response(prompt, use_existing_chat, target_chat_name, deadline=deadline,
+                                          session=session)
+            if on_response is not None:
+                on_response(response_text, None)
+            if session is not None:
+                session.close()  # 预热的浏览器用不上了
+            return response_text
+        except DeadlineExceeded as e:
+            logger.error(f"停止调用Kimi接口: {e}")
+            metrics.FAILURES.inc(type="deadline")
+            if session is not None:
+                session.close()
+            return f"自动化获取内容失败，错误信息: {e}"
+        except KimiReplyError as e:
+            if session is not None:
+                session.close()
+            return _salvage(e)
+        except KimiAuthError as e:
+            logger.warning(f"接口认证失败，回退到浏览器方式: {e}")
+            metrics.FAILURES.inc(type="api_auth")
+        except KimiApiError as e:
+            logger.warning(f"接口调用失败，回退到浏览器方式: {e}")
+            metrics.FAILURES.inc(type="api")
+
+    from kimi_handler import get_kimi_response as get_browser_response
+    return get_browser_response(prompt, use_existing_chat, session=session, target_chat_name=target_chat_name,
+                                deadline=deadline, on_response=on_response)
+
+
+def get_kimi_responses(requests, use_existing_chat=True, session=None, deadline=None, on_results=None):
+    """
+    按 config.KIMI_ENGINE 并发获取多个提示词的回复，参数和返回值同 kimi_handler.get_kimi_responses
+
+    使用 "http" 引擎时各提示词在线程中并发请求，消息发出之前失败的提示词统一回退到浏览器方式。
+
+    Raises:
+        KimiAuthError: 没有任何提示词拿到结果，且浏览器方式的所有标签页都因登录失效而失败
+    """
+    results = {}
+    if _engine() == 'http':
+        def ask(request):
+            return _api_response(request['prompt'], use_existing_chat, request.get('target_chat'),
+                                 request.get('continue_prompt'), deadline, session)
+
+        with ThreadPoolExecutor(max_workers=len(requests) or 1) as executor:
+            futures = {request['name']: executor.submit(ask, request) for request in requests}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except DeadlineExceeded as e:
+                logger.error(f"[{name}] 停止调用Kimi接口: {e}")
+                metrics.FAILURES.inc(type="deadline")
+                results[name] = f"自动化获取内容失败，错误信息: {e}"
+            except KimiReplyError as e:
+                results[name] = _salvage(e)
+            except KimiApiError as e:
+                logger.warning(f"[{name}] 接口调用失败，回退到浏览器方式: {e}")
+                metrics.FAILURES.inc(type="api_auth" if isinstance(e, KimiAuthError) else "api")
+            except Exception as e:
+                logger.warning(f"[{name}] 接口调用出错，回退到浏览器方式: {e}")
+                metrics.FAILURES.inc(type="api")
+
+        remaining = [request for request in requests if request['name'] not in results]
+        if not remaining:
+            if on_results is not None:
+                on_results(dict(results), None)
+            if session is not None:
+                session.close()
+            return results
+        requests = remaining
+
+    from kimi_handler import get_kimi_responses as get_browser_responses
+    if on_results is not None:
+        api_results = dict(results)
+
+        def browser_on_results(browser_results, rendered=None):
+            on_results({**api_results, **browser_results}, rendered)
+    else:
+        browser_on_results = None
+    try:
+        results.update(get_browser_responses(requests, use_existing_chat, session=session, deadline=deadline,
+                                             on_results=browser_on_results))
+    except KimiAuthError as e:
+        if not results:
+            raise
+        # 接口已经处理了部分提示词，其余提示词记为失败，照常交付
+        for request in requests:
+            results[request['name']] = f"自动化获取内容失败，错误信息: {e}"
+        if on_results is not None:
+            on_results(dict(results), None)
+    return results
@@ -4,14 +4,31 @@ Kimi交互处理模块
 负责与Kimi网站的所有交互操作
 """
 
+import logging
+import os
 import time
+from contextlib import contextmanager
 from datetime import datetime
+from functools import partial
 from playwright.sync_api import sync_playwright, TimeoutError
 import config
+import metrics
+from deadline import DeadlineExceeded, ensure as ensure_deadline
+from flight_recorder import new_recorder
+from kimi_api import KimiAuthError, create_new_if_not_found
 from logger import get_logger
+from partial_reply import PartialReply
+from profile_maintenance import launch_args, maybe_maintain, record_launch
+from reply_spec import ReplySpec, repair as repair_reply
+from run_stats import PollSchedule, get_stats
 
 logger = get_logger()
 
+KIMI_URL = getattr(config, 'KIMI_URL', None) or "https://kimi.moonshot.cn/"
+
+# 修改对话标题最多需要约10秒，剩余预算不足时跳过
+RENAME_MIN_SECONDS = 15
+
 def check_chat_length(page):
     """
     检查当前对话的长度，判断是否需要创建新对话。
@@ -28,7 +45,7 @@ def check_chat_length(page):
         # 获取所有segment-container
         segment_containers = page.locator('.segment-container').all()
         segment_count = len(segment_containers)
-        logger.debug(f"当前对话中有 {segment_count} 个segment-container")
+        logger.debug("当前对话中有 %s 个segment-container", segment_count)
         
         # 如果segment-container数量超过200（对话轮数超过100）
         if segment_count > 200:
@@ -42,10 +59,10 @@ def check_chat_length(page):
                 text = container.inner_text().strip()
                 total_chars += len(text)
             except Exception as e:
-                logger.debug(f"获取segment-container文本失败: {e}")
+                logger.debug("获取segment-container文本失败: %s", e)
                 continue
         
-        logger.debug(f"当前对话字符总量: {total_chars}")
+        logger.debug("当前对话字符总量: %s", total_chars)
         
         # 如果字符总量超过10000
         if total_chars > 10000:
@@ -89,7 +106,7 @@ def rename_chat_title(page, new_title):
             try:
                 current_chat = page.locator(selector).first
                 if current_chat.is_visible():
-                    logger.debug(f"使用选择器找到当前对话: {selector}")
+                    logger.debug("使用选择器找到当前对话: %s", selector)
                     break
             except:
                 continue
@@ -117,7 +134,7 @@ def rename_chat_title(page, new_title):
             try:
                 more_button = current_chat.locator(selector).first
                 if more_button.is_visible():
-                    logger.debug(f"找到more-btn: {selector}")
+                    logger.debug("找到more-btn: %s", selector)
                     break
             except:
                 continue
@@ -168,7 +185,7 @@ def rename_chat_title(page, new_title):
         title_input.click()
         title_input.press('Control+a')  # 使用快捷键全选
         title_input.fill(new_title)
-        logger.debug(f"已输入新标题: {new_title}")
+        logger.debug("已输入新标题: %s", new_title)
         time.sleep(0.5)
         
         # 5. 点击确定按钮
@@ -211,454 +228,1350 @@ def rename_chat_title(page, new_title):
         return False
 
 
-def get_kimi_response(prompt, use_existing_chat=True):
+def _selector_timeout(phase, default_ms, deadline=None):
     """
-    使用Playwright与Kimi网页版交互，获取回复。
+    根据历史耗时推算页面等待的超时（毫秒），限制在默认值的1/4到2倍之间，且不超过剩余的运行预算
 
     Args:
-        prompt (str): 要发送给Kimi的提示词。
-        use_existing_chat (bool): 是否使用现有对话，默认True
+        phase (str): 阶段名称（与 run_stats 中记录的名称一致）
+        default_ms (float): 没有足够历史数据时使用的超时
+        deadline (Deadline): 运行时间预算
 
-    Returns:
-        str: Kimi的回复内容，如果失败则返回错误信息。
+    Raises:
+        DeadlineExceeded: 运行预算已用完
+    """
+    timeout_ms = get_stats().timeout(phase, default_ms / 1000, floor=default_ms / 4000, ceiling=default_ms / 500) * 1000
+    return ensure_deadline(deadline).timeout_ms(timeout_ms, phase)
+
+
+def _goto_kimi(page, deadline=None):
+    """打开Kimi首页并等待加载完成"""
+    logger.info("导航到Kimi网站...")
+    start_time = time.time()
+    page.goto(KIMI_URL, timeout=_selector_timeout('page_load', 60000, deadline))
+    get_stats().record('page_load', time.time() - start_time)
+
+    # 等待页面加载
+    logger.debug("等待页面加载...")
+    start_time = time.time()
+    page.wait_for_load_state('domcontentloaded', timeout=_selector_timeout('dom_ready', 20000, deadline))
+    get_stats().record('dom_ready', time.time() - start_time)
+    page.wait_for_timeout(ensure_deadline(deadline).timeout_ms(3000, "等待页面加载"))
+    logger.debug("页面加载完成")
+
+
+class KimiSession:
+    """
+    一个已启动浏览器并打开Kimi首页的会话
+
+    可以在任务开始前提前创建（预热），再交给 get_kimi_response 使用，
+    从而把启动Chromium和加载页面的时间移出关键路径。
+    Playwright同步API不支持跨线程，会话必须在创建它的线程中使用。
+
+    会话有两种模式：
+    - 持久化目录模式：直接打开用户数据目录，同一目录同一时刻只能被一个浏览器使用；
+    - 登录状态文件模式：从 storage_state 文件创建全新、隔离的浏览器上下文，
+      同一个浏览器中可以同时存在多个上下文，运行结束后不会在磁盘上留下任何状态。
     """
-    with sync_playwright() as p:
+
+    def __init__(self, user_data_dir=None, headless=False, storage_state=None, browser=None):
+        """
+        Args:
+            user_data_dir (str): Playwright用户数据目录，为None时使用config.USER_DATA_DIR
+            headless (bool): 是否使用无头模式
+            storage_state (str): 登录状态文件路径；为None且使用默认用户数据目录时，
+                按 config.BROWSER_MODE 决定是否使用 config.STORAGE_STATE_FILE
+            browser (Browser): 登录状态文件模式下共享的已启动浏览器，为None时自行启动
+        """
+        self.user_data_dir = user_data_dir or config.USER_DATA_DIR
+        self.headless = headless
+        if storage_state is None and self.user_data_dir == config.USER_DATA_DIR \
+                and getattr(config, 'BROWSER_MODE', 'persistent') == 'storage_state':
+            from storage_state import state_file_path
+            storage_state = state_file_path()
+        self.storage_state = storage_state
+        self.browser = browser
+        self.context = None
+        self.page = None
+        self._playwright = None
+        self._owns_browser = browser is None
+        self._contexts = []
+        self.recorder = new_recorder()
+
+    def start(self, deadline=None):
+        """
+        启动浏览器并打开Kimi首页
+
+        Args:
+            deadline (Deadline): 运行时间预算，预热时为None
+
+        Returns:
+            KimiSession: 自身，便于链式调用
+        """
         logger.info("启动浏览器...")
+        start_time = time.time()
         try:
-            browser = p.chromium.launch_persistent_context(
-                user_data_dir=config.USER_DATA_DIR,
-                headless=False,
-                args=['--no-sandbox']
-            )
-            page = browser.new_page()
-            logger.info("导航到Kimi网站...")
-            page.goto("https://kimi.moonshot.cn/", timeout=60000)
-
-            # 等待页面加载
-            logger.debug("等待页面加载...")
-            page.wait_for_load_state('domcontentloaded', timeout=20000)
-            page.wait_for_timeout(3000)
-            logger.debug("页面加载完成")
-
-            # 记录发送前的页面内容（用于后续差集去除历史信息）
-            logger.debug("记录发送前的页面内容...")
-            pre_send_content = ""
+            if self.storage_state:
+                if not os.path.exists(self.storage_state):
+                    raise FileNotFoundError(
+                        f"登录状态文件不存在: {self.storage_state}，请先运行 python main.py state export")
+                if self.browser is None:
+                    self._playwright = sync_playwright().start()
+                    self.browser = self._playwright.chromium.launch(
+                        headless=self.headless,
+                        args=launch_args()
+                    )
+                self.context = self._new_context()
+            else:
+                # 缓存累积过多时先清理，目录越大启动越慢
+                maybe_maintain(self.user_data_dir)
+                launch_start = time.time()
+                self._playwright = sync_playwright().start()
+                self.context = self._playwright.chromium.launch_persistent_context(
+                    user_data_dir=self.user_data_dir,
+                    headless=self.headless,
+                    args=launch_args()
+                )
+                record_launch(self.user_data_dir, time.time() - launch_start)
+            if self.recorder is not None:
+                self.recorder.start_tracing(self.context)
+            self.page = self._watch(self.context.new_page())
+            if self.recorder is not None:
+                self.recorder.phase('browser_launch', time.time() - start_time)
+            with self.phase('page_load'):
+                _goto_kimi(self.page, deadline)
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def _watch(self, page):
+        if self.recorder is not None:
+            self.recorder.attach(page)
+        return page
+
+    @contextmanager
+    def phase(self, name):
+        """记录一个阶段的耗时到故障记录器（出错时同样记录）"""
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            if self.recorder is not None:
+                self.recorder.phase(name, time.time() - start_time)
+
+    def dump(self, reason, error=None, page=None):
+        """
+        保存故障记录（截图、DOM、最近的页面事件和阶段耗时），须在 close 之前调用
+
+        Args:
+            reason (str): 保存原因
+            error (str): 错误信息
+            page: 要截图的页面，默认为会话的主页面
+        """
+        if self.recorder is None:
+            return
+        try:
+            self.recorder.dump(page or self.page, reason, error)
+        except Exception as e:
+            logger.warning(f"保存故障记录失败: {e}")
+
+    def _new_context(self):
+        context = self.browser.new_context(storage_state=self.storage_state)
+        self._contexts.append(context)
+        return context
+
+    def new_page(self, deadline=None):
+        """
+        再打开一个Kimi首页
+
+        登录状态文件模式下使用新的隔离上下文，持久化目录模式下在同一上下文中新开标签页。
+
+        Args:
+            deadline (Deadline): 运行时间预算
+
+        Returns:
+            Page: 已加载完成的页面
+        """
+        context = self._new_context() if self.storage_state else self.context
+        page = self._watch(context.new_page())
+        _goto_kimi(page, deadline)
+        return page
+
+    def close(self):
+        """关闭浏览器并停止Playwright，可重复调用"""
+        if self.recorder is not None:
+            self.recorder.stop_tracing()
+        contexts = self._contexts if self.storage_state else [self.context]
+        for context in contexts:
+            if context is None:
+                continue
             try:
-                pre_send_content = page.locator('body').inner_text()
-                logger.debug(f"发送前页面内容长度: {len(pre_send_content)} 字符")
-            except Exception as e:
-                logger.debug(f"获取发送前内容失败: {e}")
+                context.close()
+            except Exception as close_error:
+                logger.debug("关闭浏览器上下文时出错: %s", close_error)
+        self._contexts = []
+        self.context = None
+        self.page = None
+        if self.browser is not None and self._owns_browser:
+            logger.debug("关闭浏览器...")
+            try:
+                self.browser.close()
+                logger.debug("浏览器已关闭")
+            except Exception as close_error:
+                logger.debug("关闭浏览器时出错: %s", close_error)
+            self.browser = None
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception as stop_error:
+                logger.debug("停止Playwright时出错: %s", stop_error)
+            self._playwright = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# 备用提取方案中查找对话区域使用的选择器
+_CONVERSATION_SELECTORS = [
+    '.conversation-content',
+    '.chat-content',
+    '.message-list',
+    '.chat-messages',
+    '.conversation-list'
+]
+
+# 记录发送前对话末尾位置的脚本：segment-container的数量和最后一个的id，
+# 以及各对话区域的子元素数量。只返回几个数字，耗时和内存不随对话长度增长
+_MARKER_SCRIPT = """
+(areaSelectors) => {
+    const list = document.querySelector('.chat-content-list');
+    const root = list && list.getClientRects().length > 0 ? list : document;
+    const segments = root.querySelectorAll('.segment-container');
+    const last = segments[segments.length - 1];
+    const areas = {};
+    for (const selector of areaSelectors) {
+        const area = document.querySelector(selector);
+        if (area) areas[selector] = area.childElementCount;
+    }
+    return {
+        segments: segments.length,
+        lastId: last ? (last.id || last.getAttribute('data-id') || null) : null,
+        areas,
+    };
+}
+"""
+
+
+def _mark_page(page):
+    """
+    记录发送前对话的末尾位置，发送后据此按下标定位新增的内容
+
+    Returns:
+        dict: {'segments': segment-container数量, 'lastId': 最后一个的DOM id,
+               'areas': {对话区域选择器: 子元素数量}}，失败时为空字典
+    """
+    try:
+        marker = page.evaluate(_MARKER_SCRIPT, _CONVERSATION_SELECTORS)
+        logger.debug("发送前对话位置: %s 个segment-container, 最后一个id: %s", marker['segments'], marker['lastId'])
+        return marker
+    except Exception as e:
+        logger.debug("记录发送前对话位置失败: %s", e)
+        return {}
+
 
-            # 尝试使用现有对话或创建新对话
-            chat_found = False
-            need_new_chat = False  # 标记是否需要创建新对话
+def _open_chat(page, use_existing_chat, target_chat_name, deadline=None):
+    """
+    选择目标历史对话，找不到或对话过长时创建新对话
+
+    Args:
+        page: Playwright页面对象
+        use_existing_chat (bool): 是否尝试使用现有对话
+        target_chat_name (str): 目标会话名称
+        deadline (Deadline): 运行时间预算
+
+    Returns:
+        tuple[bool, bool]: (是否使用了现有对话, 是否创建了新对话)
+    """
+    # 尝试使用现有对话或创建新对话
+    chat_found = False
+    need_new_chat = False  # 标记是否需要创建新对话
+    deadline = ensure_deadline(deadline)
+    
+    if use_existing_chat:
+        logger.info("尝试查找现有对话...")
+        try:
+            # 使用多种选择器查找历史对话
+            chat_selectors = [
+                '.history-part .chat-info-item',
+                '.chat-info-item',
+                '.sidebar .chat-info-item',
+                '.sidebar li'
+            ]
             
-            if use_existing_chat:
-                logger.info("尝试查找现有对话...")
+            elements = []
+            chat_list_timeout = _selector_timeout('chat_list', 2000, deadline)
+            for selector in chat_selectors:
+                deadline.check("查找历史对话")
                 try:
-                    # 使用多种选择器查找历史对话
-                    chat_selectors = [
-                        '.history-part .chat-info-item',
-                        '.chat-info-item',
-                        '.sidebar .chat-info-item',
-                        '.sidebar li'
-                    ]
-                    
-                    elements = []
-                    for selector in chat_selectors:
-                        try:
-                            page.wait_for_selector(selector, timeout=2000)
-                            elements = page.query_selector_all(selector)
-                            if elements:
-                                logger.debug(f"使用选择器 {selector} 找到 {len(elements)} 个历史对话")
-                                break
-                        except:
-                            continue
-                    
-                    if not elements:
-                        logger.warning("未找到任何历史对话")
-                        raise Exception("未找到历史对话")
-
-                    # 根据配置选择目标会话或使用第一个
-                    target_element = None
-                    if hasattr(config, 'TARGET_CHAT_NAME') and config.TARGET_CHAT_NAME:
-                        for element in elements[:5]:  # 只检查前5个
-                            try:
-                                text = element.text_content().strip()
-                                if config.TARGET_CHAT_NAME.lower() in text.lower():
-                                    target_element = element
-                                    logger.info(f"找到匹配的会话: '{text}'")
-                                    break
-                            except:
-                                continue
-                    
-                    if not target_element and elements:
-                        if not (hasattr(config, 'CREATE_NEW_IF_NOT_FOUND') and config.CREATE_NEW_IF_NOT_FOUND):
-                            target_element = elements[0]
-                            logger.debug("使用第一个可用会话")
-
-                    if target_element:
-                        target_element.click()
-                        page.wait_for_timeout(2000)
-                        chat_found = True
-                        logger.info("成功选择现有对话")
-                        
-                        # 检查对话长度，判断是否需要创建新对话
-                        if check_chat_length(page):
-                            logger.warning("当前对话过长，将创建新对话")
-                            need_new_chat = True
-                            chat_found = False
-                            
-                except Exception as e:
-                    logger.debug(f"查找现有对话失败: {e}")
-
-            if not chat_found:
-                logger.info("创建新对话...")
-                # 修正新建对话按钮选择器
-                new_chat_selectors = [
-                    '.new-chat-btn',  # 实际的按钮类名
-                    'button:has-text("新建会话")',  # 实际的按钮文字
-                    'button:has-text("新建对话")',  # 备用文字
-                    'button:has-text("新对话")',   # 备用文字
-                    '.new-chat-button'  # 备用类名
-                ]
-                for selector in new_chat_selectors:
+                    start_time = time.time()
+                    page.wait_for_selector(selector, timeout=chat_list_timeout)
+                    get_stats().record('chat_list', time.time() - start_time)
+                    elements = page.query_selector_all(selector)
+                    if elements:
+                        logger.debug("使用选择器 %s 找到 %s 个历史对话", selector, len(elements))
+                        break
+                except:
+                    continue
+            
+            if not elements:
+                logger.warning("未找到任何历史对话")
+                raise Exception("未找到历史对话")
+
+            # 根据配置选择目标会话或使用第一个
+            target_element = None
+            if target_chat_name:
+                for element in elements[:5]:  # 只检查前5个
                     try:
-                        btn = page.locator(selector).first
-                        if btn.is_visible():
-                            btn.click()
-                            logger.debug(f"已点击新建会话按钮 (使用选择器: {selector})")
-                            time.sleep(2)
-                            need_new_chat = True  # 标记创建了新对话
+                        text = element.text_content().strip()
+                        if target_chat_name.lower() in text.lower():
+                            target_element = element
+                            logger.info(f"找到匹配的会话: '{text}'")
                             break
-                    except Exception as e:
-                        logger.debug(f"选择器 {selector} 失败: {e}")
+                    except:
                         continue
+            
+            if not target_element and elements:
+                if not create_new_if_not_found():
+                    target_element = elements[0]
+                    logger.debug("使用第一个可用会话")
+
+            if target_element:
+                target_element.click()
+                page.wait_for_timeout(deadline.timeout_ms(2000, "打开历史对话"))
+                chat_found = True
+                logger.info("成功选择现有对话")
+                
+                # 检查对话长度，判断是否需要创建新对话
+                if check_chat_length(page):
+                    logger.warning("当前对话过长，将创建新对话")
+                    need_new_chat = True
+                    chat_found = False
+                    
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.debug("查找现有对话失败: %s", e)
 
-            # 查找输入框
-            logger.debug("查找输入框...")
-            input_box = None
+    if not chat_found:
+        deadline.check("创建新对话")
+        logger.info("创建新对话...")
+        # 修正新建对话按钮选择器
+        new_chat_selectors = [
+            '.new-chat-btn',  # 实际的按钮类名
+            'button:has-text("新建会话")',  # 实际的按钮文字
+            'button:has-text("新建对话")',  # 备用文字
+            'button:has-text("新对话")',   # 备用文字
+            '.new-chat-button'  # 备用类名
+        ]
+        for selector in new_chat_selectors:
             try:
-                input_box = page.locator('[role="textbox"]').first
-                input_box.wait_for(timeout=5000)
-                if not (input_box.is_visible() and input_box.is_enabled()):
-                    raise Exception("输入框不可用")
-                logger.debug("成功找到输入框")
+                btn = page.locator(selector).first
+                if btn.is_visible():
+                    btn.click()
+                    logger.debug("已点击新建会话按钮 (使用选择器: %s)", selector)
+                    time.sleep(2)
+                    need_new_chat = True  # 标记创建了新对话
+                    break
             except Exception as e:
-                logger.error(f"未找到可用的输入框: {e}")
-                raise Exception("无法找到输入框，请检查Kimi网站是否正常或登录状态是否有效")
-
-            # 输入提示词
-            logger.debug("输入提示词...")
-            actual_prompt = prompt
-            if chat_found and hasattr(config, 'KIMI_CONTINUE_PROMPT') and config.KIMI_CONTINUE_PROMPT:
-                actual_prompt = config.KIMI_CONTINUE_PROMPT
-                logger.debug(f"使用继续对话提示词: {actual_prompt}")
+                logger.debug("选择器 %s 失败: %s", selector, e)
+                continue
+
+    return chat_found, need_new_chat
+
+
+def _confirm_auth_lost(session=None, deadline=None):
+    """
+    找不到输入框时用登录预检确认是否确实是登录失效（页面改版、加载慢、验证码等同样会找不到输入框）
+
+    Args:
+        session (KimiSession): 当前浏览器会话，为None时按配置推断登录身份
+        deadline (Deadline): 运行时间预算
+
+    Returns:
+        KimiAuthError: 预检确认登录已失效时返回该错误，否则为None
+    """
+    from login_probe import probe, session_identity
+
+    user_data_dir, state_path = session_identity(session)
+    timeout = ensure_deadline(deadline).timeout(getattr(config, 'LOGIN_PROBE_TIMEOUT', 2), "确认登录状态")
+    try:
+        probe(user_data_dir, state_path, timeout)
+    except KimiAuthError as e:
+        return e
+    except Exception as e:
+        logger.warning(f"确认登录状态时出错，按页面异常处理: {e}")
+    return None
+
+
+def _find_input_box(page, deadline=None, session=None):
+    """
+    查找可用的输入框
+
+    Args:
+        session (KimiSession): 当前浏览器会话，找不到输入框时用于确认登录状态
+
+    Returns:
+        Locator: 输入框
+
+    Raises:
+        KimiAuthError: 找不到可用的输入框，且登录预检确认登录状态已失效
+        RuntimeError: 找不到可用的输入框，但登录状态有效（页面改版、加载过慢等）
+        DeadlineExceeded: 运行预算已用完
+    """
+    logger.debug("查找输入框...")
+    timeout = _selector_timeout('input_box', 5000, deadline)
+    try:
+        input_box = page.locator('[role="textbox"]').first
+        start_time = time.time()
+        input_box.wait_for(timeout=timeout)
+        get_stats().record('input_box', time.time() - start_time)
+        if not (input_box.is_visible() and input_box.is_enabled()):
+            raise Exception("输入框不可用")
+        logger.debug("成功找到输入框")
+        return input_box
+    except Exception as e:
+        # 因预算所剩无几而缩短的等待超时，不能当作登录失效
+        ensure_deadline(deadline).check("查找输入框")
+        logger.error(f"未找到可用的输入框: {e}")
+        metrics.FAILURES.inc(type="input_box")
+        auth_error = _confirm_auth_lost(session, deadline)
+        if auth_error is not None:
+            raise KimiAuthError(f"无法找到输入框，登录状态已失效: {auth_error}") from e
+        raise RuntimeError("无法找到输入框，登录状态有效，请检查Kimi网站是否正常") from e
+
+
+def _choose_prompt(prompt, chat_found, continue_prompt=None):
+    """
+    继续现有对话时使用简短的继续提示词，否则使用完整提示词
+
+    Returns:
+        str: 实际发送的提示词
+    """
+    if continue_prompt is None:
+        continue_prompt = getattr(config, 'KIMI_CONTINUE_PROMPT', None)
+    if chat_found and continue_prompt:
+        logger.debug("使用继续对话提示词: %s", continue_prompt)
+        return continue_prompt
+    logger.debug("使用原始提示词: %.50s...", prompt)
+    return prompt
+
+
+class GenerationMonitor:
+    """
+    监测Kimi回复的生成状态
+
+    通过发送按钮的SVG变化判断：SVG变化 → 开始生成 → SVG恢复初始状态 → 生成完成。
+    使用回车键发送时没有可监测的按钮，只等待固定时间。
+    每次 poll 只做一次检查，便于同时轮询多个标签页。
+
+    超时和轮询间隔根据历史运行耗时推算（见 run_stats）：迟迟未开始生成时提前放弃等待；
+    已开始生成但超过预期时间时，只要仍在生成就继续等待，直到 config.GENERATION_MAX_SECONDS。
+    运行预算用完或被取消时，poll 抛出 DeadlineExceeded。
+    """
+
+    def __init__(self, send_button=None, initial_svg_content="", max_wait_time=None, fixed_wait=None,
+                 start_timeout=None, deadline=None):
+        """
+        Args:
+            send_button (Locator): 发送按钮
+            initial_svg_content (str): 点击发送前按钮的SVG内容
+            max_wait_time (float): 预期的最长生成时间（秒），默认根据历史耗时推算
+            fixed_wait (float): 不监测SVG，只等待固定秒数
+            start_timeout (float): 等待开始生成的最长秒数，默认根据历史耗时推算
+            deadline (Deadline): 运行时间预算
+        """
+        stats = get_stats()
+        self.hard_limit = getattr(config, 'GENERATION_MAX_SECONDS', 900)
+        if max_wait_time is None:
+            max_wait_time = stats.timeout('generation', 300, floor=60, ceiling=self.hard_limit)
+        if start_timeout is None:
+            start_timeout = stats.timeout('generation_start', 60, floor=10, ceiling=max_wait_time)
+        self.send_button = send_button
+        self.initial_svg_content = initial_svg_content
+        self.max_wait_time = max_wait_time
+        self.start_timeout = start_timeout
+        self.fixed_wait = fixed_wait
+        self.deadline = ensure_deadline(deadline)
+        self.start_time = time.time()
+        self.is_generating = False  # 是否正在生成（SVG与初始状态不一致）
+        self.started_after = None   # 发送后多少秒开始生成
+        self.completed = False
+        self.overtime = False       # 是否已超过预期时间但仍在生成
+        self.record_stats = True    # 是否计入生成耗时统计（追问等短回复不计入）
+        self.last_progress_time = 0  # 上次显示进度的时间
+        self._start_schedule = PollSchedule(stats.expected('generation_start'))
+        self._schedule = PollSchedule(stats.expected('generation'))
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def next_interval(self):
+        """
+        Returns:
+            float: 距下一次 poll 应等待的秒数（临近预计开始/完成时间时更密集）
+        """
+        if self.fixed_wait is not None:
+            return 1
+        if not self.is_generating:
+            return self._start_schedule.interval(self.elapsed)
+        return self._schedule.interval(self.elapsed)
+
+    def poll(self):
+        """
+        检查一次生成状态
+
+        Returns:
+            bool: 是否已结束等待（生成完成或超时）
+
+        Raises:
+            DeadlineExceeded: 运行预算已用完或已被取消
+        """
+        self.deadline.check("等待Kimi生成")
+        if self.fixed_wait is not None:
+            return self.elapsed >= self.fixed_wait
+
+        elapsed = self.elapsed
+        if elapsed >= self.hard_limit:
+            return True
+
+        try:
+            current_svg_content = ""
+            svg_element = self.send_button.locator('svg').first
+            if svg_element.is_visible():
+                current_svg_content = svg_element.inner_html()
+
+            # 检查当前SVG状态
+            if self.initial_svg_content:
+                svg_changed = current_svg_content != self.initial_svg_content
+
+                if not self.is_generating and svg_changed:
+                    # SVG发生变化，开始生成
+                    self.is_generating = True
+                    self.started_after = elapsed
+                    logger.info(f"检测到SVG变化，Kimi开始生成回复 (耗时: {elapsed:.1f}秒)")
+
+                elif self.is_generating and not svg_changed:
+                    # SVG恢复初始状态，生成完成
+                    logger.info(f"SVG恢复初始状态，Kimi回复生成完成 (总耗时: {elapsed:.1f}秒)")
+                    self.completed = True
+                    return True
+
+            if not self.is_generating and elapsed >= self.start_timeout:
+                # 迟迟没有开始生成，多半是页面异常，不必等满整个生成时间
+                return True
+
+            if elapsed >= self.max_wait_time:
+                if not self.is_generating:
+                    return True
+                if not self.overtime:
+                    self.overtime = True
+                    logger.warning(f"生成已超过预期的{self.max_wait_time:.0f}秒，但仍在进行，"
+                                   f"继续等待（最长{self.hard_limit}秒）")
+
+            # 显示等待进度（每10秒显示一次）
+            if elapsed - self.last_progress_time >= 10:
+                status = "生成中..." if self.is_generating else "等待开始生成..."
+                logger.debug("等待中... (%.0f/%.0f秒) - %s", elapsed, self.max_wait_time, status)
+                self.last_progress_time = elapsed
+
+        except Exception as monitor_e:
+            logger.debug("监测SVG时出错: %s", monitor_e)
+        return False
+
+    def finish(self):
+        """结束等待：记录生成耗时，未正常完成时给出提示"""
+        if self.fixed_wait is not None:
+            return
+
+        if self.record_stats:
+            metrics.GENERATION_SECONDS.observe(self.elapsed)
+
+        if self.completed and self.record_stats:
+            # 只用正常完成的运行更新历史耗时，异常的运行不会拉高超时
+            stats = get_stats()
+            stats.record('generation', self.elapsed)
+            stats.record('generation_start', self.started_after)
+        elif self.is_generating:
+            logger.warning(f"等待{self.elapsed:.0f}秒后SVG仍未恢复初始状态，可能Kimi仍在输出，继续尝试获取回复")
+        else:
+            logger.warning(f"等待{self.elapsed:.0f}秒后未检测到SVG变化，可能页面异常或生成很快，继续尝试获取回复")
+
+        # 额外等待确保内容完全渲染
+        self.deadline.sleep(2)
+
+    def wait(self, check_interval=None, on_poll=None):
+        """
+        阻塞等待直到生成完成或超时
+
+        Args:
+            check_interval (float): 固定的检查间隔（秒），为None时按历史耗时自适应
+            on_poll (callable): 每次检查后调用（生成尚未完成时），用于暂存已生成的内容
+        """
+        if self.fixed_wait is None:
+            logger.debug("开始监测发送按钮SVG变化，预计最长%.0f秒（开始生成最长%.0f秒）...",
+                         self.max_wait_time, self.start_timeout)
+            logger.debug("监测逻辑：SVG变化 → 开始生成 → SVG恢复初始状态 → 生成完成")
+        else:
+            logger.debug("使用回车键发送，等待固定时间...")
+        while not self.poll():
+            if on_poll is not None:
+                on_poll()
+            self.deadline.sleep(check_interval or self.next_interval())
+        self.finish()
+
+
+def _start_capture(page):
+    """
+    按 config.CAPTURE_MODE 在页面上开始捕获流式接口数据
+
+    Returns:
+        StreamCapture: 捕获器，未启用网络捕获或注入失败时返回None
+    """
+    if getattr(config, 'CAPTURE_MODE', 'dom') != 'network':
+        return None
+    from stream_capture import StreamCapture
+    try:
+        return StreamCapture(page).install()
+    except Exception as e:
+        logger.warning(f"无法监听Kimi流式接口，改用页面提取: {e}")
+        return None
+
+
+def _send_prompt(input_box, page, actual_prompt, capture=None, deadline=None, record_stats=True):
+    """
+    输入提示词并发送
+
+    Args:
+        capture (StreamCapture): 网络捕获器，提供时以数据流结束作为完成信号
+        deadline (Deadline): 运行时间预算，发送后由监测器继续使用
+        record_stats (bool): 生成耗时是否计入历史统计（追问的短回复不计入，避免拉低超时）
+
+    Returns:
+        GenerationMonitor: 用于等待本次回复生成完成的监测器
+
+    Raises:
+        Exception: 点击发送按钮和按回车键都失败
+    """
+    ensure_deadline(deadline).check("发送提示词")
+    logger.debug("输入提示词...")
+    input_box.click()
+    time.sleep(0.5)
+    input_box.fill(actual_prompt)
+    time.sleep(0.5)
+    if capture is not None:
+        capture.reset()
+
+    # 查找并点击发送按钮
+    logger.debug("查找发送按钮...")
+    try:
+        send_button = page.locator('.send-button').first
+        start_time = time.time()
+        send_button.wait_for(timeout=_selector_timeout('send_button', 2000, deadline))
+        get_stats().record('send_button', time.time() - start_time)
+        if not (send_button.is_visible() and send_button.is_enabled()):
+            raise Exception("发送按钮不可用")
+
+        # 记录点击前的初始SVG状态
+        logger.debug("记录发送按钮点击前的初始SVG状态...")
+        initial_svg_content = ""
+        try:
+            svg_element = send_button.locator('svg').first
+            if svg_element.is_visible():
+                initial_svg_content = svg_element.inner_html()
+                logger.debug("记录到初始SVG内容 (长度: %s 字符)", len(initial_svg_content))
+        except Exception as svg_e:
+            logger.debug("记录初始SVG失败: %s", svg_e)
+
+        # 点击发送按钮
+        send_button.click()
+        logger.debug("已点击发送按钮")
+
+        # 等待Kimi回复生成完成 - 通过监测发送按钮SVG变化
+        logger.info("等待Kimi回复生成...")
+        monitor = GenerationMonitor(send_button, initial_svg_content, deadline=deadline)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.warning(f"发送按钮点击失败，尝试按回车键: {e}")
+        try:
+            input_box.press('Enter')
+            logger.debug("已按回车键发送")
+            # 如果使用回车键发送，等待固定时间
+            monitor = GenerationMonitor(fixed_wait=20, deadline=deadline)
+        except Exception as e2:
+            logger.error(f"按回车键也失败: {e2}")
+            metrics.FAILURES.inc(type="send")
+            raise Exception("无法发送消息，请检查页面状态")
+
+    monitor.record_stats = record_stats
+    if capture is not None:
+        from stream_capture import StreamMonitor
+        return StreamMonitor(capture, monitor)
+    return monitor
+
+
+def _read_response(page, monitor, actual_prompt, marker):
+    """
+    优先使用数据流中捕获的回复，没有时从页面中提取
+
+    Returns:
+        str: 回复内容，失败时为错误提示
+    """
+    captured_text = getattr(monitor, 'captured_text', '')
+    if len(captured_text) > 50:
+        logger.info(f"成功获取Kimi回复 (总长度: {len(captured_text)} 字符, 提取方案: network)")
+        metrics.EXTRACTION_PATH.inc(path="network")
+        metrics.RESPONSE_LENGTH.observe(len(captured_text))
+        return captured_text
+    return _extract_response(page, actual_prompt, marker)
+
+
+# 在页面内一次性执行全部提取方案的脚本，返回每个方案的候选结果及可信度。
+# 发送前最后一个segment-container之后的都是新内容（按id定位，找不到时按数量），
+# 发送前就已存在的segment只会得到很低的可信度。各方案与 _extract_response_sequential 一一对应：
+#   paragraph / container                    最后一个segment-container（按段落 / 整体）
+#   previous_paragraph / previous_container  最后一个包含用户输入时，倒数第二个
+#   new_segments                             发送后新增的、不含用户输入的全部segment-container
+#   conversation_new                         对话区域中发送后新增的子元素
+_EXTRACT_SCRIPT = """
+({ promptHead, marker, areaSelectors }) => {
+    const isVisible = (el) => !!el && el.getClientRects().length > 0
+        && getComputedStyle(el).visibility !== 'hidden';
+    const text = (el) => ((el && el.innerText) || '').trim();
+    const paragraphs = (container) => Array.from(container.querySelectorAll('.paragraph'))
+        .map(text).filter(Boolean).join('\\n\\n');
+
+    const candidates = [];
+    const add = (strategy, value, confidence) => {
+        if (value) candidates.push({ strategy, text: value, confidence });
+    };
+
+    const list = document.querySelector('.chat-content-list');
+    const root = isVisible(list) ? list : document;
+    const segments = Array.from(root.querySelectorAll('.segment-container'));
+
+    let start = marker.segments || 0;
+    if (marker.lastId) {
+        const index = segments.findIndex((el) => (el.id || el.getAttribute('data-id')) === marker.lastId);
+        if (index >= 0) start = index + 1;
+    }
+    const segmentText = (el) => paragraphs(el) || text(el);
+
+    if (segments.length) {
+        const lastIndex = segments.length - 1;
+        const lastParagraphs = paragraphs(segments[lastIndex]);
+        const lastText = lastParagraphs || text(segments[lastIndex]);
+        // 最后一个segment包含刚发送的提示词时，它多半是用户输入，回复在倒数第二个
+        const isPrompt = lastText.includes(promptHead);
+        add(lastParagraphs ? 'paragraph' : 'container', lastText,
+            isPrompt ? 0.3 : (lastIndex >= start ? 0.95 : 0.1));
+        if (isPrompt && lastIndex >= 1) {
+            const previousParagraphs = paragraphs(segments[lastIndex - 1]);
+            add(previousParagraphs ? 'previous_paragraph' : 'previous_container',
+                previousParagraphs || text(segments[lastIndex - 1]), lastIndex - 1 >= start ? 0.8 : 0.1);
+        }
+    }
+
+    const fresh = segments.slice(start).map(segmentText).filter((value) => value && !value.includes(promptHead));
+    add('new_segments', fresh.join('\\n\\n'), 0.6);
+
+    for (const selector of areaSelectors) {
+        const area = document.querySelector(selector);
+        if (!isVisible(area) || !marker.areas || !(selector in marker.areas)) continue;
+        const lines = Array.from(area.children).slice(marker.areas[selector])
+            .map(text).join('\\n').split('\\n').map((line) => line.trim())
+            .filter((line) => line && !line.startsWith(promptHead));
+        if (lines.length) {
+            add('conversation_new', lines.join('\\n'), 0.5);
+            break;
+        }
+    }
+
+    return { segments: segments.length, candidates };
+}
+"""
+
+
+def _accept_response(response_text, extraction_path):
+    """
+    记录提取结果，回复过短时换成错误提示
+
+    Returns:
+        str: 回复内容，失败时为错误提示
+    """
+    if response_text and len(response_text) > 50:
+        logger.info(f"成功获取Kimi回复 (总长度: {len(response_text)} 字符, 提取方案: {extraction_path})")
+        metrics.EXTRACTION_PATH.inc(path=extraction_path)
+        metrics.RESPONSE_LENGTH.observe(len(response_text))
+        if logger.isEnabledFor(logging.DEBUG):
+            preview = response_text[:100] + "..." if len(response_text) > 100 else response_text
+            logger.debug("回复预览: %s", preview)
+        return response_text
+
+    logger.error("未能获取到Kimi回复")
+    metrics.EXTRACTION_PATH.inc(path="none")
+    metrics.FAILURES.inc(type="extraction")
+    return "无法获取Kimi的回复内容，可能网站结构已更新或网络问题。"
+
+
+def _extract_response(page, actual_prompt, marker):
+    """
+    从页面中提取最新一条回复
+
+    在一次 page.evaluate 中执行全部提取方案，再在Python中选出可信度最高且长度足够的候选，
+    耗时不随失败的方案数量增加。脚本执行失败时改用逐项尝试的 _extract_response_sequential。
+
+    Args:
+        page: Playwright页面对象
+        actual_prompt (str): 实际发送的提示词（用于排除用户输入）
+        marker (dict): 发送前由 _mark_page 记录的对话末尾位置
+
+    Returns:
+        str: 回复内容，失败时为错误提示
+    """
+    logger.info("获取Kimi回复...")
+    start_time = time.perf_counter()
+    try:
+        result = page.evaluate(_EXTRACT_SCRIPT, {'promptHead': actual_prompt[:20], 'marker': marker or {},
+                                                 'areaSelectors': _CONVERSATION_SELECTORS})
+    except Exception as e:
+        logger.warning(f"页面内一次性提取失败，改为逐项尝试: {e}")
+        return _extract_response_sequential(page, actual_prompt, marker)
+
+    metrics.CHAT_SEGMENTS.set(result['segments'])
+    candidates = result['candidates']
+    logger.debug("一次性提取耗时 %.0f 毫秒，候选: %s", (time.perf_counter() - start_time) * 1000,
+                 ', '.join(f"{c['strategy']}={c['confidence']}/{len(c['text'])}字" for c in candidates) or "无")
+
+    # 发送前就已存在的内容（可信度0.1）不会被当作本次回复
+    usable = [c for c in candidates if len(c['text']) > 50 and c['confidence'] >= 0.2]
+    if not usable:
+        return _accept_response("", "none")
+    # 可信度相同时保留脚本中靠前（更精确）的方案
+    best = max(usable, key=lambda c: c['confidence'])
+    return _accept_response(best['text'], best['strategy'])
+
+
+def _extract_response_sequential(page, actual_prompt, marker):
+    """
+    从页面中提取最新一条回复，依次尝试多种方案
+
+    Args:
+        page: Playwright页面对象
+        actual_prompt (str): 实际发送的提示词（用于排除用户输入）
+        marker (dict): 发送前由 _mark_page 记录的对话末尾位置（用于定位新增内容）
+
+    Returns:
+        str: 回复内容，失败时为错误提示
+    """
+    # 获取Kimi回复（使用segment_container类精确定位最新回复）
+    logger.info("获取Kimi回复...")
+    response_text = ""
+    extraction_path = "none"
+    
+    try:
+        # 方案1：使用segment_container类获取最新回复
+        logger.debug("尝试通过segment-container类获取最新回复...")
+        
+        # 首先尝试在chat-content-list容器中查找segment-container
+        segment_containers = []
+        try:
+            # 尝试在chat-content-list容器中查找
+            chat_content_list = page.locator('.chat-content-list').first
+            if chat_content_list.is_visible():
+                segment_containers = chat_content_list.locator('.segment-container').all()
+                logger.debug("在chat-content-list中找到 %s 个segment-container", len(segment_containers))
             else:
-                logger.debug(f"使用原始提示词: {actual_prompt[:50]}...")
+                # 如果没有chat-content-list，直接查找所有segment-container
+                segment_containers = page.locator('.segment-container').all()
+                logger.debug("直接查找到 %s 个segment-container", len(segment_containers))
+        except Exception as e:
+            logger.debug("查找segment-container失败: %s", e)
+            # 备用方案：直接查找所有segment-container
+            segment_containers = page.locator('.segment-container').all()
+            logger.debug("备用方案找到 %s 个segment-container", len(segment_containers))
 
-            input_box.click()
-            time.sleep(0.5)
-            input_box.fill(actual_prompt)
-            time.sleep(0.5)
+        metrics.CHAT_SEGMENTS.set(len(segment_containers))
 
-            # 查找并点击发送按钮
-            logger.debug("查找发送按钮...")
-            send_button = None
-            try:
-                send_button = page.locator('.send-button').first
-                send_button.wait_for(timeout=2000)
-                if send_button.is_visible() and send_button.is_enabled():
-                    # 记录点击前的初始SVG状态
-                    logger.debug("记录发送按钮点击前的初始SVG状态...")
-                    initial_svg_content = ""
+        if segment_containers:
+            # 获取最后一个segment-container（最新的回复）
+            last_container = segment_containers[-1]
+            
+            # 尝试按paragraph类分段获取文本
+            logger.debug("尝试按paragraph类分段获取文本...")
+            paragraph_elements = last_container.locator('.paragraph').all()
+            
+            if paragraph_elements:
+                paragraph_texts = []
+                for para in paragraph_elements:
                     try:
-                        svg_element = send_button.locator('svg').first
-                        if svg_element.is_visible():
-                            initial_svg_content = svg_element.inner_html()
-                            logger.debug(f"记录到初始SVG内容 (长度: {len(initial_svg_content)} 字符)")
-                    except Exception as svg_e:
-                        logger.debug(f"记录初始SVG失败: {svg_e}")
-                    
-                    # 点击发送按钮
-                    send_button.click()
-                    logger.debug("已点击发送按钮")
-                    
-                    # 等待Kimi回复生成完成 - 通过监测发送按钮SVG变化
-                    logger.info("等待Kimi回复生成...")
-                    
-                    # 监测SVG变化，最长等待2分钟
-                    generation_completed = False
-                    max_wait_time = 300  # 最长等待5分钟
-                    start_time = time.time()
-                    check_interval = 1  # 每1秒检查一次，提高检测精度
-                    
-                    # 状态跟踪
-                    is_generating = False  # 是否正在生成（SVG与初始状态不一致）
-                    last_progress_time = 0  # 上次显示进度的时间
-                    
-                    logger.debug(f"开始监测发送按钮SVG变化，最长等待{max_wait_time}秒...")
-                    logger.debug("监测逻辑：SVG变化 → 开始生成 → SVG恢复初始状态 → 生成完成")
-                    
-                    while time.time() - start_time < max_wait_time:
-                        try:
-                            current_svg_content = ""
-                            svg_element = send_button.locator('svg').first
-                            if svg_element.is_visible():
-                                current_svg_content = svg_element.inner_html()
-                            
-                            # 检查当前SVG状态
-                            if initial_svg_content:
-                                svg_changed = current_svg_content != initial_svg_content
-                                
-                                if not is_generating and svg_changed:
-                                    # SVG发生变化，开始生成
-                                    is_generating = True
-                                    elapsed_time = time.time() - start_time
-                                    logger.info(f"检测到SVG变化，Kimi开始生成回复 (耗时: {elapsed_time:.1f}秒)")
-                                
-                                elif is_generating and not svg_changed:
-                                    # SVG恢复初始状态，生成完成
-                                    elapsed_time = time.time() - start_time
-                                    logger.info(f"SVG恢复初始状态，Kimi回复生成完成 (总耗时: {elapsed_time:.1f}秒)")
-                                    generation_completed = True
-                                    break
-                            
-                            # 显示等待进度（每10秒显示一次）
-                            elapsed = time.time() - start_time
-                            if elapsed - last_progress_time >= 10:
-                                status = "生成中..." if is_generating else "等待开始生成..."
-                                logger.debug(f"等待中... ({elapsed:.0f}/{max_wait_time}秒) - {status}")
-                                last_progress_time = elapsed
-                            
-                            time.sleep(check_interval)
-                            
-                        except Exception as monitor_e:
-                            logger.debug(f"监测SVG时出错: {monitor_e}")
-                            time.sleep(check_interval)
-                            continue
-                    
-                    if not generation_completed:
-                        if is_generating:
-                            logger.warning(f"等待{max_wait_time}秒后SVG仍未恢复初始状态，可能Kimi仍在输出，继续尝试获取回复")
-                        else:
-                            logger.warning(f"等待{max_wait_time}秒后未检测到SVG变化，可能页面异常或生成很快，继续尝试获取回复")
-                    
-                    # 额外等待确保内容完全渲染
-                    time.sleep(2)
-                    
+                        para_text = para.inner_text().strip()
+                        if para_text:
+                            paragraph_texts.append(para_text)
+                    except Exception as para_e:
+                        logger.debug("提取段落文本失败: %s", para_e)
+                        continue
+                
+                if paragraph_texts:
+                    response_text = '\n\n'.join(paragraph_texts)
+                    extraction_path = "paragraph"
+                    logger.debug("按paragraph类获取到 %s 个段落 (总长度: %s 字符)", len(paragraph_texts), len(response_text))
                 else:
-                    raise Exception("发送按钮不可用")
-            except Exception as e:
-                logger.warning(f"发送按钮点击失败，尝试按回车键: {e}")
-                try:
-                    input_box.press('Enter')
-                    logger.debug("已按回车键发送")
-                    # 如果使用回车键发送，等待固定时间
-                    logger.debug("使用回车键发送，等待固定时间...")
-                    time.sleep(20)
-                except Exception as e2:
-                    logger.error(f"按回车键也失败: {e2}")
-                    raise Exception("无法发送消息，请检查页面状态")
-
-            # 获取Kimi回复（使用segment_container类精确定位最新回复）
-            logger.info("获取Kimi回复...")
-            response_text = ""
+                    logger.debug("未找到有效的paragraph内容，回退到整体提取...")
+                    response_text = last_container.inner_text().strip()
+                    extraction_path = "container"
+                    logger.debug("整体提取获取到回复 (长度: %s 字符)", len(response_text))
+            else:
+                logger.debug("未找到paragraph类，使用整体提取...")
+                response_text = last_container.inner_text().strip()
+                extraction_path = "container"
+                logger.debug("从最后一个segment-container获取到回复 (长度: %s 字符)", len(response_text))
             
-            try:
-                # 方案1：使用segment_container类获取最新回复
-                logger.debug("尝试通过segment-container类获取最新回复...")
-                
-                # 首先尝试在chat-content-list容器中查找segment-container
-                segment_containers = []
-                try:
-                    # 尝试在chat-content-list容器中查找
-                    chat_content_list = page.locator('.chat-content-list').first
-                    if chat_content_list.is_visible():
-                        segment_containers = chat_content_list.locator('.segment-container').all()
-                        logger.debug(f"在chat-content-list中找到 {len(segment_containers)} 个segment-container")
-                    else:
-                        # 如果没有chat-content-list，直接查找所有segment-container
-                        segment_containers = page.locator('.segment-container').all()
-                        logger.debug(f"直接查找到 {len(segment_containers)} 个segment-container")
-                except Exception as e:
-                    logger.debug(f"查找segment-container失败: {e}")
-                    # 备用方案：直接查找所有segment-container
-                    segment_containers = page.locator('.segment-container').all()
-                    logger.debug(f"备用方案找到 {len(segment_containers)} 个segment-container")
-
-                if segment_containers:
-                    # 获取最后一个segment-container（最新的回复）
-                    last_container = segment_containers[-1]
+            # 检查是否包含用户输入（如果最后一个segment包含我们刚发送的内容，说明它可能是用户输入）
+            if actual_prompt[:20] in response_text:
+                logger.debug("最后一个segment-container包含用户输入，尝试倒数第二个...")
+                if len(segment_containers) >= 2:
+                    second_last_container = segment_containers[-2]
                     
-                    # 尝试按paragraph类分段获取文本
-                    logger.debug("尝试按paragraph类分段获取文本...")
-                    paragraph_elements = last_container.locator('.paragraph').all()
+                    # 尝试从倒数第二个segment-container按paragraph类分段获取文本
+                    logger.debug("尝试从倒数第二个segment-container按paragraph类分段获取文本...")
+                    alt_paragraph_elements = second_last_container.locator('.paragraph').all()
                     
-                    if paragraph_elements:
-                        paragraph_texts = []
-                        for para in paragraph_elements:
+                    if alt_paragraph_elements:
+                        alt_paragraph_texts = []
+                        for para in alt_paragraph_elements:
                             try:
                                 para_text = para.inner_text().strip()
                                 if para_text:
-                                    paragraph_texts.append(para_text)
+                                    alt_paragraph_texts.append(para_text)
                             except Exception as para_e:
-                                logger.debug(f"提取段落文本失败: {para_e}")
+                                logger.debug("提取倒数第二个段落文本失败: %s", para_e)
                                 continue
                         
-                        if paragraph_texts:
-                            response_text = '\n\n'.join(paragraph_texts)
-                            logger.debug(f"按paragraph类获取到 {len(paragraph_texts)} 个段落 (总长度: {len(response_text)} 字符)")
+                        if alt_paragraph_texts:
+                            alt_response = '\n\n'.join(alt_paragraph_texts)
+                            response_text = alt_response
+                            extraction_path = "previous_paragraph"
+                            logger.debug("从倒数第二个segment-container按paragraph类获取到 %s 个段落 (总长度: %s 字符)", len(alt_paragraph_texts), len(alt_response))
                         else:
-                            logger.debug("未找到有效的paragraph内容，回退到整体提取...")
-                            response_text = last_container.inner_text().strip()
-                            logger.debug(f"整体提取获取到回复 (长度: {len(response_text)} 字符)")
+                            logger.debug("倒数第二个segment-container未找到有效的paragraph内容，回退到整体提取...")
+                            response_text = second_last_container.inner_text().strip()
+                            extraction_path = "previous_container"
                     else:
-                        logger.debug("未找到paragraph类，使用整体提取...")
-                        response_text = last_container.inner_text().strip()
-                        logger.debug(f"从最后一个segment-container获取到回复 (长度: {len(response_text)} 字符)")
-                    
-                    # 检查是否包含用户输入（如果最后一个segment包含我们刚发送的内容，说明它可能是用户输入）
-                    if actual_prompt[:20] in response_text:
-                        logger.debug("最后一个segment-container包含用户输入，尝试倒数第二个...")
-                        if len(segment_containers) >= 2:
-                            second_last_container = segment_containers[-2]
-                            
-                            # 尝试从倒数第二个segment-container按paragraph类分段获取文本
-                            logger.debug("尝试从倒数第二个segment-container按paragraph类分段获取文本...")
-                            alt_paragraph_elements = second_last_container.locator('.paragraph').all()
-                            
-                            if alt_paragraph_elements:
-                                alt_paragraph_texts = []
-                                for para in alt_paragraph_elements:
-                                    try:
-                                        para_text = para.inner_text().strip()
-                                        if para_text:
-                                            alt_paragraph_texts.append(para_text)
-                                    except Exception as para_e:
-                                        logger.debug(f"提取倒数第二个段落文本失败: {para_e}")
-                                        continue
-                                
-                                if alt_paragraph_texts:
-                                    alt_response = '\n\n'.join(alt_paragraph_texts)
-                                    response_text = alt_response
-                                    logger.debug(f"从倒数第二个segment-container按paragraph类获取到 {len(alt_paragraph_texts)} 个段落 (总长度: {len(alt_response)} 字符)")
-                                else:
-                                    logger.debug("倒数第二个segment-container未找到有效的paragraph内容，回退到整体提取...")
-                                    response_text = second_last_container.inner_text().strip()
-                            else:
-                                logger.debug("倒数第二个segment-container未找到paragraph类，使用整体提取...")
-                                try:
-                                    response_text = second_last_container.inner_text().strip()
-                                except Exception as alt_e:
-                                    logger.debug(f"从倒数第二个segment-container提取失败: {alt_e}")
-                                    # 保持使用最后一个的结果
-                                    pass
-                            
-                            if response_text:
-                                logger.debug(f"从倒数第二个segment-container获取到回复 (长度: {len(response_text)} 字符)")
+                        logger.debug("倒数第二个segment-container未找到paragraph类，使用整体提取...")
+                        try:
+                            response_text = second_last_container.inner_text().strip()
+                            extraction_path = "previous_container"
+                        except Exception as alt_e:
+                            logger.debug("从倒数第二个segment-container提取失败: %s", alt_e)
+                            # 保持使用最后一个的结果
+                            pass
                     
-            except Exception as e:
-                logger.debug(f"从segment-container提取文本失败: {e}")
+                    if response_text:
+                        logger.debug("从倒数第二个segment-container获取到回复 (长度: %s 字符)", len(response_text))
             
-            if not response_text:
-                logger.debug("未找到任何segment-container")
+    except Exception as e:
+        logger.debug("从segment-container提取文本失败: %s", e)
+    
+    if not response_text:
+        logger.debug("未找到任何segment-container")
 
-            # 如果segment-container方法失败，使用备用方案
-            if not response_text:
-                logger.debug("segment-container方法失败，使用备用方案...")
-                
-                # 备用方案1：查找对话区域的所有文本
-                conversation_selectors = [
-                    '.conversation-content',
-                    '.chat-content',
-                    '.message-list',
-                    '.chat-messages',
-                    '.conversation-list'
-                ]
-                
-                for selector in conversation_selectors:
-                    try:
-                        conversation_area = page.locator(selector).first
-                        if conversation_area.is_visible():
-                            # 获取所有文本内容
-                            full_content = conversation_area.inner_text()
-                            
-                            # 尝试通过差集去除发送前的内容
-                            if pre_send_content and len(pre_send_content) > 100:
-                                # 简单的差集处理：找到新增的内容
-                                if len(full_content) > len(pre_send_content):
-                                    # 获取新增的部分
-                                    new_content = full_content[len(pre_send_content):].strip()
-                                    if new_content:
-                                        # 进一步清理：移除可能的用户输入
-                                        lines = new_content.split('\n')
-                                        collected_texts = []
-                                        for line in lines:
-                                            line = line.strip()
-                                            if line and not line.startswith(actual_prompt[:20]):
-                                                collected_texts.append(line)
-                                        
-                                        if collected_texts:
-                                            response_text = '\n'.join(collected_texts)
-                                            logger.debug(f"从对话区域获取到回复 (片段数: {len(collected_texts)}, 长度: {len(response_text)} 字符)")
-                                            break
-                    except Exception as e:
-                        logger.debug(f"对话区域选择器 {selector} 失败: {e}")
+    # 如果segment-container方法失败，使用备用方案
+    if not response_text:
+        logger.debug("segment-container方法失败，使用备用方案...")
+        marker = marker or {}
+
+        # 备用方案1：发送后新增的segment-container（按发送前记录的数量定位）
+        try:
+            new_texts = []
+            for container in segment_containers[marker.get('segments', 0):]:
+                text = container.inner_text().strip()
+                if text and actual_prompt[:20] not in text:
+                    new_texts.append(text)
+            if new_texts:
+                response_text = '\n\n'.join(new_texts)
+                extraction_path = "new_segments"
+                logger.debug("从新增的segment-container获取到回复 (个数: %s, 长度: %s 字符)", len(new_texts), len(response_text))
+        except Exception as e:
+            logger.debug("按位置查找新增segment-container失败: %s", e)
+
+        # 备用方案2：对话区域中发送后新增的子元素
+        if not response_text:
+            for selector in _CONVERSATION_SELECTORS:
+                start = marker.get('areas', {}).get(selector)
+                if start is None:
+                    continue
+                try:
+                    conversation_area = page.locator(selector).first
+                    if not conversation_area.is_visible():
                         continue
-                
-                # 备用方案2：获取页面后半部分的新内容
-                if not response_text:
-                    logger.debug("使用最终备用方案...")
-                    try:
-                        # 获取当前页面的所有文本
-                        current_content = page.locator('body').inner_text()
-                        
-                        # 如果有发送前的内容记录，尝试找到差异
-                        if pre_send_content and len(current_content) > len(pre_send_content):
-                            # 简单的新内容提取
-                            potential_new_content = current_content[len(pre_send_content):].strip()
-                            if potential_new_content and len(potential_new_content) > 50:
-                                response_text = potential_new_content
-                                logger.debug(f"从页面后半部分获取回复 (长度: {len(response_text)} 字符)")
-                        
-                    except Exception as e:
-                        logger.debug(f"最终备用方案失败: {e}")
+                    collected_texts = []
+                    for child in conversation_area.locator(':scope > *').all()[start:]:
+                        for line in child.inner_text().split('\n'):
+                            line = line.strip()
+                            # 移除可能的用户输入
+                            if line and not line.startswith(actual_prompt[:20]):
+                                collected_texts.append(line)
+                    if collected_texts:
+                        response_text = '\n'.join(collected_texts)
+                        extraction_path = "conversation_new"
+                        logger.debug("从对话区域获取到回复 (片段数: %s, 长度: %s 字符)", len(collected_texts), len(response_text))
+                        break
+                except Exception as e:
+                    logger.debug("对话区域选择器 %s 失败: %s", selector, e)
+                    continue
 
-            if not response_text:
-                logger.error(f"获取回复时发生错误: {e}")
-                response_text = "无法获取Kimi的回复内容，可能网站结构已更新或网络问题。"
+    return _accept_response(response_text, extraction_path)
 
-            if response_text and len(response_text) > 50:
-                logger.info(f"成功获取Kimi回复 (总长度: {len(response_text)} 字符)")
-                preview = response_text[:100] + "..." if len(response_text) > 100 else response_text
-                logger.debug(f"回复预览: {preview}")
-            else:
-                logger.error("未能获取到Kimi回复")
-                response_text = "无法获取Kimi的回复内容，可能网站结构已更新或网络问题。"
-
-            # 如果创建了新对话，尝试修改标题
-            if need_new_chat and hasattr(config, 'TARGET_CHAT_NAME') and config.TARGET_CHAT_NAME:
-                logger.info("检测到创建了新对话，开始修改对话标题...")
-                title = config.TARGET_CHAT_NAME
-                if rename_chat_title(page, title):
-                    logger.info("对话标题修改成功")
+
+def _rename_new_chat(page, need_new_chat, target_chat_name, deadline=None):
+    """如果创建了新对话，尝试修改标题（运行预算不足时跳过，不影响本次回复）"""
+    if need_new_chat and target_chat_name:
+        remaining = ensure_deadline(deadline).remaining()
+        if remaining < RENAME_MIN_SECONDS:
+            logger.warning(f"运行预算仅剩{remaining:.0f}秒，跳过修改对话标题")
+            return
+        logger.info("检测到创建了新对话，开始修改对话标题...")
+        if rename_chat_title(page, target_chat_name):
+            logger.info("对话标题修改成功")
+        else:
+            logger.warning("对话标题修改失败，但不影响主要功能")
+
+
+# 生成过程中读取最后一个segment-container的全部段落（发送前就存在的、或是用户输入时返回空列表）
+_PARTIAL_SCRIPT = """
+({ promptHead, marker }) => {
+    const list = document.querySelector('.chat-content-list');
+    const root = list && list.getClientRects().length > 0 ? list : document;
+    const segments = Array.from(root.querySelectorAll('.segment-container'));
+    let start = marker.segments || 0;
+    if (marker.lastId) {
+        const index = segments.findIndex((el) => (el.id || el.getAttribute('data-id')) === marker.lastId);
+        if (index >= 0) start = index + 1;
+    }
+    const last = segments[segments.length - 1];
+    if (!last || segments.length - 1 < start) return [];
+    const paragraphs = Array.from(last.querySelectorAll('.paragraph'))
+        .map((el) => (el.innerText || '').trim()).filter(Boolean);
+    if (paragraphs.some((value) => value.includes(promptHead))) return [];
+    return paragraphs;
+}
+"""
+
+
+def _track_progress(page, monitor, progress, actual_prompt, marker, final=False):
+    """
+    把已生成的段落追加到回复暂存：网络捕获时按数据流，否则读取页面中最后一个segment-container
+
+    Args:
+        progress (PartialReply): 回复暂存，为None时什么都不做
+        final (bool): 生成已结束或被中断，最后一段也一并保存
+    """
+    if progress is None:
+        return
+    try:
+        partial_text = getattr(monitor, 'partial_text', '')
+        if partial_text:
+            paragraphs = [p for p in partial_text.split('\n\n') if p.strip()]
+        else:
+            paragraphs = page.evaluate(_PARTIAL_SCRIPT, {'promptHead': actual_prompt[:20], 'marker': marker or {}})
+        progress.update(paragraphs, final=final)
+    except Exception as e:
+        logger.debug("暂存已生成的内容失败: %s", e)
+
+
+def _salvage(track, progress):
+    """
+    生成被中断时保存最后一批段落，并用暂存中已完成的部分拼出摘要
+
+    Returns:
+        str: 摘要，没有可用内容时为None
+    """
+    if track is None or progress is None:
+        return None
+    track(final=True)
+    return progress.digest()
+
+
+def _repair_response(page, prompt, response_text, capture=None, deadline=None):
+    """按提示词要求的结构检查回复，缺少的部分在同一对话中追问并拼回原回复"""
+    spec = ReplySpec.from_prompt(prompt)
+    if spec is None or "无法获取" in response_text:
+        return response_text
+
+    def ask(followup):
+        input_box = _find_input_box(page, deadline)
+        marker = _mark_page(page)
+        monitor = _send_prompt(input_box, page, followup, capture, deadline, record_stats=False)
+        monitor.wait()
+        return _read_response(page, monitor, followup, marker)
+
+    return repair_reply(response_text, spec, ask, deadline)
+
+
+def _finish_session(session, page, need_new_chat, target_chat_name, deadline, response_text, start_time):
+    """回复提取之后的收尾工作：修改新对话标题、运行过慢时保存故障记录、关闭浏览器，出错只记录日志"""
+    try:
+        with session.phase('rename'):
+            _rename_new_chat(page, need_new_chat, target_chat_name, deadline)
+
+        if time.time() - start_time > getattr(config, 'FLIGHT_RECORDER_SLOW_SECONDS', 600):
+            session.dump("slow", f"运行耗时 {time.time() - start_time:.0f} 秒")
+    except Exception as e:
+        logger.warning(f"收尾工作出错，不影响已获取的回复: {e}")
+    finally:
+        # 关闭浏览器
+        session.close()
+
+
+def get_kimi_response(prompt, use_existing_chat=True, session=None, target_chat_name=None, deadline=None,
+                      on_response=None):
+    """
+    使用Playwright与Kimi网页版交互，获取回复。
+    回复不符合提示词要求的结构时，在同一对话中追问缺少的部分并拼回（见 reply_spec）。
+
+    Args:
+        prompt (str): 要发送给Kimi的提示词。
+        use_existing_chat (bool): 是否使用现有对话，默认True
+        session (KimiSession): 浏览器会话，尚未启动的会话会在此启动，
+            为None时使用默认用户数据目录现场启动。会话在本函数结束时关闭。
+        target_chat_name (str): 目标会话名称，为None时使用config.TARGET_CHAT_NAME
+        deadline (Deadline): 运行时间预算，用完或被取消时停止等待并返回错误信息
+        on_response (callable): 回复提取出来后立即以回复内容和生成期间已格式化好的HTML（可能为None）调用
+            （早于修改标题和关闭浏览器），用于尽早发送邮件；回调应尽快返回，获取失败时不调用
+
+    Returns:
+        str: Kimi的回复内容，如果失败则返回错误信息。
+
+    Raises:
+        KimiAuthError: 登录状态失效（找不到输入框且登录预检确认失效）
+    """
+    if target_chat_name is None:
+        target_chat_name = getattr(config, 'TARGET_CHAT_NAME', None)
+
+    start_time = time.time()
+    progress = track = None
+    try:
+        if session is None:
+            session = KimiSession()
+        if session.page is None:
+            session.start(deadline)
+        page = session.page
+
+        capture = _start_capture(page)
+
+        with session.phase('open_chat'):
+            chat_found, need_new_chat = _open_chat(page, use_existing_chat, target_chat_name, deadline)
+
+        with session.phase('input_box'):
+            input_box = _find_input_box(page, deadline, session)
+        actual_prompt = _choose_prompt(prompt, chat_found)
+        marker = _mark_page(page)
+
+        with session.phase('send'):
+            monitor = _send_prompt(input_box, page, actual_prompt, capture, deadline)
+        # 生成期间把已写完的段落逐段暂存，超时或中断时仍有可用的部分
+        progress = PartialReply.start()
+        track = partial(_track_progress, page, monitor, progress, actual_prompt, marker)
+        with session.phase('generation'):
+            monitor.wait(on_poll=track)
+
+        with session.phase('extraction'):
+            response_text = _read_response(page, monitor, actual_prompt, marker)
+        response_text = response_text.strip() if response_text else "无法获取Kimi的回复内容，可能网站结构已更新或网络问题。"
+        rendered = None
+        if "无法获取" in response_text:
+            session.dump("extraction", response_text)
+            response_text = _salvage(track, progress) or response_text
+        elif progress is not None:
+            progress.discard()
+        with session.phase('repair'):
+            response_text = _repair_response(page, prompt, response_text, capture, deadline)
+        if progress is not None and "无法获取" not in response_text:
+            # 生成期间已格式化好的问题直接复用，只格式化其余部分
+            rendered = progress.render(response_text)
+
+        # 先交付，再收尾：回调开始发送邮件的同时修改标题、关闭浏览器
+        if on_response is not None:
+            on_response(response_text, rendered)
+        _finish_session(session, page, need_new_chat, target_chat_name, deadline, response_text, start_time)
+
+        return response_text
+
+    except KimiAuthError as e:
+        if session is not None:
+            session.dump("auth", str(e))
+            session.close()
+        raise
+    except DeadlineExceeded as e:
+        logger.error(f"停止与Kimi交互: {e}")
+        metrics.FAILURES.inc(type="deadline")
+        salvaged = _salvage(track, progress)
+        if session is not None:
+            session.dump("deadline", str(e))
+            session.close()
+        return salvaged or f"自动化获取内容失败，错误信息: {e}"
+    except Exception as e:
+        logger.error(f"与Kimi交互时发生错误: {e}")
+        metrics.FAILURES.inc(type="browser")
+        salvaged = _salvage(track, progress)
+        if session is not None:
+            session.dump("error", f"{type(e).__name__}: {e}")
+            session.close()
+        return salvaged or f"自动化获取内容失败，错误信息: {e}"
+
+
+def get_kimi_responses(requests, use_existing_chat=True, session=None, deadline=None, on_results=None):
+    """
+    在同一个浏览器中为多个提示词各开一个标签页，并发生成回复。
+    使用登录状态文件时，每个提示词在各自隔离的浏览器上下文中运行。
+
+    所有提示词先依次发送，再统一轮询各标签页的生成状态，哪个先完成就先提取哪个，
+    总耗时接近最慢的那个提示词，而不是全部耗时之和。
+    回复缺少的部分在全部标签页结束后再逐个追问，追问不会阻塞其他标签页的轮询。
+    运行预算用完时保留已完成的回复，其余提示词记为失败。
+
+    Args:
+        requests (list[dict]): 每项包含 name、prompt，可选 target_chat、continue_prompt
+        use_existing_chat (bool): 是否使用现有对话
+        session (KimiSession): 浏览器会话，尚未启动的会话会在此启动，结束时关闭
+        deadline (Deadline): 运行时间预算
+        on_results (callable): 全部回复获取完成后立即以结果字典和 {name: 已格式化好的HTML} 调用
+            （早于修改标题和关闭浏览器），用于尽早发送邮件
+
+    Returns:
+        dict: {name: 回复内容或错误信息}
+
+    Raises:
+        KimiAuthError: 所有标签页都因登录失效而无法发送提示词
+    """
+    results = {}
+    tasks = []
+    auth_errors = []
+    deadline = ensure_deadline(deadline)
+    try:
+        if session is None:
+            session = KimiSession()
+        if session.page is None:
+            session.start(deadline)
+
+        # 1. 依次在各自的标签页中选择对话并发送提示词
+        for index, request in enumerate(requests):
+            name = request['name']
+            page = None
+            try:
+                if index == 0:
+                    page = session.page
                 else:
-                    logger.warning("对话标题修改失败，但不影响主要功能")
+                    page = session.new_page(deadline)
 
-            # 关闭浏览器
-            logger.debug("关闭浏览器...")
-            browser.close()
-            logger.debug("浏览器已关闭")
+                logger.info(f"[{name}] 发送提示词...")
+                target_chat_name = request.get('target_chat')
+                capture = _start_capture(page)
+                chat_found, need_new_chat = _open_chat(page, use_existing_chat, target_chat_name, deadline)
+                input_box = _find_input_box(page, deadline, session)
+                actual_prompt = _choose_prompt(request['prompt'], chat_found, request.get('continue_prompt'))
+                marker = _mark_page(page)
+                monitor = _send_prompt(input_box, page, actual_prompt, capture, deadline)
+                progress = PartialReply.start(f"tab{index + 1}")
+                tasks.append({
+                    'name': name,
+                    'page': page,
+                    'monitor': monitor,
+                    'actual_prompt': actual_prompt,
+                    'marker': marker,
+                    'prompt': request['prompt'],
+                    'capture': capture,
+                    'progress': progress,
+                    'track': partial(_track_progress, page, monitor, progress, actual_prompt, marker),
+                    'need_new_chat': need_new_chat,
+                    'target_chat': target_chat_name,
+                })
+            except Exception as e:
+                logger.error(f"[{name}] 发送提示词失败: {e}")
+                results[name] = f"自动化获取内容失败，错误信息: {e}"
+                session.dump(f"send_{index + 1}", f"[{name}] {type(e).__name__}: {e}", page=page)
+                if isinstance(e, KimiAuthError):
+                    auth_errors.append(e)
 
-            return response_text.strip() if response_text else "无法获取Kimi的回复内容，可能网站结构已更新或网络问题。"
+        if auth_errors and len(auth_errors) == len(requests):
+            # 所有标签页共用同一个登录身份，全部认证失败时交给调用方记入熔断器，不发送错误邮件
+            raise auth_errors[0]
 
-        except Exception as e:
-            logger.error(f"与Kimi交互时发生错误: {e}")
+        # 2. 轮询所有标签页，生成完成一个就提取一个
+        pending = list(tasks)
+        extracted = []
+        try:
+            while pending:
+                for task in list(pending):
+                    if not task['monitor'].poll():
+                        task['track']()
+                        continue
+                    task['monitor'].finish()
+                    pending.remove(task)
+                    response_text = _read_response(task['page'], task['monitor'], task['actual_prompt'],
+                                                   task['marker']).strip()
+                    if "无法获取" in response_text:
+                        session.dump("extraction", f"[{task['name']}] {response_text}", page=task['page'])
+                        response_text = _salvage(task['track'], task['progress']) or response_text
+                    elif task['progress'] is not None:
+                        task['progress'].discard()
+                    results[task['name']] = response_text
+                    extracted.append(task)
+                    logger.info(f"[{task['name']}] 回复已获取，剩余 {len(pending)} 个")
+                if pending:
+                    deadline.sleep(min(task['monitor'].next_interval() for task in pending))
+        except DeadlineExceeded as e:
+            logger.error(f"停止等待其余 {len(pending)} 个回复: {e}")
+            metrics.FAILURES.inc(type="deadline")
+            for task in pending:
+                results[task['name']] = (_salvage(task['track'], task['progress'])
+                                         or f"自动化获取内容失败，错误信息: {e}")
+            session.dump("deadline", str(e), page=pending[0]['page'])
+
+        # 3. 全部标签页结束后再补全缺少的部分（预算不足时 repair 不再追问）
+        for task in extracted:
+            results[task['name']] = _repair_response(task['page'], task['prompt'], results[task['name']],
+                                                      task['capture'], deadline)
+
+        # 4. 先交付，再处理新对话的标题（出错只记录日志）
+        if on_results is not None:
+            rendered = {task['name']: task['progress'].render(results[task['name']]) for task in extracted
+                        if task['progress'] is not None and "无法获取" not in results[task['name']]}
+            on_results(dict(results), rendered)
+        for task in tasks:
             try:
-                if 'browser' in locals() and browser:
-                    browser.close()
-                    logger.debug("浏览器已关闭")
-            except Exception as close_error:
-                logger.debug(f"关闭浏览器时出错: {close_error}")
-            return f"自动化获取内容失败，错误信息: {e}"
\ No newline at end of file
+                _rename_new_chat(task['page'], task['need_new_chat'], task['target_chat'], deadline)
+            except Exception as e:
+                logger.warning(f"[{task['name']}] 修改对话标题出错，不影响已获取的回复: {e}")
+
+    except KimiAuthError:
+        raise
+    except Exception as e:
+        logger.error(f"与Kimi交互时发生错误: {e}")
+        metrics.FAILURES.inc(type="browser")
+        for request in requests:
+            results.setdefault(request['name'], f"自动化获取内容失败，错误信息: {e}")
+        if session is not None:
+            session.dump("error", f"{type(e).__name__}: {e}")
+    finally:
+        if session is not None:
+            session.close()
+
+    return results
@@ -4,10 +4,17 @@
 提供统一的日志管理，支持不同级别的日志输出
 """
 
+import atexit
+import copy
+import glob
+import gzip
 import logging
-import sys
-from datetime import datetime
+import logging.handlers
 import os
+import queue
+import shutil
+import sys
+import time
 
 class ColoredFormatter(logging.Formatter):
     """带颜色的日志格式化器"""
@@ -23,6 +30,8 @@ class ColoredFormatter(logging.Formatter):
     }
     
     def format(self, record):
+        # 复制一份记录再着色，避免颜色码串入共享同一记录的文件处理器
+        record = copy.copy(record)
         # 添加颜色
         if hasattr(record, 'levelname'):
             color = self.COLORS.get(record.levelname, self.COLORS['RESET'])
@@ -30,63 +39,247 @@ class ColoredFormatter(logging.Formatter):
         
         return super().format(record)
 
-def setup_logger(name="KimiAutoMail", level=logging.INFO, log_to_file=True):
+class CompressedRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    按大小和时间双重条件轮转的文件处理器
+
+    轮转后的旧文件会被gzip压缩，并且只保留最近 backup_count 个，
+    避免 logs 目录无限增长。
+
+    按时间轮转以文件第一条日志的时间为起点：每次写入都会更新修改时间，
+    用修改时间计算的话，频繁启动的进程永远等不到轮转时间。
+    """
+
+    # 文件日志每行开头的时间格式（与 setup_logger 中的 file_formatter 一致）
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, interval_hours=24,
+                 backup_count=14, encoding='utf-8'):
+        self.max_bytes = max_bytes
+        self.interval = max(1, int(interval_hours * 3600))
+        self.backup_count = backup_count
+        super().__init__(filename, 'a', encoding=encoding, delay=True)
+        self.rotator = self._gzip_rotator
+        self.rollover_at = self._compute_rollover(self._current_file_start())
+
+    def _current_file_start(self):
+        """
+        Returns:
+            float: 当前日志文件的开始时间：第一行日志的时间戳，文件不存在或为空时为现在；
+                第一行无法解析时用文件的创建时间（不支持时为0，即立即轮转）
+        """
+        try:
+            with open(self.baseFilename, 'r', encoding=self.encoding, errors='replace') as f:
+                first_line = f.readline()
+        except OSError:
+            return time.time()
+        if not first_line:
+            return time.time()
+        try:
+            return time.mktime(time.strptime(first_line[:19], self.TIME_FORMAT))
+        except ValueError:
+            return getattr(os.stat(self.baseFilename), 'st_birthtime', 0)
+
+    def _compute_rollover(self, start):
+        return start + self.interval
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at:
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.seek(0, 2)
+            if self.stream.tell() >= self.max_bytes:
+                return True
+        return False
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            # 轮转文件名带秒级时间戳，同一天内按大小多次轮转也不会冲突
+            suffix = time.strftime('%Y%m%d-%H%M%S')
+            dfn = self.rotation_filename(f"{self.baseFilename}.{suffix}.gz")
+            counter = 1
+            while os.path.exists(dfn):
+                dfn = self.rotation_filename(f"{self.baseFilename}.{suffix}-{counter}.gz")
+                counter += 1
+            self.rotate(self.baseFilename, dfn)
+            self._delete_old_files()
+
+        self.rollover_at = self._compute_rollover(time.time())
+        self.stream = self._open()
+
+    @staticmethod
+    def _gzip_rotator(source, dest):
+        with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+    def _delete_old_files(self):
+        if self.backup_count <= 0:
+            return
+        old_files = sorted(glob.glob(f"{glob.escape(self.baseFilename)}.*.gz"), key=os.path.getmtime)
+        for path in old_files[:-self.backup_count]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# 后台日志线程（每个日志器一个）：所有真正的输出（控制台、文件）都在这些线程中完成，
+# 业务代码中的日志调用只需把记录放入队列，不会被磁盘IO阻塞
+_listeners = {}
+
+
+def _stop_listener(name):
+    listener = _listeners.pop(name, None)
+    if listener is not None:
+        listener.stop()
+    return listener
+
+
+def _stop_all_listeners():
+    for name in list(_listeners):
+        _stop_listener(name)
+
+
+def setup_logger(name="KimiAutoMail", level=logging.INFO, log_to_file=True,
+                 log_file_prefix="kimi_auto_mail", file_level=logging.DEBUG,
+                 max_bytes=10 * 1024 * 1024, rotate_hours=24, backup_count=14):
     """
     设置日志器
-    
+
+    日志记录通过 QueueHandler 放入队列，由后台 QueueListener 线程
+    统一写入控制台和文件。
+
     Args:
         name (str): 日志器名称
         level (int): 日志级别 (DEBUG=10, INFO=20, WARNING=30, ERROR=40, CRITICAL=50)
         log_to_file (bool): 是否同时输出到文件
-    
+        log_file_prefix (str): 日志文件名前缀
+        file_level (int): 文件日志级别
+        max_bytes (int): 单个日志文件的最大字节数，超过后轮转
+        rotate_hours (float): 日志文件按时间轮转的间隔（小时）
+        backup_count (int): 保留的压缩历史日志数量
+
     Returns:
         logging.Logger: 配置好的日志器
     """
     logger = logging.getLogger(name)
-    
+
     # 避免重复添加处理器
     if logger.handlers:
         return logger
-    
-    logger.setLevel(level)
-    
+
     # 创建格式化器
     console_formatter = ColoredFormatter(
         '%(asctime)s | %(levelname)s | %(message)s',
         datefmt='%H:%M:%S'
     )
-    
+
     file_formatter = logging.Formatter(
         '%(asctime)s | %(levelname)s | %(funcName)s:%(lineno)d | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+        datefmt=CompressedRotatingFileHandler.TIME_FORMAT
     )
-    
+
     # 控制台处理器
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(level)
     console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
-    
+    output_handlers = [console_handler]
+
     # 文件处理器（可选）
+    file_handler = None
     if log_to_file:
         try:
             # 确保logs目录存在
             log_dir = os.path.join(os.path.dirname(__file__), 'logs')
             os.makedirs(log_dir, exist_ok=True)
-            
-            # 创建日志文件名（按日期）
-            log_filename = f"kimi_auto_mail_{datetime.now().strftime('%Y%m%d')}.log"
-            log_filepath = os.path.join(log_dir, log_filename)
-            
-            file_handler = logging.FileHandler(log_filepath, encoding='utf-8')
-            file_handler.setLevel(logging.DEBUG)  # 文件中记录所有级别的日志
+
+            log_filepath = os.path.join(log_dir, f"{log_file_prefix}.log")
+
+            file_handler = CompressedRotatingFileHandler(
+                log_filepath,
+                max_bytes=max_bytes,
+                interval_hours=rotate_hours,
+                backup_count=backup_count,
+            )
+            file_handler.setLevel(file_level)
             file_handler.setFormatter(file_formatter)
-            logger.addHandler(file_handler)
+            output_handlers.append(file_handler)
         except Exception as e:
-            logger.warning(f"无法创建日志文件: {e}")
-    
+            file_handler = None
+            file_error = e
+
+    # 日志器本身的级别取决于最"啰嗦"的处理器，
+    # 这样低于该级别的日志调用在入队之前就被丢弃，几乎没有开销
+    logger.setLevel(min(level, file_level) if file_handler else level)
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+
+    # 只替换同名日志器的后台线程，其他日志器不受影响
+    _stop_listener(name)
+    listener = logging.handlers.QueueListener(
+        log_queue, *output_handlers, respect_handler_level=True
+    )
+    _listeners[name] = listener
+    listener.start()
+
+    if log_to_file and file_handler is None:
+        logger.warning(f"无法创建日志文件: {file_error}")
+
     return logger
 
+
+def setup_logger_from_config(config, **kwargs):
+    """
+    按配置模块中的日志选项设置日志器
+
+    Args:
+        config: 配置模块
+        **kwargs: 传给 setup_logger 的其他参数（如 log_file_prefix）
+
+    Returns:
+        logging.Logger: 配置好的日志器
+    """
+    return setup_logger(
+        level=LOG_LEVELS.get(getattr(config, 'LOG_LEVEL', 'INFO').upper(), logging.INFO),
+        log_to_file=getattr(config, 'LOG_TO_FILE', True),
+        file_level=LOG_LEVELS.get(getattr(config, 'LOG_FILE_LEVEL', 'DEBUG').upper(), logging.DEBUG),
+        max_bytes=getattr(config, 'LOG_MAX_BYTES', 10 * 1024 * 1024),
+        rotate_hours=getattr(config, 'LOG_ROTATE_HOURS', 24),
+        backup_count=getattr(config, 'LOG_BACKUP_COUNT', 14),
+        **kwargs
+    )
+
+
+def reset_logger(name="KimiAutoMail"):
+    """
+    停止后台日志线程并移除日志器上的处理器，之后可重新调用 setup_logger
+
+    用于在同一进程中切换日志文件（如多租户运行时每个租户单独记录），
+    以及fork出的子进程中重新初始化日志。
+
+    Args:
+        name (str): 日志器名称
+    """
+    logger = logging.getLogger(name)
+    listener = _stop_listener(name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    if listener is not None:
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(_stop_all_listeners)
+
 def get_logger(name="KimiAutoMail"):
     """
     获取日志器实例
@@ -117,9 +310,15 @@ def set_log_level(level_name):
     """
     level = LOG_LEVELS.get(level_name.upper(), logging.INFO)
     logger = get_logger()
-    logger.setLevel(level)
-    
-    # 同时更新所有处理器的级别
-    for handler in logger.handlers:
-        if isinstance(handler, logging.StreamHandler) and handler.stream == sys.stdout:
-            handler.setLevel(level)
\ No newline at end of file
+
+    # 控制台处理器挂在后台监听线程上，需要在那里更新级别
+    effective_level = level
+    listener = _listeners.get(logger.name)
+    if listener is not None:
+        for handler in listener.handlers:
+            if isinstance(handler, CompressedRotatingFileHandler):
+                effective_level = min(effective_level, handler.level)
+            elif isinstance(handler, logging.StreamHandler) and handler.stream == sys.stdout:
+                handler.setLevel(level)
+
+    logger.setLevel(effective_level)
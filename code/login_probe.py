@@ -0,0 +1,336 @@
+# login_probe.py
+"""
+登录状态预检与熔断模块
+在启动浏览器之前用很小的代价判断Kimi登录是否仍然有效：
+先读取浏览器目录或登录状态文件中的令牌/cookie过期时间，再发一次轻量的带认证请求，
+约2秒内给出结论。连续多次认证失败后熔断：暂停启动浏览器，只发送一封汇总告警邮件
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+import config
+import metrics
+from atomic_file import locked, write_json
+from kimi_api import KimiApiClient, KimiApiError, KimiAuthError
+from logger import get_logger
+
+logger = get_logger()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BREAKER_DIR = os.path.join(BASE_DIR, 'auth_state')
+
+# Chromium的cookie时间戳是从1601-01-01起的微秒数
+_CHROMIUM_EPOCH_OFFSET = 11644473600
+
+
+def _profile_cookie_expiry(user_data_dir, host='moonshot'):
+    """
+    读取浏览器目录中Kimi会话cookie的最早过期时间（cookie值是加密的，过期时间不是）
+
+    Returns:
+        float: Unix时间戳，没有持久cookie时返回None
+    """
+    candidates = [os.path.join(user_data_dir, 'Default', 'Network', 'Cookies'),
+                  os.path.join(user_data_dir, 'Default', 'Cookies')]
+    cookie_db = next((path for path in candidates if os.path.exists(path)), None)
+    if cookie_db is None:
+        return None
+
+    # 浏览器运行时数据库被锁定，复制一份再读
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        copy_path = os.path.join(tmp_dir, 'Cookies')
+        shutil.copyfile(cookie_db, copy_path)
+        connection = sqlite3.connect(copy_path)
+        try:
+            rows = connection.execute(
+                "SELECT expires_utc FROM cookies WHERE host_key LIKE ? AND expires_utc > 0",
+                (f'%{host}%',)
+            ).fetchall()
+        finally:
+            connection.close()
+    if not rows:
+        return None
+    return min(row[0] for row in rows) / 1e6 - _CHROMIUM_EPOCH_OFFSET
+
+
+def check_expiry(user_data_dir=None, state_path=None):
+    """
+    离线检查登录令牌/cookie是否已过期
+
+    Returns:
+        tuple[dict, float]: (找到的令牌, 过期时间戳或None)
+
+    Raises:
+        KimiAuthError: 登录已过期或找不到任何登录信息
+    """
+    import storage_state
+
+    if state_path:
+        status = storage_state.check_storage_state(state_path)
+        if not status['ok']:
+            raise KimiAuthError(status['reason'])
+        return storage_state.find_tokens(storage_state.load_storage_state(state_path)), status['expires_at']
+
+    user_data_dir = user_data_dir or config.USER_DATA_DIR
+    if not os.path.isdir(user_data_dir):
+        raise KimiAuthError(f"浏览器目录不存在: {user_data_dir}，请先完成登录")
+
+    tokens = storage_state.profile_tokens(user_data_dir)
+    expires_at = None
+    for key in ('refresh_token', 'access_token'):
+        if key in tokens:
+            expires_at = storage_state.decode_jwt_expiry(tokens[key])
+            if expires_at is not None:
+                break
+    if expires_at is None:
+        try:
+            expires_at = _profile_cookie_expiry(user_data_dir)
+        except Exception as e:
+            logger.debug("读取浏览器cookie失败: %s", e)
+
+    if expires_at is not None and expires_at <= time.time():
+        raise KimiAuthError(f"Kimi登录已于 {datetime.fromtimestamp(expires_at):%Y-%m-%d %H:%M} 过期")
+    return tokens, expires_at
+
+
+def probe(user_data_dir=None, state_path=None, timeout=None):
+    """
+    预检登录状态：离线检查过期时间，再用一次轻量请求确认令牌仍被接受
+
+    网络不通等无法判断的情况只记录日志，不视为登录失效。
+
+    Args:
+        user_data_dir (str): 浏览器目录（持久化目录模式）
+        state_path (str): 登录状态文件路径（登录状态文件模式或HTTP接口引擎）
+        timeout (float): 在线检查的超时秒数，默认为 config.LOGIN_PROBE_TIMEOUT
+
+    Returns:
+        float: 登录过期时间戳，未知时为None
+
+    Raises:
+        KimiAuthError: 登录已失效
+    """
+    import storage_state
+
+    start_time = time.perf_counter()
+    timeout = timeout or getattr(config, 'LOGIN_PROBE_TIMEOUT', 2)
+    tokens, expires_at = check_expiry(user_data_dir, state_path)
+
+    client = None
+    access_token = tokens.get('access_token')
+    if state_path and (access_token or tokens.get('refresh_token')):
+        # 登录状态文件由本工具维护，访问令牌过期时可以刷新并写回
+        client = KimiApiClient(access_token, tokens.get('refresh_token'), timeout=timeout, state_path=state_path)
+    elif access_token:
+        # 浏览器目录中的令牌由网页自己刷新，这里只用尚未过期的访问令牌做检查，避免令牌轮换后与浏览器不一致
+        access_expires_at = storage_state.decode_jwt_expiry(access_token)
+        if access_expires_at is None or access_expires_at > time.time() + 60:
+            client = KimiApiClient(access_token, timeout=timeout)
+
+    if client is not None:
+        try:
+            client.get_user()
+        except KimiAuthError:
+            raise
+        except KimiApiError as e:
+            logger.warning(f"在线检查登录状态失败，跳过: {e}")
+    else:
+        logger.debug("没有可用的访问令牌，跳过在线检查")
+
+    logger.info(f"登录状态预检通过 (耗时 {time.perf_counter() - start_time:.1f} 秒"
+                + (f", 有效期至 {datetime.fromtimestamp(expires_at):%Y-%m-%d %H:%M})" if expires_at else ")"))
+    return expires_at
+
+
+class AuthCircuitBreaker:
+    """
+    认证失败熔断器，状态保存在文件中，跨进程、跨运行生效
+
+    连续认证失败达到阈值后打开：发送一封汇总告警邮件，之后的运行直接跳过，不再启动浏览器，
+    也不再逐次发送错误邮件。冷却时间过后允许一次试探运行：成功则恢复，失败则继续熔断。
+    """
+
+    def __init__(self, identity, threshold=None, cooldown_hours=None):
+        """
+        Args:
+            identity (str): 登录身份（浏览器目录或登录状态文件路径），每个身份独立熔断
+            threshold (int): 连续失败多少次后熔断，默认为 config.AUTH_BREAKER_THRESHOLD
+            cooldown_hours (float): 熔断后多久允许试探运行，默认为 config.AUTH_BREAKER_COOLDOWN_HOURS
+        """
+        self.identity = identity
+        self.threshold = threshold or getattr(config, 'AUTH_BREAKER_THRESHOLD', 2)
+        self.cooldown_hours = cooldown_hours or getattr(config, 'AUTH_BREAKER_COOLDOWN_HOURS', 12)
+        digest = hashlib.sha1(os.path.abspath(identity).encode('utf-8')).hexdigest()[:12]
+        self.path = os.path.join(BREAKER_DIR, f"breaker_{digest}.json")
+        self.state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'identity': self.identity, 'failures': [], 'opened_at': None}
+
+    def _save(self):
+        write_json(self.path, self.state, ensure_ascii=False, indent=2)
+
+    @property
+    def is_open(self):
+        return self.state.get('opened_at') is not None
+
+    def allow(self):
+        """
+        Returns:
+            bool: 本次是否允许运行（关闭状态，或熔断冷却时间已过的试探运行）
+        """
+        if not self.is_open:
+            return True
+        opened_at = datetime.fromisoformat(self.state['opened_at'])
+        if (datetime.now() - opened_at).total_seconds() >= self.cooldown_hours * 3600:
+            logger.info("登录熔断冷却时间已过，试探运行一次")
+            return True
+        return False
+
+    def record_success(self):
+        with locked(self.path):
+            self.state = self._load()
+            if self.is_open:
+                logger.info("登录已恢复，熔断解除")
+            if self.state['failures'] or self.is_open:
+                self.state = {'identity': self.identity, 'failures': [], 'opened_at': None}
+                self._save()
+
+    def record_failure(self, reason):
+        """
+        记录一次认证失败
+
+        Returns:
+            bool: 是否因本次失败而刚刚进入熔断（需要发送汇总告警）
+        """
+        with locked(self.path):
+            # 其他进程可能同时记录了失败，在锁内重新读取
+            self.state = self._load()
+            self.state['failures'].append({'at': datetime.now().isoformat(timespec='seconds'),
+                                           'reason': str(reason)})
+            self.state['failures'] = self.state['failures'][-20:]
+            just_opened = False
+            if self.is_open:
+                # 试探运行失败，重新计算冷却时间
+                self.state['opened_at'] = datetime.now().isoformat(timespec='seconds')
+            elif len(self.state['failures']) >= self.threshold:
+                self.state['opened_at'] = datetime.now().isoformat(timespec='seconds')
+                just_opened = True
+                logger.error(f"连续 {len(self.state['failures'])} 次登录失败，暂停运行 {self.cooldown_hours} 小时")
+            self._save()
+        return just_opened
+
+    def alert_text(self):
+        """
+        Returns:
+            str: 汇总告警的正文
+        """
+        lines = [f"Kimi登录已连续 {len(self.state['failures'])} 次失效，已暂停自动运行，"
+                 f"每 {self.cooldown_hours} 小时自动试探一次，恢复后自动继续。",
+                 f"登录身份: {self.identity}",
+                 "请重新登录Kimi（使用登录状态文件时再运行 python main.py state export）。",
+                 "",
+                 "失败记录："]
+        lines += [f"{failure['at']}  {failure['reason']}" for failure in self.state['failures']]
+        return '\n'.join(lines)
+
+
+def session_identity(session=None):
+    """
+    Returns:
+        tuple[str, str]: (浏览器目录, 登录状态文件路径)，两者只有一个有效
+    """
+    if session is not None:
+        if session.storage_state:
+            return None, session.storage_state
+        return session.user_data_dir, None
+
+    import storage_state
+    if getattr(config, 'BROWSER_MODE', 'persistent') == 'storage_state':
+        return None, storage_state.state_file_path()
+    if getattr(config, 'KIMI_ENGINE', 'browser') == 'http' and os.path.exists(storage_state.state_file_path()):
+        # 没有登录状态文件时，接口引擎使用浏览器目录中的令牌
+        return None, storage_state.state_file_path()
+    return config.USER_DATA_DIR, None
+
+
+def preflight(session=None, receivers=None, deadline=None):
+    """
+    运行前检查熔断状态并预检登录
+
+    Args:
+        session (KimiSession): 本次运行将使用的浏览器会话，为None时按配置推断
+        receivers (list[str]): 告警邮件收件人
+        deadline (Deadline): 运行时间预算，在线检查的超时不超过剩余预算
+
+    Returns:
+        str: 可以继续运行时为None；否则为运行结果（"circuit_open" 或 "auth_failed"）
+    """
+    if not getattr(config, 'LOGIN_PROBE_ENABLED', True):
+        return None
+
+    user_data_dir, state_path = session_identity(session)
+    breaker = breaker_for(session)
+    if not breaker.allow():
+        logger.warning(f"登录熔断中（自 {breaker.state['opened_at']} 起），跳过本次运行")
+        if session is not None:
+            session.close()
+        return "circuit_open"
+
+    timeout = getattr(config, 'LOGIN_PROBE_TIMEOUT', 2)
+    if deadline is not None:
+        timeout = deadline.timeout(timeout, "登录预检")
+    try:
+        probe(user_data_dir, state_path, timeout)
+    except KimiAuthError as e:
+        logger.error(f"登录状态预检失败: {e}")
+        metrics.FAILURES.inc(type="auth")
+        if session is not None:
+            session.close()
+        if breaker.record_failure(e):
+            send_alert(breaker, receivers)
+        return "auth_failed"
+
+    # 预检通过不代表登录有效（没有令牌时跳过在线检查），熔断器只在运行实际拿到回复后重置
+    return None
+
+
+def breaker_for(session=None):
+    """
+    Returns:
+        AuthCircuitBreaker: 该会话登录身份对应的熔断器
+    """
+    user_data_dir, state_path = session_identity(session)
+    return AuthCircuitBreaker(state_path or user_data_dir)
+
+
+def record_auth_failure(session, error, receivers=None):
+    """运行过程中发现登录失效（如找不到输入框）时记入熔断器"""
+    metrics.FAILURES.inc(type="auth")
+    breaker = breaker_for(session)
+    if breaker.record_failure(error):
+        send_alert(breaker, receivers)
+
+
+def record_auth_success(session=None):
+    """运行实际拿到Kimi回复后重置熔断器"""
+    breaker_for(session).record_success()
+
+
+def send_alert(breaker, receivers=None):
+    """发送熔断汇总告警邮件"""
+    import mailer
+    from html_formatter import generate_error_email_html
+
+    subject = f"Kimi登录已失效，自动推送已暂停 {datetime.now():%Y年%m月%d日}"
+    mailer.send_email(subject, generate_error_email_html(breaker.alert_text()), receivers)
@@ -1,51 +1,79 @@
 # mailer.py
 
-import yagmail
 import smtplib
+import time
+from datetime import datetime
 import config
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import ssl
+import metrics
+import smtp_transport
+from deadline import DeadlineExceeded, ensure as ensure_deadline
+from mime_message import build_message
 
-def send_email(subject, content):
+# yagmail备用方案至少需要的剩余预算（秒），不足时不再尝试
+YAGMAIL_MIN_SECONDS = 5
+
+
+def _probe_timeout(deadline):
+    return deadline.timeout(getattr(config, 'SMTP_PROBE_TIMEOUT', smtp_transport.PROBE_TIMEOUT), "试探SMTP连接方式")
+
+
+def send_email(subject, content, receivers=None, deadline=None, text=None):
     """
     发送邮件，支持多种SMTP配置。
 
     Args:
         subject (str): 邮件主题。
         content (str): 邮件内容 (可以是HTML格式)。
+        receivers (str | list[str]): 收件人，默认为config.EMAIL_RECEIVER
+        deadline (Deadline): 运行时间预算，SMTP连接超时取 config.EMAIL_TIMEOUT 与剩余预算中的较小值；
+            标准库方式失败后剩余预算不足时不再尝试yagmail
+        text (str): 纯文本版本的正文，默认由HTML转换得到
+
+    HTML会先压缩，编码后整封邮件超出 config.EMAIL_SIZE_BUDGET_KB 时按段落截断，
+    每次发送都会输出编码后的邮件大小。
+
+    连接方式（SSL / STARTTLS / 25端口）由 smtp_transport 协商并按服务器记住，
+    用记住的方式连接失败时当场重新试探一次。
+
+    Returns:
+        bool: 是否发送成功
     """
+    if receivers is None:
+        receivers = config.EMAIL_RECEIVER
+    if isinstance(receivers, str):
+        receivers = [receivers]
+    receiver_text = ', '.join(receivers)
+    deadline = ensure_deadline(deadline)
+
+    msg, content, report = build_message(subject, content, config.EMAIL_SENDER, receivers, text)
+    print(f"邮件大小: {report}")
+    metrics.MESSAGE_BYTES.observe(report.encoded)
+
+    host = config.EMAIL_HOST
+    transport = smtp_transport.Transport.from_port(config.EMAIL_PORT)
+    start_time = time.perf_counter()
     try:
         print("正在连接SMTP服务器并发送邮件...")
         
         # 优先使用标准库smtplib（更稳定）
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = config.EMAIL_SENDER
-            msg['To'] = config.EMAIL_RECEIVER
-            
-            # 添加HTML内容
-            html_part = MIMEText(content, 'html', 'utf-8')
-            msg.attach(html_part)
-            
-            # 创建SSL上下文
-            context = ssl.create_default_context()
-            
-            # 根据端口选择连接方式
-            if config.EMAIL_PORT == 587:
-                # STARTTLS
-                print("使用STARTTLS连接...")
-                server = smtplib.SMTP(config.EMAIL_HOST, config.EMAIL_PORT)
-                server.starttls(context=context)
-            elif config.EMAIL_PORT == 465:
-                # SSL
-                print("使用SSL连接...")
-                server = smtplib.SMTP_SSL(config.EMAIL_HOST, config.EMAIL_PORT, context=context)
-            else:
-                # 无加密
-                print("使用无加密连接...")
-                server = smtplib.SMTP(config.EMAIL_HOST, config.EMAIL_PORT)
+            # 使用协商好的连接方式（首次发送时并发试探）
+            transport = smtp_transport.choose(host, config.EMAIL_PORT, timeout=_probe_timeout(deadline))
+            timeout = deadline.timeout(getattr(config, 'EMAIL_TIMEOUT', 60), "发送邮件")
+            print(f"使用 {transport} 连接...")
+            try:
+                server = transport.connect(host, timeout)
+            except (OSError, smtplib.SMTPException) as connect_error:
+                # 记住的方式失效了：重新试探，换一种方式再连一次
+                print(f"使用 {transport} 连接失败，重新试探连接方式: {connect_error}")
+                smtp_transport.forget(host)
+                retry = smtp_transport.choose(host, config.EMAIL_PORT, renegotiate=True,
+                                              timeout=_probe_timeout(deadline))
+                if retry == transport:
+                    raise
+                transport = retry
+                print(f"改用 {transport} 连接...")
+                server = transport.connect(host, deadline.timeout(getattr(config, 'EMAIL_TIMEOUT', 60), "发送邮件"))
             
             # 启用调试模式（可选）
             # server.set_debuglevel(1)
@@ -54,58 +82,55 @@ def send_email(subject, content):
             server.login(config.EMAIL_SENDER, config.EMAIL_PASSWORD)
             
             print("正在发送邮件...")
-            server.send_message(msg)
+            server.send_message(msg, to_addrs=receivers)
             server.quit()
-            print(f"✅ 邮件已成功发送至 {config.EMAIL_RECEIVER}")
+            print(f"✅ 邮件已成功发送至 {receiver_text}")
+            metrics.SMTP_PATH.inc(path="smtplib")
+            metrics.SEND_SECONDS.observe(time.perf_counter() - start_time, path="smtplib")
+            return True
             
         except Exception as smtp_error:
+            metrics.FAILURES.inc(type=f"smtplib_{type(smtp_error).__name__}")
+            smtp_transport.forget(host)  # 下次发送时重新试探
+            if isinstance(smtp_error, DeadlineExceeded) or deadline.remaining() < YAGMAIL_MIN_SECONDS:
+                metrics.FAILURES.inc(type="deadline")
+                raise Exception(f"标准库发送失败，运行预算已不足以尝试yagmail: {smtp_error}")
             print(f"标准库发送失败，尝试使用yagmail: {smtp_error}")
             
-            # 备用方案：使用yagmail
+            # 备用方案：使用yagmail（只在需要时才导入，避免每次启动都付出导入开销）
             try:
-                # 根据端口决定加密方式
-                if config.EMAIL_PORT == 587:
-                    # STARTTLS加密
-                    yag = yagmail.SMTP(
-                        user=config.EMAIL_SENDER,
-                        password=config.EMAIL_PASSWORD,
-                        host=config.EMAIL_HOST,
-                        port=config.EMAIL_PORT,
-                        smtp_starttls=True,
-                        smtp_ssl=False
-                    )
-                elif config.EMAIL_PORT == 465:
-                    # SSL加密
-                    yag = yagmail.SMTP(
-                        user=config.EMAIL_SENDER,
-                        password=config.EMAIL_PASSWORD,
-                        host=config.EMAIL_HOST,
-                        port=config.EMAIL_PORT,
-                        smtp_starttls=False,
-                        smtp_ssl=True
-                    )
-                else:
-                    # 其他端口，尝试无加密
-                    yag = yagmail.SMTP(
-                        user=config.EMAIL_SENDER,
-                        password=config.EMAIL_PASSWORD,
-                        host=config.EMAIL_HOST,
-                        port=config.EMAIL_PORT,
-                    )
+                import yagmail
+
+                # 额外参数会传给smtplib的连接，用剩余预算作为超时
+                timeout = deadline.timeout(getattr(config, 'EMAIL_TIMEOUT', 60), "发送邮件")
+
+                # 使用与标准库相同的连接方式
+                yag = yagmail.SMTP(
+                    user=config.EMAIL_SENDER,
+                    password=config.EMAIL_PASSWORD,
+                    host=host,
+                    timeout=timeout,
+                    **transport.yagmail_options()
+                )
                 
                 yag.send(
-                    to=config.EMAIL_RECEIVER,
+                    to=receivers,
                     subject=subject,
                     contents=content
                 )
                 yag.close()
-                print(f"✅ 邮件已成功发送至 {config.EMAIL_RECEIVER} (使用yagmail)")
+                print(f"✅ 邮件已成功发送至 {receiver_text} (使用yagmail)")
+                metrics.SMTP_PATH.inc(path="yagmail")
+                metrics.SEND_SECONDS.observe(time.perf_counter() - start_time, path="yagmail")
+                return True
                 
             except Exception as yagmail_error:
+                metrics.FAILURES.inc(type=f"yagmail_{type(yagmail_error).__name__}")
                 raise Exception(f"所有邮件发送方式都失败了。SMTP错误: {smtp_error}, yagmail错误: {yagmail_error}")
             
     except Exception as e:
         print(f"❌ 邮件发送失败: {e}")
+        metrics.FAILURES.inc(type="send_email")
         print("\n请检查以下配置：")
         print("1. config.py中的邮箱配置是否正确")
         print("2. 授权码/应用密码是否为最新且有效")
@@ -116,9 +141,9 @@ def send_email(subject, content):
         
         # 提供具体的调试信息
         print(f"\n当前配置：")
-        print(f"SMTP服务器: {config.EMAIL_HOST}:{config.EMAIL_PORT}")
+        print(f"SMTP服务器: {config.EMAIL_HOST}:{config.EMAIL_PORT}（本次使用的连接方式: {transport}）")
         print(f"发件邮箱: {config.EMAIL_SENDER}")
-        print(f"收件邮箱: {config.EMAIL_RECEIVER}")
+        print(f"收件邮箱: {receiver_text}")
         print(f"授权码长度: {len(config.EMAIL_PASSWORD)} 字符")
         
         # 针对Outlook的特殊提示
@@ -129,6 +154,8 @@ def send_email(subject, content):
             print("3. 检查Microsoft账户安全设置")
             print("4. 尝试重新生成应用密码")
 
+        return False
+
 def test_email_config():
     """
     测试邮件配置是否正确
@@ -151,5 +178,4 @@ def test_email_config():
 
 if __name__ == "__main__":
     # 如果直接运行此文件，则进行配置测试
-    from datetime import datetime
     test_email_config()
\ No newline at end of file
@@ -1,30 +1,144 @@
 # main.py
+"""
+命令行入口
 
+子命令：
+    run        从Kimi获取内容并发送邮件（默认）
+    send-only  直接发送已有的HTML或文本文件，不启动浏览器
+    test-mail  发送测试邮件，检查邮箱配置
+    render     把Kimi回复文本渲染成邮件HTML，不发送
+    state      导出或检查登录状态文件（export / check）
+
+Playwright、yagmail等重量级依赖只在真正用到时才导入，
+不涉及浏览器的子命令可以很快启动。
+"""
+
+import argparse
+import sys
 import time
 from datetime import datetime
 import config
-import mailer
-from logger import setup_logger, LOG_LEVELS
-from kimi_handler import get_kimi_response
-from html_formatter import format_text_to_html, generate_email_html, generate_error_email_html
+import metrics
+from logger import setup_logger_from_config
 
 # 初始化日志器
-logger = setup_logger(
-    level=LOG_LEVELS.get(config.LOG_LEVEL.upper(), 20),  # 默认INFO级别
-    log_to_file=getattr(config, 'LOG_TO_FILE', True)
-)
+logger = setup_logger_from_config(config)
 
-def run(use_existing_chat=True):
+def run(use_existing_chat=True, prompt=None, session=None, target_chat_name=None, receivers=None,
+        deadline=None, job=None):
     """
     主执行函数
 
     Args:
         use_existing_chat (bool): 是否使用现有对话，默认True
+        prompt (str): 发送给Kimi的提示词，为None时使用config.KIMI_PROMPT
+        session (KimiSession): 已预热的浏览器会话，为None时现场启动
+        target_chat_name (str): 目标会话名称，为None时使用config.TARGET_CHAT_NAME
+        receivers (list[str]): 收件人，为None时使用config.EMAIL_RECEIVER
+        deadline (Deadline): 运行时间预算，为None时按 config.RUN_DEADLINE_SECONDS 创建
+        job (str): 任务名称（定时任务名），同一天多个任务的话题分别写入周报/月报汇总
     """
+    from deadline import Deadline
+
     logger.info("开始执行Kimi每日邮件任务...")
+    if deadline is None:
+        deadline = Deadline.from_config()
+    if deadline.limited:
+        logger.info(f"本次运行的时间预算: {deadline.remaining():.0f} 秒")
+
+    try:
+        result = run_once(use_existing_chat, prompt, session, target_chat_name, receivers, deadline, job)
+    except Exception as e:
+        metrics.FAILURES.inc(type=type(e).__name__)
+        result = "error"
+        raise
+    finally:
+        metrics.RUNS.inc(result=result)
+        metrics.LAST_RUN_TIMESTAMP.set(time.time(), result=result)
+        metrics.export(config)
+
+
+def run_once(use_existing_chat=True, prompt=None, session=None, target_chat_name=None, receivers=None,
+             deadline=None, job=None):
+    """
+    执行一次完整任务（获取内容并发送邮件），不处理运行指标的重置和导出
+
+    参数同 run，deadline 为None时不限时。
+
+    未指定 prompt 且配置了 config.PROMPT_CATALOG 时，并发生成目录中的全部提示词并合并成一封邮件。
+
+    启动浏览器前先预检登录状态；登录失效时不发送错误邮件，而是记入熔断器，
+    连续失效达到阈值时发送一封汇总告警。
+
+    获取内容阶段只能使用预算中扣除 config.RUN_DEADLINE_MAIL_RESERVE 秒后的部分，
+    保证超时后仍有时间发送错误通知；运行被取消时不再发送任何邮件。
+
+    回复提取出来后立即渲染并发送邮件，修改对话标题、关闭浏览器与发送同时进行，
+    邮件送达耗时和任务总耗时分别记入指标。
+
+    Returns:
+        str: 运行结果（"success"、"partial"、"kimi_failed"、"deadline_exceeded"、"mail_failed"、"cancelled"、
+            "auth_failed" 或 "circuit_open"），用于指标标签
+    """
+    from deadline import ensure as ensure_deadline
+    from delivery import EarlyDelivery
+    from kimi_api import KimiAuthError, get_kimi_response
+    from login_probe import preflight, record_auth_failure, record_auth_success
+    from prompt_catalog import load_catalog, run_digest
+
+    start_time = time.time()
+    deadline = ensure_deadline(deadline)
+    blocked = preflight(session, receivers, deadline)
+    if blocked:
+        return blocked
 
-    # 1. 从Kimi获取内容
-    response = get_kimi_response(config.KIMI_PROMPT, use_existing_chat)
+    if prompt is None:
+        catalog = load_catalog()
+        if catalog:
+            return run_digest(catalog, use_existing_chat, session=session, receivers=receivers, deadline=deadline,
+                              start_time=start_time, job=job)
+
+    # 1. 从Kimi获取内容，回复一提取出来就在后台发送邮件，浏览器收尾工作同时进行
+    kimi_deadline = deadline.reserve(getattr(config, 'RUN_DEADLINE_MAIL_RESERVE', 60))
+    delivery = EarlyDelivery(lambda response, rendered: _deliver(response, receivers, deadline, kimi_deadline,
+                                                                 on_sent=delivery.mark_sent, job=job,
+                                                                 rendered=rendered), start_time)
+    try:
+        response = get_kimi_response(prompt or config.KIMI_PROMPT, use_existing_chat, session=session,
+                                     target_chat_name=target_chat_name, deadline=kimi_deadline,
+                                     on_response=delivery.start)
+    except KimiAuthError as e:
+        logger.error(f"Kimi登录状态失效: {e}")
+        record_auth_failure(session, e, receivers)
+        return "auth_failed"
+    if "失败" not in response and "无法获取" not in response:
+        # 拿到了回复，说明登录有效
+        record_auth_success(session)
+
+    # 2. 等待邮件发送完成（获取失败时在这里发送错误通知）
+    return delivery.finish(response)
+
+
+def _deliver(response, receivers, deadline, kimi_deadline, on_sent=None, job=None, rendered=None):
+    """
+    渲染并发送一次任务的邮件
+
+    Args:
+        on_sent (callable): 邮件发出后立即调用（EarlyDelivery.mark_sent），发送失败时不调用
+        job (str): 任务名称，用于周报/月报汇总
+        rendered (str): 生成期间已格式化好的回复HTML，没有时在这里格式化
+
+    Returns:
+        str: 运行结果（"success"、"kimi_failed"、"deadline_exceeded"、"mail_failed" 或 "cancelled"）
+    """
+    import mailer
+    import rollup
+    import web_archive
+    from html_formatter import format_text_to_html, generate_email_html, generate_error_email_html
+
+    if deadline.cancelled:
+        logger.warning("运行已被取消，不发送邮件")
+        return "cancelled"
 
     if "失败" in response or "无法获取" in response:
         logger.error("获取Kimi内容失败，发送错误通知邮件")
@@ -32,21 +146,158 @@ def run(use_existing_chat=True):
         today_str = datetime.now().strftime('%Y年%m月%d日')
         subject = f"Kimi邮件工具运行失败通知 {today_str}"
         error_content = generate_error_email_html(response)
-        mailer.send_email(subject, error_content)
-        return
+        if mailer.send_email(subject, error_content, receivers, deadline=deadline) and on_sent:
+            on_sent()
+        return "deadline_exceeded" if kimi_deadline.expired else "kimi_failed"
 
-    # 2. 发送邮件
     today_str = datetime.now().strftime('%Y年%m月%d日')
     subject = f"今日咨询推送 {today_str}"
 
     # 格式化内容
-    formatted_content = format_text_to_html(response)
+    formatted_content = rendered or format_text_to_html(response)
     html_content = generate_email_html(formatted_content)
     
-    mailer.send_email(subject, html_content)
-    logger.info("任务执行完毕")
+    if not mailer.send_email(subject, html_content, receivers, deadline=deadline, text=response):
+        logger.error("邮件发送失败，不写入汇总和网页归档")
+        return "mail_failed"
+    if on_sent:
+        on_sent()
+    # 把今天的话题写入周报/月报汇总，并发布到网页归档
+    rollup.record(response, job=job)
+    web_archive.publish(subject, formatted_content, [response])
+    return "success"
+
+
+def _read_text(path):
+    if path == '-':
+        return sys.stdin.read()
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _render(text, title):
+    from html_formatter import format_text_to_html, generate_email_html
+    return generate_email_html(format_text_to_html(text), title=title)
+
+
+def cmd_run(args):
+    prompt = _read_text(args.prompt_file) if args.prompt_file else None
+    deadline = None
+    if args.deadline:
+        from deadline import Deadline
+        deadline = Deadline(args.deadline)
+    # 单次运行的指标文件只反映本次运行；守护进程中的指标跨运行累积，不能重置
+    metrics.reset()
+    run(use_existing_chat=not args.new_chat, prompt=prompt, target_chat_name=args.target_chat, deadline=deadline)
+    return 0
+
+
+def cmd_send_only(args):
+    import mailer
+
+    content = _read_text(args.file)
+    if args.text:
+        content = _render(content, args.title)
+    subject = args.subject or f"今日咨询推送 {datetime.now().strftime('%Y年%m月%d日')}"
+    return 0 if mailer.send_email(subject, content, args.to) else 1
+
+
+def cmd_test_mail(args):
+    import mailer
+
+    mailer.test_email_config()
+    return 0
+
+
+def cmd_render(args):
+    if not args.output:
+        # 日志同样输出到标准输出，渲染结果输出到标准输出时只保留警告以上的日志
+        from logger import set_log_level
+        set_log_level('WARNING')
+    html_content = _render(_read_text(args.input), args.title)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+        logger.info(f"已渲染到 {args.output}")
+    else:
+        sys.stdout.write(html_content)
+    return 0
+
+
+def cmd_state(args):
+    import storage_state
+
+    if args.action == "export":
+        path = storage_state.export_storage_state(args.user_data_dir, args.path, headless=not args.show_browser)
+        # 重新导出后解除该登录状态文件之前的登录熔断
+        from login_probe import AuthCircuitBreaker
+        AuthCircuitBreaker(path).record_success()
+    status = storage_state.check_storage_state(args.path, min_valid_hours=args.min_valid_hours)
+    if status['ok']:
+        logger.info(status['reason'])
+        return 0
+    logger.error(f"{status['reason']}，请重新登录后运行 python main.py state export")
+    return 1
+
+
+def build_parser():
+    """
+    Returns:
+        argparse.ArgumentParser: 命令行解析器
+    """
+    parser = argparse.ArgumentParser(description="Kimi自动邮件推送工具")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="从Kimi获取内容并发送邮件（默认）")
+    run_parser.add_argument("--new-chat", action="store_true", help="不使用现有对话，创建新对话")
+    run_parser.add_argument("--prompt-file", help="从文件读取提示词，代替config.KIMI_PROMPT")
+    run_parser.add_argument("--target-chat", help="目标会话名称，代替config.TARGET_CHAT_NAME")
+    run_parser.add_argument("--deadline", type=float, help="本次运行的时间预算（秒），代替config.RUN_DEADLINE_SECONDS")
+    run_parser.set_defaults(func=cmd_run)
+
+    send_parser = subparsers.add_parser("send-only", help="直接发送已有文件，不启动浏览器")
+    send_parser.add_argument("file", help="HTML文件路径（使用 - 表示标准输入）")
+    send_parser.add_argument("--text", action="store_true", help="文件是Kimi回复文本，先渲染再发送")
+    send_parser.add_argument("--subject", help="邮件主题")
+    send_parser.add_argument("--title", default="今日咨询推送", help="渲染时使用的邮件标题")
+    send_parser.add_argument("--to", nargs="+", help="收件人，默认为config.EMAIL_RECEIVER")
+    send_parser.set_defaults(func=cmd_send_only)
+
+    test_parser = subparsers.add_parser("test-mail", help="发送测试邮件")
+    test_parser.set_defaults(func=cmd_test_mail)
+
+    render_parser = subparsers.add_parser("render", help="把Kimi回复文本渲染成邮件HTML")
+    render_parser.add_argument("input", help="Kimi回复文本文件（使用 - 表示标准输入）")
+    render_parser.add_argument("-o", "--output", help="输出文件，默认输出到标准输出")
+    render_parser.add_argument("--title", default="今日咨询推送", help="邮件标题")
+    render_parser.set_defaults(func=cmd_render)
+
+    state_parser = subparsers.add_parser("state", help="导出或检查登录状态文件")
+    state_parser.add_argument("action", choices=["export", "check"],
+                              help="export: 从浏览器目录重新导出；check: 检查是否过期")
+    state_parser.add_argument("--path", help="登录状态文件路径，默认为config.STORAGE_STATE_FILE")
+    state_parser.add_argument("--user-data-dir", help="导出时使用的浏览器目录，默认为config.USER_DATA_DIR")
+    state_parser.add_argument("--min-valid-hours", type=float, default=0,
+                              help="剩余有效期少于该小时数时视为失败（用于提前提醒续期）")
+    state_parser.add_argument("--show-browser", action="store_true", help="导出时显示浏览器窗口")
+    state_parser.set_defaults(func=cmd_state)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    命令行入口，不带子命令时等同于 run（与旧版 python main.py 的行为一致）
+
+    Returns:
+        int: 进程退出码
+    """
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or (argv[0].startswith('-') and argv[0] not in ('-h', '--help')):
+        argv = ['run'] + argv
+    args = build_parser().parse_args(argv)
+    return args.func(args)
 
 
 if __name__ == "__main__":
-    # 默认使用现有对话，如果需要新建对话可以传入False
-    run(use_existing_chat=True)
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,298 @@
+# metrics.py
+"""
+运行指标模块
+记录每次运行的计数器和直方图，并以OpenMetrics文本格式导出，
+供 node_exporter 的 textfile collector 采集，或通过内置HTTP端点拉取
+"""
+
+import os
+import tempfile
+import threading
+import time
+from logger import get_logger
+
+logger = get_logger()
+
+# 默认的直方图分桶（秒）
+DEFAULT_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 180, 300, 600)
+
+# 回复长度（字符数）的分桶
+LENGTH_BUCKETS = (100, 500, 1000, 2000, 3000, 5000, 8000, 12000, 20000)
+
+# 邮件大小（字节）的分桶
+SIZE_BUCKETS = (10240, 20480, 51200, 102400, 204800, 512000, 1048576)
+
+_METRIC_PREFIX = "kimi_auto_mail_"
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = [f'{key}="{_escape_label_value(value)}"' for key, value in labels]
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类，按标签组合保存多个时间序列"""
+
+    metric_type = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = _METRIC_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        missing = set(self.labelnames) - set(labels)
+        if missing:
+            raise ValueError(f"指标 {self.name} 缺少标签: {', '.join(sorted(missing))}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [
+            f"# TYPE {self.name} {self.metric_type}",
+            f"# HELP {self.name} {self.documentation}",
+        ]
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增的计数器"""
+
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _render_series(self, key, value):
+        return [f"{self.name}_total{_format_labels(key)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    """可任意设置的瞬时值"""
+
+    metric_type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """累积分桶的直方图"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def time(self, **labels):
+        """返回一个计时上下文，退出时把耗时（秒）记入直方图"""
+        return _Timer(self, labels)
+
+    def _render_series(self, key, value):
+        lines = []
+        for bound, count in zip(self.buckets, value['counts']):
+            bucket_labels = key + (('le', _format_value(bound)),)
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {count}")
+        lines.append(f"{self.name}_count{_format_labels(key)} {value['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(value['sum'])}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+# --- 本工具的全部指标 ---
+
+RUNS = Counter("runs", "任务运行次数（按结果）", ("result",))
+GENERATION_SECONDS = Histogram("generation_seconds", "Kimi回复生成耗时（秒）")
+EXTRACTION_PATH = Counter("extraction_path", "获取回复时实际使用的提取方案", ("path",))
+RESPONSE_LENGTH = Histogram("response_length_chars", "Kimi回复长度（字符）", buckets=LENGTH_BUCKETS)
+CHAT_SEGMENTS = Gauge("chat_segments", "当前对话中的segment-container数量")
+SMTP_PATH = Counter("smtp_path", "邮件实际发送方式", ("path",))
+SEND_SECONDS = Histogram("send_seconds", "邮件发送耗时（秒）", ("path",))
+FAILURES = Counter("failures", "各类失败次数", ("type",))
+LAST_RUN_TIMESTAMP = Gauge("last_run_timestamp_seconds", "最近一次运行结束的Unix时间戳", ("result",))
+TIME_TO_INBOX_SECONDS = Histogram("time_to_inbox_seconds", "从任务开始到邮件发出的耗时（秒）", ("result",))
+JOB_SECONDS = Histogram("job_seconds", "任务总耗时（秒），包括邮件发出后的浏览器收尾工作", ("result",))
+MESSAGE_BYTES = Histogram("message_bytes", "编码后的邮件大小（字节）", buckets=SIZE_BUCKETS)
+
+_REGISTRY = [
+    RUNS, GENERATION_SECONDS, EXTRACTION_PATH, RESPONSE_LENGTH, CHAT_SEGMENTS,
+    SMTP_PATH, SEND_SECONDS, FAILURES, LAST_RUN_TIMESTAMP, TIME_TO_INBOX_SECONDS, JOB_SECONDS,
+    MESSAGE_BYTES,
+]
+
+
+def register(metric):
+    """
+    注册额外的指标，使其出现在导出内容中
+
+    Args:
+        metric (_Metric): 指标对象
+
+    Returns:
+        _Metric: 传入的指标对象，便于在模块级直接赋值
+    """
+    _REGISTRY.append(metric)
+    return metric
+
+
+def render():
+    """
+    生成OpenMetrics文本格式的全部指标
+
+    Returns:
+        str: OpenMetrics文本
+    """
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """
+    清空所有指标，只在单次运行的命令行入口调用，使导出内容只反映本次运行
+
+    守护进程中多个任务并发运行并共享同一组指标，计数器必须跨运行累积，不能调用本函数。
+    """
+    for metric in _REGISTRY:
+        metric.reset()
+
+
+def write_textfile(path):
+    """
+    以原子替换的方式写出指标文件
+
+    先写入同目录下的临时文件，再用 os.replace 覆盖目标文件，
+    保证 node_exporter 永远不会读到写了一半的内容。
+
+    Args:
+        path (str): 目标文件路径（node_exporter 要求以 .prom 结尾）
+
+    Returns:
+        bool: 是否写入成功
+    """
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".metrics_", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(render())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.debug("指标已写入: %s", path)
+        return True
+    except Exception as e:
+        logger.warning(f"写入指标文件失败: {e}")
+        return False
+
+
+def start_http_server(port, addr="0.0.0.0"):
+    """
+    在后台线程中启动一个只提供 /metrics 的HTTP端点（守护进程模式使用）
+
+    Args:
+        port (int): 监听端口
+        addr (str): 监听地址
+
+    Returns:
+        http.server.ThreadingHTTPServer: 服务器对象，调用 shutdown() 可停止
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics http: " + format, *args)
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"指标HTTP端点已启动: http://{addr}:{port}/metrics")
+    return server
+
+
+def export(config):
+    """
+    按配置导出指标（写出textfile，未配置则什么都不做）
+
+    Args:
+        config: 配置模块
+    """
+    path = getattr(config, 'METRICS_TEXTFILE', None)
+    if path:
+        write_textfile(path)
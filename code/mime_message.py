@@ -0,0 +1,246 @@
+# mime_message.py
+"""
+邮件报文构建模块
+压缩 generate_email_html 生成的HTML（去掉缩进、空白和CSS中的多余空格），生成纯文本版本，
+组装成 multipart/alternative 报文，并按大小预算控制编码后整封邮件的大小：
+Gmail等客户端会截断超过约102KB的正文，超出预算时按段落截断HTML（纯文本版本也放不下时一并截断）并注明
+"""
+
+import html
+import re
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import config
+
+# 编码后整封邮件的默认大小预算（KB），略低于Gmail约102KB的截断阈值
+DEFAULT_SIZE_BUDGET_KB = 100
+# 估算的截断结果编码后仍超出预算时，缩小估算重试的次数
+_FIT_ATTEMPTS = 5
+
+_CONTENT_START = '<div class="content">'
+_FOOTER_START = '<div class="footer">'
+
+_BLOCK_START = re.compile(r'<(?:div|p|h3)\b')
+# 块级标签前后的空白不影响显示；行内标签（b、i、span、a等）之间的空格是可见的，必须保留
+_BLOCK_TAGS = r'(?:!DOCTYPE|html|head|body|meta|title|style|link|div|p|h[1-6]|table|thead|tbody|tr|td|th|ul|ol|li|br|hr)'
+_SPACE_AFTER_BLOCK = re.compile(r'(</?' + _BLOCK_TAGS + r'\b[^>]*>)\s+', re.I)
+_SPACE_BEFORE_BLOCK = re.compile(r'\s+(?=</?' + _BLOCK_TAGS + r'\b)', re.I)
+_STYLE = re.compile(r'(<style[^>]*>)(.*?)(</style>)', re.S | re.I)
+_COMMENT = re.compile(r'<!--.*?-->', re.S)
+
+TRUNCATED_NOTE = '<p class="content-para section-failed">（邮件内容超出大小限制，后面 {count} 个段落已省略{hint}）</p>'
+TEXT_HINT = '，完整内容请查看邮件的纯文本版本'
+TEXT_TRUNCATED_NOTE = '（邮件内容超出大小限制，后面 {count} 个段落已省略）'
+
+
+def _minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_html(content):
+    """
+    压缩HTML：删除注释、每行的缩进和块级标签前后的空白，压缩内联CSS
+
+    正文段落中的换行已由 format_text_to_html 转换为 <br>，删除块级标签前后的空白不会改变显示效果；
+    行内标签之间的空白（如 <b>金句</b> <i>延伸</i>）保留，避免英文单词粘连
+
+    Returns:
+        str: 压缩后的HTML
+    """
+    content = _COMMENT.sub('', content)
+    content = _STYLE.sub(lambda m: m.group(1) + _minify_css(m.group(2)) + m.group(3), content)
+    content = '\n'.join(line.strip() for line in content.splitlines() if line.strip())
+    content = _SPACE_AFTER_BLOCK.sub(r'\1', content)
+    return _SPACE_BEFORE_BLOCK.sub('', content)
+
+
+def html_to_text(content):
+    """
+    把HTML邮件转换为纯文本（没有原始回复文本时使用）
+
+    Returns:
+        str: 纯文本
+    """
+    content = re.sub(r'<(head|style|script)\b.*?</\1>', '', content, flags=re.S | re.I)
+    content = re.sub(r'<br\s*/?>', '\n', content, flags=re.I)
+    content = re.sub(r'</(div|p|h\d|li|tr)>|<hr\s*/?>', '\n\n', content, flags=re.I)
+    content = html.unescape(re.sub(r'<[^>]+>', '', content))
+    lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in content.splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+def reply_to_text(text):
+    """
+    把Kimi回复整理为纯文本版本：去掉Markdown强调符号，统一段落间的空行
+
+    Returns:
+        str: 纯文本
+    """
+    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text or '')
+    lines = [line.rstrip() for line in text.splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+def _size(content):
+    return len(content.encode('utf-8'))
+
+
+def truncate_html(content, budget, hint=TEXT_HINT):
+    """
+    按段落截断HTML邮件的正文，使整封HTML不超过 budget 字节；页眉、样式和页脚保持不变
+
+    Args:
+        content (str): HTML内容
+        budget (int): 大小上限（字节）
+        hint (str): 附在省略提示后的说明，纯文本版本也被截断时传空字符串
+
+    Returns:
+        tuple[str, int]: (截断后的HTML, 省略的段落数)；无法按段落截断时原样返回，省略数为0
+    """
+    start = content.find(_CONTENT_START)
+    end = content.rfind(_FOOTER_START)
+    if start < 0 or end < start:
+        return content, 0
+    start += len(_CONTENT_START)
+    body = content[start:end]
+    # 正文容器自身的闭合标签
+    body_end = body.rfind('</div>')
+    if body_end < 0:
+        return content, 0
+    inner = body[:body_end]
+    head, tail = content[:start], body[body_end:] + content[end:]
+    cuts = [m.start() for m in _BLOCK_START.finditer(inner)]
+    total_blocks = len(cuts)
+
+    def build(index):
+        prefix = inner[:cuts[index]]
+        closing = '</div>' * max(0, prefix.count('<div') - prefix.count('</div>'))
+        omitted = inner[cuts[index]:].count('class="qa-item"') or total_blocks - index
+        return head + prefix + closing + TRUNCATED_NOTE.format(count=omitted, hint=hint) + tail, omitted
+
+    # 截断位置越靠后HTML越大，二分查找仍在预算内的最靠后位置
+    low, high, best = 0, len(cuts) - 1, None
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = build(middle)
+        if _size(candidate[0]) <= budget:
+            best, low = candidate, middle + 1
+        else:
+            high = middle - 1
+    return best if best is not None else (content, 0)
+
+
+def truncate_text(text, budget):
+    """
+    按段落（空行分隔）截断纯文本，使其连同省略提示不超过 budget 字节
+
+    Returns:
+        tuple[str, int]: (截断后的纯文本, 省略的段落数)；未超出时原样返回，省略数为0
+    """
+    if _size(text) <= budget:
+        return text, 0
+    paragraphs = text.split('\n\n')
+    kept, size = 0, 0
+    for paragraph in paragraphs:
+        note = TEXT_TRUNCATED_NOTE.format(count=len(paragraphs) - kept - 1)
+        if size + _size(paragraph) + _size(note) + 4 > budget:
+            break
+        size += _size(paragraph) + 2
+        kept += 1
+    note = TEXT_TRUNCATED_NOTE.format(count=len(paragraphs) - kept)
+    return '\n\n'.join(paragraphs[:kept] + [note]), len(paragraphs) - kept
+
+
+class MessageReport:
+    """一封邮件的大小统计（字节）"""
+
+    def __init__(self, original_html, html, text, encoded, omitted, budget, text_omitted=0):
+        self.original_html = original_html
+        self.html = html
+        self.text = text
+        self.encoded = encoded
+        self.omitted = omitted
+        self.text_omitted = text_omitted
+        self.budget = budget
+
+    @property
+    def over_budget(self):
+        return self.encoded > self.budget
+
+    def __str__(self):
+        parts = [f"HTML {self.html / 1024:.1f}KB（压缩前 {self.original_html / 1024:.1f}KB）",
+                 f"纯文本 {self.text / 1024:.1f}KB", f"编码后共 {self.encoded / 1024:.1f}KB"]
+        if self.omitted or self.text_omitted:
+            parts.append(f"超出{self.budget / 1024:.0f}KB预算，HTML省略 {self.omitted} 个段落，"
+                         f"纯文本省略 {self.text_omitted} 个段落")
+        if self.over_budget:
+            parts.append(f"超出{self.budget / 1024:.0f}KB预算")
+        return '，'.join(parts)
+
+
+def _assemble(subject, sender, receivers, text, content):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = ', '.join(receivers)
+    msg.attach(MIMEText(text, 'plain', 'utf-8'))
+    msg.attach(MIMEText(content, 'html', 'utf-8'))
+    return msg, len(msg.as_bytes())
+
+
+def _split_budget(available, text, content):
+    """纯文本版本可用的字节数：不超过正文可用字节数的一半时保留完整，否则至少分到一半，其余留给HTML"""
+    text_size = _size(text)
+    if text_size <= available // 2:
+        return text_size
+    return max(available - _size(content), available // 2)
+
+
+def build_message(subject, content, sender, receivers, text=None):
+    """
+    构建 multipart/alternative 邮件：纯文本版本在前，HTML版本在后（客户端优先显示最后一个能显示的部分）
+
+    编码后整封邮件超出 config.EMAIL_SIZE_BUDGET_KB 时按段落截断：纯文本版本放得下时只截断HTML，
+    HTML中注明完整内容在纯文本版本里；放不下时两部分都截断，各自注明省略的段落数
+
+    Args:
+        subject (str): 邮件主题
+        content (str): HTML内容
+        sender (str): 发件人
+        receivers (list[str]): 收件人
+        text (str): 纯文本版本的正文（通常是Kimi原始回复，会去掉Markdown符号），默认由HTML转换得到
+
+    Returns:
+        tuple[MIMEMultipart, str, MessageReport]: (邮件报文, 实际使用的HTML, 大小统计)
+    """
+    original_size = _size(content)
+    if getattr(config, 'EMAIL_MINIFY_HTML', True):
+        content = minify_html(content)
+    # 纯文本版本由截断前的HTML生成
+    text = html_to_text(content) if text is None else reply_to_text(text)
+    budget = int(getattr(config, 'EMAIL_SIZE_BUDGET_KB', DEFAULT_SIZE_BUDGET_KB) * 1024)
+
+    msg, encoded = _assemble(subject, sender, receivers, text, content)
+    omitted = text_omitted = 0
+    if budget and encoded > budget:
+        full_text, full_content = text, content
+        overhead = _assemble(subject, sender, receivers, '', '')[1]
+        # 两部分都按base64编码：每3字节编码为4个字符，每76个字符换行
+        available = max(0, (budget - overhead) * 3 * 76 // (4 * 77))
+        for _ in range(_FIT_ATTEMPTS):
+            text, text_omitted = truncate_text(full_text, _split_budget(available, full_text, full_content))
+            content, omitted = full_content, 0
+            if _size(full_content) > available - _size(text):
+                content, omitted = truncate_html(full_content, available - _size(text),
+                                                 hint='' if text_omitted else TEXT_HINT)
+            msg, encoded = _assemble(subject, sender, receivers, text, content)
+            if encoded <= budget:
+                break
+            available = available * 9 // 10
+
+    report = MessageReport(original_size, _size(content), _size(text), encoded, omitted,
+                           budget or float('inf'), text_omitted)
+    return msg, content, report
@@ -0,0 +1,356 @@
+# mock_kimi_server.py
+"""
+本地Kimi替身服务器（开发调试用）
+提供一个结构与Kimi网页版相同的简化页面（历史会话、输入框、发送按钮、segment-container），
+以及以相同SSE格式逐段返回回复的流式对话接口，用于在不访问真实网站的情况下验证回复捕获逻辑
+
+    python mock_kimi_server.py                # 启动服务器，在浏览器中打开 http://127.0.0.1:8765/
+
+tests/ 中的测试用它在后台线程中验证DOM提取、网络捕获和HTTP接口三种获取方式
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+
+SAMPLE_REPLY = """①【科技】(领域：人工智能) 本地替身服务器示例话题
+
+核心事实：这是一段用于验证回复捕获逻辑的示例文本，内容会被拆成多个数据块逐段返回。
+
+②【财经】(领域：宏观经济) 第二个示例话题
+
+核心事实：数据块可能在任意位置被截断，包括多字节字符和JSON行的中间。
+
+金句：慢慢来，比较快。
+
+本次话题关键词：替身服务器、流式接口、回复捕获"""
+
+PAGE_HTML = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>Kimi 替身</title>
+<style>
+  body { font-family: sans-serif; display: flex; margin: 0; }
+  .sidebar { width: 220px; border-right: 1px solid #ddd; padding: 8px; }
+  .chat-info-item { display: block; padding: 6px; cursor: pointer; }
+  .chat-info-item.router-link-active { background: #eef; }
+  main { flex: 1; padding: 8px; }
+  .segment-container { border-bottom: 1px solid #eee; padding: 6px 0; white-space: pre-wrap; }
+</style>
+</head>
+<body>
+<div class="sidebar">
+  <button class="new-chat-btn">新建会话</button>
+  <div class="history-part"></div>
+</div>
+<main>
+  <div class="chat-content-list"></div>
+  <div role="textbox" contenteditable="true" class="chat-input" style="border:1px solid #ccc;min-height:40px"></div>
+  <button class="send-button"><svg width="16" height="16"><path d="M2 8 L14 8"></path></svg></button>
+</main>
+<script>
+const IDLE_ICON = '<path d="M2 8 L14 8"></path>';
+const BUSY_ICON = '<rect x="4" y="4" width="8" height="8"></rect>';
+let currentChat = null;
+
+async function loadChats() {
+  const response = await fetch('/api/chat/list', {method: 'POST', headers: {'Content-Type': 'application/json'}, body: '{}'});
+  const data = await response.json();
+  const history = document.querySelector('.history-part');
+  history.innerHTML = '';
+  for (const chat of data.items) {
+    const item = document.createElement('a');
+    item.className = 'chat-info-item';
+    item.textContent = chat.name;
+    item.onclick = () => openChat(chat.id, item);
+    history.appendChild(item);
+  }
+}
+
+function openChat(id, item) {
+  currentChat = id;
+  document.querySelectorAll('.chat-info-item').forEach(el => el.classList.remove('router-link-active'));
+  if (item) item.classList.add('router-link-active');
+  document.querySelector('.chat-content-list').innerHTML = '';
+}
+
+document.querySelector('.new-chat-btn').onclick = async () => {
+  const response = await fetch('/api/chat', {method: 'POST', headers: {'Content-Type': 'application/json'},
+                                             body: JSON.stringify({name: '未命名会话'})});
+  const chat = await response.json();
+  openChat(chat.id, null);
+};
+
+function addSegment(text) {
+  const segment = document.createElement('div');
+  segment.className = 'segment-container';
+  segment.textContent = text;
+  document.querySelector('.chat-content-list').appendChild(segment);
+  return segment;
+}
+
+function renderReply(segment, text) {
+  segment.innerHTML = '';
+  for (const block of text.split(/\\n\\n+/)) {
+    const paragraph = document.createElement('div');
+    paragraph.className = 'paragraph';
+    paragraph.textContent = block;
+    segment.appendChild(paragraph);
+  }
+}
+
+document.querySelector('.send-button').onclick = async () => {
+  const input = document.querySelector('[role="textbox"]');
+  const content = input.innerText.trim();
+  if (!content) return;
+  if (!currentChat) await document.querySelector('.new-chat-btn').onclick();
+  input.innerText = '';
+  addSegment(content);
+  const reply = addSegment('');
+  const icon = document.querySelector('.send-button svg');
+  icon.innerHTML = BUSY_ICON;
+  const response = await fetch('/api/chat/' + currentChat + '/completion/stream', {
+    method: 'POST', headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify({messages: [{role: 'user', content: content}]})
+  });
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '', text = '';
+  while (true) {
+    const {done, value} = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, {stream: true});
+    const lines = buffer.split('\\n');
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (!line.startsWith('data:')) continue;
+      const event = JSON.parse(line.slice(5));
+      if (event.event === 'cmpl') { text += event.text; renderReply(reply, text); }
+    }
+  }
+  icon.innerHTML = IDLE_ICON;
+};
+
+loadChats();
+</script>
+</body>
+</html>
+"""
+
+
+class MockKimiState:
+    """替身服务器的会话数据"""
+
+    # 可模拟的接口故障
+    FAULTS = ('bad_json', 'error_event', 'truncated_stream')
+
+    def __init__(self, reply=SAMPLE_REPLY, chunk_size=7, chunk_delay=0.02, token=None, refresh_token=None,
+                 fault=None, drop_connections=False):
+        """
+        Args:
+            reply (str): 每次对话返回的回复
+            chunk_size (int): 每个cmpl事件包含的字符数
+            chunk_delay (float): 相邻数据块之间的间隔（秒）
+            token (str): 要求的Bearer令牌，为None时不校验
+            refresh_token (str): 可用于换取 token 的刷新令牌
+            fault (str): 模拟的故障（FAULTS之一）：JSON接口返回无法解析的内容、
+                数据流返回error事件、数据流在结束前断开
+            drop_connections (bool): 每次响应后不声明就关闭连接，模拟服务端回收空闲长连接
+        """
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.token = token
+        self.refresh_token = refresh_token
+        self.fault = fault
+        self.drop_connections = drop_connections
+        self.connections = 0  # 建立过的TCP连接数，用于确认客户端复用了连接
+        self.chats = [{'id': 'chat-default', 'name': 'email_return', 'messages': []}]
+        self.lock = threading.Lock()
+
+    def find_chat(self, chat_id):
+        for chat in self.chats:
+            if chat['id'] == chat_id:
+                return chat
+        return None
+
+    def new_chat(self, name):
+        with self.lock:
+            chat = {'id': f"chat-{len(self.chats) + 1}", 'name': name, 'messages': []}
+            self.chats.insert(0, chat)
+        return chat
+
+
+class MockKimiHandler(BaseHTTPRequestHandler):
+    """替身服务器的请求处理"""
+
+    state = None  # 由 make_server 设置为 MockKimiState
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.state.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        if self.state.fault == 'bad_json' and self.path.startswith('/api/'):
+            body = body[:len(body) // 2]
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.state.drop_connections:
+            self.close_connection = True
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def _authorized(self):
+        if self.state.token is None:
+            return True
+        if self.headers.get('Authorization') == f"Bearer {self.state.token}":
+            return True
+        self._send_json({'error_type': 'auth.token.invalid', 'message': 'unauthorized'}, status=401)
+        return False
+
+    def do_GET(self):
+        if self.path in ('/', '/index.html') or self.path.startswith('/chat/'):
+            body = PAGE_HTML.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path == '/api/user':
+            if self._authorized():
+                self._send_json({'id': 'mock-user', 'name': 'mock'})
+            return
+        if self.path == '/api/auth/token/refresh':
+            if self.state.refresh_token and \
+                    self.headers.get('Authorization') == f"Bearer {self.state.refresh_token}":
+                self._send_json({'access_token': self.state.token, 'refresh_token': self.state.refresh_token})
+            else:
+                self._send_json({'error_type': 'auth.token.invalid'}, status=401)
+            return
+        self._send_json({'error_type': 'not_found'}, status=404)
+
+    def do_POST(self):
+        payload = self._read_json()
+        if not self._authorized():
+            return
+        if self.path == '/api/chat/list':
+            items = [{'id': chat['id'], 'name': chat['name']} for chat in self.state.chats]
+            self._send_json({'items': items})
+            return
+        if self.path == '/api/chat':
+            chat = self.state.new_chat(payload.get('name') or '未命名会话')
+            self._send_json({'id': chat['id'], 'name': chat['name']})
+            return
+        match = re.fullmatch(r'/api/chat/([^/]+)/completion/stream', self.path)
+        if match:
+            chat = self.state.find_chat(match.group(1))
+            if chat is None:
+                self._send_json({'error_type': 'chat.not_found'}, status=404)
+                return
+            chat['messages'].extend(payload.get('messages', []))
+            self._stream_reply()
+            return
+        self._send_json({'error_type': 'not_found'}, status=404)
+
+    def _stream_reply(self):
+        """以与Kimi相同的SSE格式逐段返回回复，按字节切块以模拟任意位置截断"""
+        reply = self.state.reply
+        lines = [{'event': 'req', 'id': 'req-1'}, {'event': 'resp', 'id': 'resp-1'}]
+        for start in range(0, len(reply), self.state.chunk_size):
+            lines.append({'event': 'cmpl', 'text': reply[start:start + self.state.chunk_size]})
+        if self.state.fault == 'error_event':
+            lines.append({'event': 'error', 'error_type': 'chat.completion.rate_limit'})
+        else:
+            lines.append({'event': 'all_done'})
+        stream = ''.join(f"data: {json.dumps(line, ensure_ascii=False)}\n\n" for line in lines).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        piece = 64
+        for start in range(0, len(stream), piece):
+            data = stream[start:start + piece]
+            if self.state.fault == 'truncated_stream' and start >= len(stream) // 2:
+                # 分块没有写完就断开连接
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data[:len(data) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.state.chunk_delay)
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+        if self.state.drop_connections:
+            self.close_connection = True
+
+
+def make_server(port=DEFAULT_PORT, state=None, host='127.0.0.1'):
+    """
+    创建替身服务器（未启动）
+
+    Args:
+        port (int): 监听端口，0表示随机端口
+        state (MockKimiState): 会话数据，默认使用示例回复
+
+    Returns:
+        ThreadingHTTPServer: 服务器，base_url 属性为访问地址
+    """
+    handler = type('BoundMockKimiHandler', (MockKimiHandler,), {'state': state or MockKimiState()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.base_url = f"http://{host}:{server.server_address[1]}/"
+    return server
+
+
+def start_in_thread(port=0, state=None):
+    """
+    在后台线程中启动替身服务器
+
+    Returns:
+        ThreadingHTTPServer: 已启动的服务器，使用完后调用 shutdown()
+    """
+    server = make_server(port, state)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地Kimi替身服务器")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--reply-file", help="从文件读取每次返回的回复")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="相邻数据块之间的间隔（秒）")
+    args = parser.parse_args()
+
+    reply_text = SAMPLE_REPLY
+    if args.reply_file:
+        with open(args.reply_file, 'r', encoding='utf-8') as f:
+            reply_text = f.read()
+    mock_server = make_server(args.port, MockKimiState(reply_text, chunk_delay=args.chunk_delay))
+    print(f"Kimi替身服务器已启动: {mock_server.base_url}")
+    try:
+        mock_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,194 @@
+# partial_reply.py
+"""
+生成过程中的回复暂存模块
+Kimi生成回复期间，把已经写完的段落逐段追加到本地文件，并随时解析、格式化已完成的问题；
+等待超时、超出运行预算或页面崩溃时，用已完成的部分拼出一份可以发送的摘要，而不是只发错误通知
+"""
+
+import os
+import re
+from datetime import datetime
+import config
+from html_formatter import format_text_to_html
+from logger import get_logger
+from reply_spec import MARKS, parse_item, parse_reply
+
+logger = get_logger()
+
+PARTIAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'partial_replies')
+
+# 中断后拼出的摘要至少需要的长度（字符），不足时视为没有可用内容
+MIN_DIGEST_CHARS = 50
+
+
+class PartialReply:
+    """
+    一次生成的回复暂存
+
+    update 传入当前回复的全部段落：最后一段可能仍在生成，只有后面出现了新段落才视为写完。
+    已写完的段落追加到 <名称>.txt，已完成的问题格式化后写入 <名称>.html（可随时打开预览）；
+    生成结束后 render 复用这些已格式化的问题拼出最终回复的HTML，只格式化其余部分。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): 暂存文件路径（不含扩展名）
+        """
+        self.path = path
+        self.paragraphs = []
+        self._rendered = {}  # {编号: 已格式化的HTML}
+        self._sources = {}  # {编号: 格式化时的问题文本}
+
+    @classmethod
+    def start(cls, name='reply'):
+        """
+        Returns:
+            PartialReply: 按配置创建的暂存，未启用 config.PROGRESSIVE_CAPTURE 时为None
+        """
+        if not getattr(config, 'PROGRESSIVE_CAPTURE', True):
+            return None
+        directory = getattr(config, 'PARTIAL_REPLY_DIR', None) or PARTIAL_DIR
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            logger.debug("无法创建回复暂存目录: %s", e)
+            return None
+        return cls(os.path.join(directory, f"{datetime.now():%Y%m%d_%H%M%S_%f}_{name}"))
+
+    @property
+    def text_path(self):
+        return self.path + '.txt'
+
+    @property
+    def html_path(self):
+        return self.path + '.html'
+
+    def text(self):
+        """已写完的全部段落"""
+        return '\n\n'.join(self.paragraphs)
+
+    def update(self, paragraphs, final=False):
+        """
+        追加新写完的段落
+
+        Args:
+            paragraphs (list[str]): 当前回复的全部段落
+            final (bool): 生成已结束，最后一段也视为写完
+
+        Returns:
+            int: 新追加的段落数
+        """
+        complete = [p.strip() for p in (paragraphs if final else paragraphs[:-1]) if p.strip()]
+        known = len(self.paragraphs)
+        if complete[:known] != self.paragraphs:
+            # 页面重新渲染了已有段落（例如补全了Markdown格式），以页面为准重写文件
+            self.paragraphs = []
+            known = 0
+            self._write(self.text_path, '', 'w')
+        new = complete[known:]
+        if not new:
+            return 0
+        self._write(self.text_path, ''.join(p + '\n\n' for p in new), 'a')
+        self.paragraphs.extend(new)
+        self._render_completed(final)
+        return len(new)
+
+    def _write(self, path, content, mode):
+        try:
+            with open(path, mode, encoding='utf-8') as f:
+                f.write(content)
+        except OSError as e:
+            logger.debug("写入回复暂存失败: %s", e)
+
+    def completed_items(self, final=False):
+        """
+        Returns:
+            dict: {编号: 文本}，只包含已完成的问题；生成尚未结束时，最后一个问题只有在后面已出现
+                关键词行，或金句和延伸都已写完时才算完成
+        """
+        parsed = parse_reply(self.text())
+        marks = list(parsed.items)
+        if marks and not final and parsed.keywords_line is None:
+            last = parse_item(parsed.items[marks[-1]])
+            if not (last['quote'] and last['extension']):
+                marks.pop()
+        return {mark: parsed.items[mark] for mark in marks}
+
+    def _render_completed(self, final=False):
+        rendered = len(self._rendered)
+        for mark, block in self.completed_items(final).items():
+            if mark not in self._rendered:
+                self._rendered[mark] = format_text_to_html(block)
+                self._sources[mark] = block
+                logger.info(f"问题{mark}已生成完毕")
+        if len(self._rendered) > rendered:
+            self._write(self.html_path, '\n'.join(self._rendered.values()), 'w')
+
+    def render(self, text):
+        """
+        把最终回复格式化为HTML，结果与 format_text_to_html(text) 相同：
+        文本未变的问题直接使用生成期间已格式化的HTML，只格式化其余部分（开头、关键词行、追问补全的问题等）
+
+        Args:
+            text (str): 最终回复（可能已经过追问补全）
+
+        Returns:
+            str: 格式化后的HTML
+        """
+        parsed = parse_reply(text)
+        if not self._rendered or _normalize(parsed.render()) != _normalize(text):
+            # 问题编号重复或顺序不一致时无法按问题拆分，整体格式化
+            return format_text_to_html(text)
+        # 与 ParsedReply.render 的顺序一致：开头、各问题、关键词行、其余内容
+        parts = [format_text_to_html(parsed.preamble)] if parsed.preamble else []
+        reused = 0
+        for mark in sorted(parsed.items, key=MARKS.index):
+            block = parsed.items[mark]
+            if self._sources.get(mark) == block:
+                parts.append(self._rendered[mark])
+                reused += 1
+            else:
+                parts.append(format_text_to_html(block))
+        parts.extend(format_text_to_html(block) for block in (parsed.keywords_line, parsed.tail) if block)
+        logger.debug("复用了 %s 个已格式化的问题", reused)
+        return '\n'.join(part for part in parts if part)
+
+    def digest(self):
+        """
+        生成被中断时，用已完成的部分拼出可以发送的回复
+
+        Returns:
+            str: 摘要文本，没有可用内容时为None
+        """
+        parsed = parse_reply(self.text())
+        items = self.completed_items()
+        if parsed.items:
+            if not items:
+                return None
+            blocks = list(items.values())
+            if parsed.keywords_line:
+                blocks.append(parsed.keywords_line)
+            note = f"（本次回复未能完整生成，以下是已完成的 {len(items)} 个话题）"
+        else:
+            # 没有使用编号格式的回复：使用全部已写完的段落
+            blocks = list(self.paragraphs)
+            note = "（本次回复未能完整生成，以下是已生成的部分）"
+        body = '\n\n'.join(blocks)
+        if len(body) < MIN_DIGEST_CHARS:
+            return None
+        logger.warning(f"生成被中断，使用已暂存的部分回复: {self.text_path}")
+        return f"{note}\n\n{body}"
+
+    def discard(self):
+        """回复完整获取后删除暂存文件"""
+        for path in (self.text_path, self.html_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _normalize(text):
+    return re.sub(r'\n\s*\n+', '\n\n', (text or '').strip())
+
@@ -0,0 +1,285 @@
+# prefetch.py
+"""
+提前生成模块
+在配置的低峰时段提前向Kimi获取内容，渲染成可直接发送的邮件并存入待发箱，
+到投递时间再由轻量的投递步骤准时发出。投递步骤不需要浏览器，也不会导入Playwright
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import config
+from atomic_file import write_json
+from logger import get_logger
+
+logger = get_logger()
+
+OUTBOX_DIR = os.path.join(os.path.dirname(__file__), 'outbox')
+SENT_DIR = os.path.join(OUTBOX_DIR, 'sent')
+
+
+def _parse_clock(text):
+    """把 "HH:MM" 解析为 (小时, 分钟)"""
+    hour, minute = text.strip().split(':')
+    return int(hour), int(minute)
+
+
+class PrefetchJob:
+    """config.PREFETCH_JOBS 中的一项提前生成任务"""
+
+    def __init__(self, entry):
+        """
+        Args:
+            entry (dict): 配置项，支持的键：
+                name, window ("HH:MM-HH:MM"), deliver_at ("HH:MM"), max_age_hours,
+                prompt, target_chat, use_existing_chat, user_data_dir
+        """
+        self.name = entry['name']
+        start_text, end_text = entry['window'].split('-')
+        self.window_start = _parse_clock(start_text)
+        self.window_end = _parse_clock(end_text)
+        self.deliver_at = _parse_clock(entry['deliver_at'])
+        self.max_age = timedelta(hours=entry.get('max_age_hours', 12))
+        self.prompt = entry.get('prompt') or config.KIMI_PROMPT
+        self.target_chat = entry.get('target_chat')
+        self.use_existing_chat = entry.get('use_existing_chat', True)
+        self.user_data_dir = entry.get('user_data_dir', config.USER_DATA_DIR)
+
+    def in_window(self, moment):
+        """
+        Returns:
+            bool: moment 是否位于生成时段内（支持跨午夜的时段）
+        """
+        current = (moment.hour, moment.minute)
+        if self.window_start <= self.window_end:
+            return self.window_start <= current < self.window_end
+        return current >= self.window_start or current < self.window_end
+
+    def next_delivery(self, moment):
+        """
+        Returns:
+            datetime: moment 之后最近的一次投递时间
+        """
+        hour, minute = self.deliver_at
+        candidate = moment.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= moment:
+            candidate += timedelta(days=1)
+        return candidate
+
+    @property
+    def window_cron(self):
+        """生成时段开始时间对应的cron表达式（供调度器使用）"""
+        hour, minute = self.window_start
+        return f"{minute} {hour} * * *"
+
+    @property
+    def deliver_cron(self):
+        """投递时间对应的cron表达式（供调度器使用）"""
+        hour, minute = self.deliver_at
+        return f"{minute} {hour} * * *"
+
+
+def load_jobs():
+    """
+    Returns:
+        list[PrefetchJob]: 配置中的全部提前生成任务
+    """
+    return [PrefetchJob(entry) for entry in getattr(config, 'PREFETCH_JOBS', [])]
+
+
+def _message_path(name, deliver_at):
+    return os.path.join(OUTBOX_DIR, f"{name}_{deliver_at:%Y%m%d_%H%M}.json")
+
+
+def _write_message(path, message):
+    write_json(path, message, ensure_ascii=False, indent=2)
+
+
+def generate(job, force=False, session=None, deadline=None):
+    """
+    从Kimi获取内容，渲染成完整邮件并存入待发箱
+
+    Args:
+        job (PrefetchJob): 提前生成任务
+        force (bool): 不在生成时段内也强制生成
+        session (KimiSession): 已预热的浏览器会话，可选
+        deadline (Deadline): 运行时间预算，可选；运行被取消时不写入待发箱
+
+    Returns:
+        str: 待发邮件文件路径，未生成时返回None
+    """
+    now = datetime.now()
+    if not force and not job.in_window(now):
+        logger.warning(f"当前不在任务 [{job.name}] 的生成时段内，跳过生成（可使用 --force 强制生成）")
+        return None
+
+    deliver_at = job.next_delivery(now)
+    path = _message_path(job.name, deliver_at)
+    if os.path.exists(path) and not force:
+        logger.info(f"任务 [{job.name}] 在 {deliver_at:%m-%d %H:%M} 的邮件已生成，跳过")
+        return path
+
+    # 只有生成步骤才需要浏览器
+    from kimi_api import KimiAuthError, get_kimi_response
+    from kimi_handler import KimiSession
+    from html_formatter import format_text_to_html, generate_email_html, generate_error_email_html
+    from login_probe import preflight, record_auth_failure, record_auth_success
+
+    session = session or KimiSession(job.user_data_dir)
+    if preflight(session, deadline=deadline):
+        logger.error(f"任务 [{job.name}] 登录状态不可用，跳过提前生成")
+        return None
+
+    logger.info(f"任务 [{job.name}] 开始提前生成，计划投递时间 {deliver_at:%Y-%m-%d %H:%M}")
+    try:
+        response = get_kimi_response(job.prompt, job.use_existing_chat, session=session,
+                                     target_chat_name=job.target_chat, deadline=deadline)
+    except KimiAuthError as e:
+        logger.error(f"任务 [{job.name}] Kimi登录状态失效，跳过提前生成: {e}")
+        record_auth_failure(session, e)
+        return None
+
+    if deadline is not None and deadline.cancelled:
+        logger.warning(f"任务 [{job.name}] 已被取消，不写入待发箱")
+        return None
+
+    date_str = deliver_at.strftime('%Y年%m月%d日')
+    if "失败" in response or "无法获取" in response:
+        logger.error(f"任务 [{job.name}] 提前生成失败，将在投递时间发送错误通知")
+        kind = 'error'
+        subject = f"Kimi邮件工具运行失败通知 {date_str}"
+        html_content = generate_error_email_html(response)
+    else:
+        record_auth_success(session)
+        kind = 'digest'
+        subject = f"今日咨询推送 {date_str}"
+        html_content = generate_email_html(format_text_to_html(response), date=deliver_at)
+
+    generated_at = datetime.now()
+    _write_message(path, {
+        'name': job.name,
+        'kind': kind,
+        'subject': subject,
+        'html': html_content,
+        # 原始回复在投递成功后写入周报/月报汇总
+        'response': response if kind == 'digest' else None,
+        'generated_at': generated_at.isoformat(),
+        'deliver_at': deliver_at.isoformat(),
+        'expires_at': (generated_at + job.max_age).isoformat(),
+    })
+    logger.info(f"任务 [{job.name}] 的邮件已存入待发箱: {path}")
+    return path
+
+
+def pending_messages():
+    """
+    Returns:
+        list[tuple[str, dict]]: 待发箱中的全部邮件，按投递时间排序
+    """
+    messages = []
+    for path in glob.glob(os.path.join(OUTBOX_DIR, '*.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                messages.append((path, json.load(f)))
+        except Exception as e:
+            logger.warning(f"读取待发邮件失败 {path}: {e}")
+    messages.sort(key=lambda item: item[1]['deliver_at'])
+    return messages
+
+
+def deliver_due(now=None, name=None):
+    """
+    发送所有已到投递时间的邮件，过期的邮件不发送
+
+    Args:
+        now (datetime): 当前时间，默认 datetime.now()
+        name (str): 只投递指定任务的邮件
+
+    Returns:
+        int: 成功发送的邮件数量
+    """
+    import mailer
+    import rollup
+    import web_archive
+    from html_formatter import format_text_to_html
+
+    now = now or datetime.now()
+    sent = 0
+    for path, message in pending_messages():
+        if name and message['name'] != name:
+            continue
+        if datetime.fromisoformat(message['deliver_at']) > now:
+            continue
+
+        if now > datetime.fromisoformat(message['expires_at']):
+            logger.warning(f"待发邮件已过期（生成于 {message['generated_at']}），不再发送: {path}")
+            _archive(path, message, 'stale')
+            continue
+
+        if mailer.send_email(message['subject'], message['html'], text=message.get('response')):
+            logger.info(f"已按计划投递 [{message['name']}]: {message['subject']}")
+            _archive(path, message, 'sent')
+            if message.get('response'):
+                day = datetime.fromisoformat(message['deliver_at']).date()
+                rollup.record(message['response'], day=day, job=message['name'])
+                web_archive.publish(message['subject'], format_text_to_html(message['response']),
+                                    [message['response']], day)
+            sent += 1
+        else:
+            logger.error(f"投递失败，邮件保留在待发箱中等待下次重试: {path}")
+    return sent
+
+
+def _archive(path, message, status):
+    message['status'] = status
+    message['processed_at'] = datetime.now().isoformat()
+    _write_message(os.path.join(SENT_DIR, os.path.basename(path)), message)
+    os.remove(path)
+
+
+def wait_and_deliver(name=None, max_wait_hours=24):
+    """
+    等到最近一封待发邮件的投递时间再准时发送（用于系统定时任务提前启动的场景）
+
+    Args:
+        name (str): 只投递指定任务的邮件
+        max_wait_hours (float): 最长等待时间
+
+    Returns:
+        int: 成功发送的邮件数量
+    """
+    pending = [message for _, message in pending_messages() if not name or message['name'] == name]
+    if pending:
+        deliver_at = datetime.fromisoformat(pending[0]['deliver_at'])
+        wait_seconds = (deliver_at - datetime.now()).total_seconds()
+        if 0 < wait_seconds <= max_wait_hours * 3600:
+            logger.info(f"等待到 {deliver_at:%H:%M:%S} 投递...")
+            time.sleep(wait_seconds)
+    return deliver_due(name=name)
+
+
+if __name__ == "__main__":
+    from logger import setup_logger_from_config
+    setup_logger_from_config(config)
+
+    parser = argparse.ArgumentParser(description="提前生成与定时投递")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="在生成时段内提前生成邮件")
+    generate_parser.add_argument("name", nargs="?", help="只生成指定任务")
+    generate_parser.add_argument("--force", action="store_true", help="忽略生成时段强制生成")
+    deliver_parser = subparsers.add_parser("deliver", help="投递已到时间的邮件")
+    deliver_parser.add_argument("name", nargs="?", help="只投递指定任务")
+    deliver_parser.add_argument("--wait", action="store_true", help="等待到投递时间再发送")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        for prefetch_job in load_jobs():
+            if args.name is None or prefetch_job.name == args.name:
+                generate(prefetch_job, force=args.force)
+    elif args.wait:
+        wait_and_deliver(args.name)
+    else:
+        deliver_due(name=args.name)
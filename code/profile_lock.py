@@ -0,0 +1,133 @@
+# profile_lock.py
+"""
+浏览器用户数据目录锁
+保证同一个Playwright用户数据目录在同一时刻只被一个任务使用
+（Chromium无法让两个进程同时打开同一个持久化目录）
+"""
+
+import os
+import threading
+import time
+from logger import get_logger
+
+logger = get_logger()
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+# 进程内每个目录一把线程锁，文件锁只负责跨进程互斥
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+# 各目录当前持有者的线程ID
+_owners = {}
+
+
+def _thread_lock_for(path):
+    with _thread_locks_guard:
+        lock = _thread_locks.get(path)
+        if lock is None:
+            lock = threading.Lock()
+            _thread_locks[path] = lock
+        return lock
+
+
+class ProfileLock:
+    """
+    用户数据目录的互斥锁（进程内 + 跨进程）
+
+    锁文件放在目录旁边（<目录>.lock），不会混入Chromium自己的文件。
+    """
+
+    def __init__(self, user_data_dir):
+        """
+        Args:
+            user_data_dir (str): Playwright用户数据目录
+        """
+        self.path = os.path.abspath(user_data_dir)
+        self.lock_path = self.path.rstrip(os.sep) + '.lock'
+        self._thread_lock = _thread_lock_for(self.path)
+        self._file = None
+
+    def acquire(self, timeout=None, poll_interval=1.0):
+        """
+        获取锁
+
+        Args:
+            timeout (float): 最长等待秒数，None表示一直等待
+            poll_interval (float): 跨进程锁被占用时的重试间隔（秒）
+
+        Returns:
+            bool: 是否成功获取
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._thread_lock.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+
+        while True:
+            if self._try_lock_file():
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                self._thread_lock.release()
+                return False
+            time.sleep(poll_interval)
+
+    def _try_lock_file(self):
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        f = open(self.lock_path, 'a+')
+        try:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        _owners[self.path] = threading.get_ident()
+        return True
+
+    def release(self):
+        """释放锁"""
+        if self._file is not None:
+            try:
+                if os.name == 'nt':
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            except OSError as e:
+                logger.debug("释放目录锁时出错: %s", e)
+            self._file.close()
+            self._file = None
+            _owners.pop(self.path, None)
+            self._thread_lock.release()
+
+    def locked(self):
+        """
+        Returns:
+            bool: 当前进程内是否有任务持有该目录
+        """
+        return self._thread_lock.locked()
+
+    def held(self):
+        """
+        Returns:
+            bool: 当前线程是否持有该目录（例如定时任务在启动会话前已加锁）
+        """
+        return _owners.get(self.path) == threading.get_ident()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
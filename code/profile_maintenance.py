@@ -0,0 +1,343 @@
+# profile_maintenance.py
+"""
+浏览器用户数据目录维护模块
+Chromium会在 playwright_user_data 中不断累积HTTP缓存、GPU/着色器缓存、Service Worker 等数据，
+目录越大 launch_persistent_context 越慢。本模块统计目录大小和启动耗时，
+清理缓存目录（保留 Cookies、Local Storage 等登录状态），并可通过启动参数限制磁盘缓存大小
+
+每次清理都会记录清理前后的目录大小和启动耗时：手动清理时分别实际启动一次浏览器测量，
+运行前的自动清理取最近几次运行的启动耗时作为清理前的值，清理后的值由下一次运行的启动填入
+
+用法：
+    python profile_maintenance.py status            # 查看目录大小、缓存占用和启动耗时
+    python profile_maintenance.py prune             # 测量启动耗时并清理缓存
+    python profile_maintenance.py prune --no-measure
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+import config
+from atomic_file import locked, write_json
+from logger import get_logger
+from profile_lock import ProfileLock
+
+logger = get_logger()
+
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profile_maintenance.json')
+
+# 用户数据目录根下的缓存目录
+ROOT_CACHE_DIRS = ('GrShaderCache', 'GraphiteDawnCache', 'ShaderCache')
+
+# 每个浏览器配置（Default、Profile 1 …）下的缓存目录；Cookies、Local Storage 等不在其中
+PROFILE_CACHE_DIRS = ('Cache', 'Code Cache', 'GPUCache', 'DawnCache', 'DawnGraphiteCache', 'DawnWebGPUCache',
+                      'Service Worker')
+
+# 保留的启动耗时样本数和清理记录数
+MAX_LAUNCH_SAMPLES = 20
+MAX_HISTORY = 20
+
+_lock = threading.Lock()
+
+
+def launch_args():
+    """
+    Returns:
+        list[str]: 启动Chromium的参数，配置了 config.PROFILE_DISK_CACHE_MB 时限制磁盘缓存大小
+    """
+    args = ['--no-sandbox']
+    cache_mb = getattr(config, 'PROFILE_DISK_CACHE_MB', None)
+    if cache_mb:
+        args.append(f'--disk-cache-size={int(cache_mb * 1024 * 1024)}')
+    return args
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _profile_dirs(user_data_dir):
+    try:
+        names = os.listdir(user_data_dir)
+    except OSError:
+        return []
+    return [name for name in names
+            if (name == 'Default' or name.startswith('Profile ')) and os.path.isdir(os.path.join(user_data_dir, name))]
+
+
+def cache_dirs(user_data_dir):
+    """
+    Returns:
+        list[str]: 目录中实际存在的可清理缓存目录（绝对路径）
+    """
+    names = list(PROFILE_CACHE_DIRS)
+    if getattr(config, 'PROFILE_PRUNE_INDEXEDDB', False):
+        names.append('IndexedDB')
+    candidates = [os.path.join(user_data_dir, name) for name in ROOT_CACHE_DIRS]
+    for profile in _profile_dirs(user_data_dir):
+        candidates.extend(os.path.join(user_data_dir, profile, name) for name in names)
+    return [path for path in candidates if os.path.isdir(path)]
+
+
+def measure_size(user_data_dir):
+    """
+    Returns:
+        tuple[int, dict]: (目录总大小, {缓存目录相对路径: 大小})，单位字节
+    """
+    caches = {os.path.relpath(path, user_data_dir): _dir_size(path) for path in cache_dirs(user_data_dir)}
+    return _dir_size(user_data_dir), caches
+
+
+def measure_launch(user_data_dir):
+    """
+    以无头模式实际启动一次浏览器（打开空白页后关闭），测量启动耗时；调用方须确保目录未被占用
+
+    Returns:
+        float: 启动耗时（秒）
+    """
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        start_time = time.time()
+        context = p.chromium.launch_persistent_context(user_data_dir=user_data_dir, headless=True,
+                                                       args=launch_args())
+        context.new_page()
+        elapsed = time.time() - start_time
+        context.close()
+    return elapsed
+
+
+def _try_measure_launch(user_data_dir):
+    try:
+        return measure_launch(user_data_dir)
+    except Exception as e:
+        logger.warning(f"测量浏览器启动耗时失败: {e}")
+        return None
+
+
+def prune(user_data_dir):
+    """
+    删除缓存目录，浏览器下次启动时会自动重建；调用方须确保目录未被占用
+
+    Returns:
+        int: 释放的字节数
+    """
+    freed = 0
+    for path in cache_dirs(user_data_dir):
+        size = _dir_size(path)
+        try:
+            shutil.rmtree(path)
+            freed += size
+        except OSError as e:
+            logger.warning(f"删除缓存目录失败 {path}: {e}")
+    return freed
+
+
+def _mb(size):
+    return f"{size / 1024 / 1024:.1f}MB"
+
+
+class MaintenanceState:
+    """各用户数据目录的启动耗时样本和清理记录，保存在JSON文件中"""
+
+    def __init__(self, path=None):
+        self.path = path or getattr(config, 'PROFILE_MAINTENANCE_FILE', None) or STATE_FILE
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def update(self, user_data_dir, change):
+        """
+        读取、修改并写回一个目录的记录
+
+        Args:
+            change (callable): 接收该目录的记录（dict）并就地修改
+        """
+        with _lock:
+            try:
+                with locked(self.path):
+                    data = self.load()
+                    change(data.setdefault(os.path.abspath(user_data_dir), {'launches': [], 'history': []}))
+                    write_json(self.path, data, ensure_ascii=False, indent=1)
+            except OSError as e:
+                logger.debug("保存目录维护记录失败: %s", e)
+
+    def profile(self, user_data_dir):
+        return self.load().get(os.path.abspath(user_data_dir), {'launches': [], 'history': []})
+
+
+def record_launch(user_data_dir, seconds, state=None):
+    """
+    记录一次运行中浏览器的启动耗时；上一次清理后的首次启动同时填入该次清理的"清理后"耗时
+
+    Args:
+        user_data_dir (str): 用户数据目录
+        seconds (float): 启动耗时（秒）
+    """
+    def change(profile):
+        profile['launches'] = (profile['launches'] + [round(seconds, 3)])[-MAX_LAUNCH_SAMPLES:]
+        last = profile['history'][-1] if profile['history'] else None
+        if last is not None and last.get('launch_after') is None:
+            last['launch_after'] = round(seconds, 3)
+            before = last.get('launch_before')
+            logger.info(f"清理缓存后首次启动浏览器用时 {seconds:.1f} 秒"
+                        + (f"（清理前 {before:.1f} 秒）" if before is not None else ""))
+
+    (state or MaintenanceState()).update(user_data_dir, change)
+
+
+def _record_prune(user_data_dir, entry, state=None):
+    def change(profile):
+        profile['last_checked'] = entry['time']
+        profile['history'] = (profile['history'] + [entry])[-MAX_HISTORY:]
+
+    (state or MaintenanceState()).update(user_data_dir, change)
+
+
+def maintain(user_data_dir, measure=True, trigger='manual', state=None):
+    """
+    清理缓存并记录清理前后的目录大小和启动耗时；调用方须确保目录未被占用
+
+    Args:
+        user_data_dir (str): 用户数据目录
+        measure (bool): 是否在清理前后各实际启动一次浏览器测量启动耗时；
+            为False时清理前取最近几次运行的启动耗时中位数，清理后的值由下一次运行填入
+        trigger (str): 触发方式（"manual" 或 "auto"）
+
+    Returns:
+        dict: 本次清理记录
+    """
+    state = state or MaintenanceState()
+    size_before, _ = measure_size(user_data_dir)
+    if measure:
+        launch_before = _try_measure_launch(user_data_dir)
+    else:
+        launches = state.profile(user_data_dir)['launches'][-5:]
+        launch_before = statistics.median(launches) if launches else None
+    freed = prune(user_data_dir)
+    size_after, _ = measure_size(user_data_dir)
+    launch_after = _try_measure_launch(user_data_dir) if measure else None
+
+    entry = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'trigger': trigger,
+        'size_before': size_before,
+        'size_after': size_after,
+        'freed': freed,
+        'launch_before': round(launch_before, 3) if launch_before is not None else None,
+        'launch_after': round(launch_after, 3) if launch_after is not None else None,
+    }
+    _record_prune(user_data_dir, entry, state)
+    message = f"已清理浏览器缓存 {_mb(freed)}，目录大小 {_mb(size_before)} → {_mb(size_after)}"
+    if launch_before is not None and launch_after is not None:
+        message += f"，启动耗时 {launch_before:.1f} → {launch_after:.1f} 秒"
+    logger.info(message)
+    return entry
+
+
+def maybe_maintain(user_data_dir, state=None):
+    """
+    运行前的自动维护：距上次检查超过 config.PROFILE_MAINTENANCE_INTERVAL_HOURS 小时，
+    且缓存超过 config.PROFILE_CACHE_MAX_MB 时清理（不额外启动浏览器测量）；出错只记录日志
+
+    须在启动浏览器之前调用。当前线程未持有该目录时，清理期间临时加锁；
+    目录正被其他任务（定时任务、登录设置脚本等）占用时跳过，不删除正在使用的缓存
+
+    Returns:
+        dict: 本次清理记录，未清理时为None
+    """
+    if not getattr(config, 'PROFILE_AUTO_MAINTENANCE', True) or not os.path.isdir(user_data_dir):
+        return None
+    lock = ProfileLock(user_data_dir)
+    if lock.held():
+        return _maybe_maintain(user_data_dir, state)
+    if not lock.acquire(timeout=0):
+        logger.debug("浏览器目录正被其他任务使用，跳过自动清理: %s", user_data_dir)
+        return None
+    try:
+        return _maybe_maintain(user_data_dir, state)
+    finally:
+        lock.release()
+
+
+def _maybe_maintain(user_data_dir, state=None):
+    state = state or MaintenanceState()
+    try:
+        last_checked = state.profile(user_data_dir).get('last_checked')
+        interval = timedelta(hours=getattr(config, 'PROFILE_MAINTENANCE_INTERVAL_HOURS', 24))
+        if last_checked and datetime.now() - datetime.fromisoformat(last_checked) < interval:
+            return None
+        cache_size = sum(_dir_size(path) for path in cache_dirs(user_data_dir))
+        if cache_size <= getattr(config, 'PROFILE_CACHE_MAX_MB', 200) * 1024 * 1024:
+            now = datetime.now().isoformat(timespec='seconds')
+            state.update(user_data_dir, lambda profile: profile.update(last_checked=now))
+            logger.debug("浏览器缓存占用 %s，无需清理", _mb(cache_size))
+            return None
+        logger.info(f"浏览器缓存占用 {_mb(cache_size)}，启动前自动清理...")
+        return maintain(user_data_dir, measure=False, trigger='auto', state=state)
+    except Exception as e:
+        logger.warning(f"自动清理浏览器缓存失败: {e}")
+        return None
+
+
+def print_status(user_data_dir, state=None):
+    total, caches = measure_size(user_data_dir)
+    profile = (state or MaintenanceState()).profile(user_data_dir)
+    print(f"用户数据目录: {os.path.abspath(user_data_dir)}")
+    print(f"目录大小: {_mb(total)}，其中可清理的缓存 {_mb(sum(caches.values()))}")
+    for name, size in sorted(caches.items(), key=lambda item: -item[1]):
+        print(f"  {name}: {_mb(size)}")
+    if profile['launches']:
+        launches = profile['launches']
+        print(f"最近 {len(launches)} 次启动耗时: 中位数 {statistics.median(launches):.1f} 秒，最近一次 {launches[-1]:.1f} 秒")
+    for entry in profile['history'][-5:]:
+        before, after = entry.get('launch_before'), entry.get('launch_after')
+        launch = (f"，启动 {before if before is not None else '-'} → {after if after is not None else '-'} 秒"
+                  if before is not None or after is not None else "")
+        print(f"  {entry['time']} [{entry['trigger']}] 释放 {_mb(entry['freed'])}，"
+              f"{_mb(entry['size_before'])} → {_mb(entry['size_after'])}{launch}")
+
+
+if __name__ == "__main__":
+    import sys
+    from logger import setup_logger_from_config
+    setup_logger_from_config(config)
+
+    parser = argparse.ArgumentParser(description="浏览器用户数据目录维护")
+    parser.add_argument("command", choices=["status", "prune"], help="status: 查看大小和启动耗时；prune: 清理缓存")
+    parser.add_argument("--dir", default=config.USER_DATA_DIR, help="用户数据目录，默认为config.USER_DATA_DIR")
+    parser.add_argument("--no-measure", action="store_true", help="清理前后不启动浏览器测量启动耗时")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        print(f"用户数据目录不存在: {args.dir}")
+        sys.exit(1)
+    if args.command == "status":
+        print_status(args.dir)
+        sys.exit(0)
+
+    lock = ProfileLock(args.dir)
+    if not lock.acquire(timeout=0):
+        print(f"用户数据目录正在被其他任务使用，请稍后再试: {args.dir}")
+        sys.exit(1)
+    try:
+        maintain(args.dir, measure=not args.no_measure)
+    finally:
+        lock.release()
+    print_status(args.dir)
@@ -0,0 +1,142 @@
+# prompt_catalog.py
+"""
+提示词目录模块
+把多个主题的提示词（如科技、财经、本地新闻）放在各自的Kimi会话中并发生成，
+再合并成一封分栏目的早报邮件
+"""
+
+import os
+from datetime import datetime
+import config
+from logger import get_logger
+from html_formatter import format_sections_to_html, generate_email_html, generate_error_email_html
+
+logger = get_logger()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_catalog():
+    """
+    读取 config.PROMPT_CATALOG
+
+    每项包含 name（栏目标题）、target_chat（该主题专用的会话名称），
+    以及 prompt 或 prompt_file（相对路径相对于 code 目录）；可选 continue_prompt。
+
+    Returns:
+        list[dict]: 提示词列表，未配置时为空列表
+    """
+    catalog = []
+    names = set()
+    for entry in getattr(config, 'PROMPT_CATALOG', None) or []:
+        name = entry['name']
+        if name in names:
+            raise ValueError(f"提示词目录中的栏目名称重复: {name}")
+        names.add(name)
+
+        prompt = entry.get('prompt')
+        if not prompt:
+            prompt_file = entry['prompt_file']
+            if not os.path.isabs(prompt_file):
+                prompt_file = os.path.join(BASE_DIR, prompt_file)
+            with open(prompt_file, 'r', encoding='utf-8') as f:
+                prompt = f.read()
+
+        catalog.append({
+            'name': name,
+            'prompt': prompt,
+            'target_chat': entry.get('target_chat') or name,
+            'continue_prompt': entry.get('continue_prompt'),
+        })
+    return catalog
+
+
+def _is_failed(response):
+    return not response or "失败" in response or "无法获取" in response
+
+
+def run_digest(catalog, use_existing_chat=True, session=None, receivers=None, deadline=None, start_time=None,
+               job=None):
+    """
+    并发生成目录中的全部提示词，合并成一封分栏目邮件发送
+
+    部分栏目失败时仍发送其余栏目（失败的栏目显示提示）；全部失败时发送错误通知邮件，
+    但全部因登录失效而失败时不发邮件，记入熔断器。
+    运行预算用完时，已生成的栏目照常发送。全部回复获取完成后立即发送，
+    修改对话标题、关闭浏览器与发送同时进行。
+
+    Args:
+        catalog (list[dict]): load_catalog 返回的提示词列表
+        use_existing_chat (bool): 是否使用现有对话
+        session (KimiSession): 浏览器会话，可选
+        receivers (list[str]): 收件人，为None时使用config.EMAIL_RECEIVER
+        deadline (Deadline): 运行时间预算，可选
+        start_time (float): 任务开始时间（time.time()），用于统计邮件送达耗时，默认为现在
+        job (str): 任务名称，用于周报/月报汇总
+
+    Returns:
+        str: 运行结果（"success"、"partial"、"kimi_failed"、"mail_failed"、"cancelled" 或 "auth_failed"），
+            用于指标标签
+    """
+    from deadline import ensure as ensure_deadline
+    from delivery import EarlyDelivery
+    from kimi_api import KimiAuthError, get_kimi_responses
+    from login_probe import record_auth_failure, record_auth_success
+
+    deadline = ensure_deadline(deadline)
+    delivery = EarlyDelivery(lambda responses, rendered: _deliver_digest(catalog, responses, receivers, deadline,
+                                                                         on_sent=delivery.mark_sent, job=job,
+                                                                         rendered=rendered), start_time)
+    logger.info(f"并发生成 {len(catalog)} 个栏目: {', '.join(item['name'] for item in catalog)}")
+    try:
+        responses = get_kimi_responses(catalog, use_existing_chat, session=session,
+                                       deadline=deadline.reserve(getattr(config, 'RUN_DEADLINE_MAIL_RESERVE', 60)),
+                                       on_results=delivery.start)
+    except KimiAuthError as e:
+        # 与单个提示词相同：不发送错误邮件，记入熔断器
+        logger.error(f"Kimi登录状态失效: {e}")
+        record_auth_failure(session, e, receivers)
+        return "auth_failed"
+    if not all(_is_failed(responses.get(item['name'])) for item in catalog):
+        # 至少一个栏目拿到了回复，说明登录有效
+        record_auth_success(session)
+    return delivery.finish(responses)
+
+
+def _deliver_digest(catalog, responses, receivers, deadline, on_sent=None, job=None, rendered=None):
+    import mailer
+    import rollup
+    import web_archive
+
+    if deadline.cancelled:
+        logger.warning("运行已被取消，不发送邮件")
+        return "cancelled"
+
+    today_str = datetime.now().strftime('%Y年%m月%d日')
+    failed = [item['name'] for item in catalog if _is_failed(responses.get(item['name']))]
+    if len(failed) == len(catalog):
+        logger.error("所有栏目均获取失败，发送错误通知邮件")
+        details = '\n\n'.join(f"[{item['name']}] {responses.get(item['name'])}" for item in catalog)
+        if mailer.send_email(f"Kimi邮件工具运行失败通知 {today_str}", generate_error_email_html(details), receivers,
+                             deadline=deadline) and on_sent:
+            on_sent()
+        return "kimi_failed"
+
+    if failed:
+        logger.warning(f"以下栏目获取失败，将在邮件中标注: {', '.join(failed)}")
+
+    sections = [
+        (item['name'], None if item['name'] in failed else responses[item['name']])
+        for item in catalog
+    ]
+    subject = f"今日咨询推送 {today_str}"
+    content = format_sections_to_html(sections, rendered)
+    text = '\n\n'.join(f"【{name}】\n\n{section_text or '本栏目今日获取失败'}" for name, section_text in sections)
+    if not mailer.send_email(subject, generate_email_html(content), receivers, deadline=deadline, text=text):
+        logger.error("邮件发送失败，不写入汇总和网页归档")
+        return "mail_failed"
+    if on_sent:
+        on_sent()
+    rollup.record_sections(sections, job=job)
+    web_archive.publish(subject, content, [text for _, text in sections if text])
+    return "partial" if failed else "success"
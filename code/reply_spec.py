@@ -0,0 +1,310 @@
+# reply_spec.py
+"""
+回复格式检查模块
+按提示词要求的结构（①–⑤ 五个问题、每个问题的金句和延伸、末尾的「本次话题关键词」行）检查Kimi的回复，
+回复被截断或格式不全时，在同一对话中只追问缺少的部分，再拼回原回复，
+修好一个问题只需几秒钟的生成，而不必把五个话题全部重新生成一遍
+"""
+
+import re
+import config
+import metrics
+from deadline import ensure as ensure_deadline
+from logger import get_logger
+
+logger = get_logger()
+
+# 问题编号
+MARKS = '①②③④⑤⑥⑦⑧⑨⑩'
+
+# 每个问题下需要检查的字段（出现在提示词中才检查）
+FIELDS = ('金句', '延伸')
+
+KEYWORDS_LABEL = '本次话题关键词'
+
+# 追问至少需要的剩余预算（秒），不足时直接使用原回复
+REPAIR_MIN_SECONDS = 60
+
+_ITEM_START = re.compile(rf'^\s*([{MARKS}])')
+_KEYWORDS_LINE = re.compile(rf'^\s*[「『]?{KEYWORDS_LABEL}\s*[：:]?\s*(.*?)[」』]?\s*$')
+_DOMAIN = re.compile(r'[（(]\s*(?:领域\s*[：:]\s*)?([^（）()]{1,20}?)\s*[)）]\s*$')
+_FIELD_LINE = re.compile(r'^\s*[•·\-*]?\s*(回答|金句|延伸)[^：:\n]{0,4}[：:]\s*(.*)$')
+_QUESTION_PREFIX = re.compile(rf'^\s*[{MARKS}]\s*(?:问题\s*[：:])?\s*')
+
+
+class ParsedReply:
+    """
+    按问题编号拆分后的回复
+
+    Attributes:
+        preamble (str): 第一个问题之前的内容
+        items (dict): {编号: 该问题的全部文本}，按出现顺序
+        keywords_line (str): 「本次话题关键词」行，没有时为None
+        tail (str): 关键词行之后的内容
+    """
+
+    def __init__(self, preamble='', items=None, keywords_line=None, tail=''):
+        self.preamble = preamble
+        self.items = items if items is not None else {}
+        self.keywords_line = keywords_line
+        self.tail = tail
+
+    def render(self):
+        """按编号顺序重新拼成回复文本"""
+        blocks = [self.preamble] if self.preamble else []
+        blocks.extend(self.items[mark] for mark in sorted(self.items, key=MARKS.index))
+        if self.keywords_line:
+            blocks.append(self.keywords_line)
+        if self.tail:
+            blocks.append(self.tail)
+        return '\n\n'.join(blocks)
+
+
+def parse_reply(text):
+    """
+    按问题编号拆分回复，同一编号出现多次时保留第一次
+
+    Returns:
+        ParsedReply: 拆分结果
+    """
+    parsed = ParsedReply()
+    preamble, tail = [], []
+    current = None
+    lines = {}
+    for line in (text or '').splitlines():
+        if parsed.keywords_line is not None:
+            tail.append(line)
+            continue
+        if _KEYWORDS_LINE.match(line):
+            parsed.keywords_line = line.strip()
+            current = None
+            continue
+        match = _ITEM_START.match(line)
+        if match:
+            current = match.group(1) if match.group(1) not in lines else None
+            if current is not None:
+                lines[current] = []
+        if current is not None:
+            lines[current].append(line)
+        elif not lines:
+            preamble.append(line)
+    parsed.preamble = '\n'.join(preamble).strip()
+    parsed.items = {mark: '\n'.join(item_lines).strip() for mark, item_lines in lines.items()}
+    parsed.tail = '\n'.join(tail).strip()
+    return parsed
+
+
+def parse_item(block):
+    """
+    提取一个问题的各个字段
+
+    Returns:
+        dict: mark、question、domain、quote、extension（缺少的字段为空字符串）
+    """
+    lines = block.strip().splitlines()
+    first_line = lines[0] if lines else ''
+    question = _QUESTION_PREFIX.sub('', first_line).strip()
+    domain_match = _DOMAIN.search(question)
+    fields = {}
+    for line in lines[1:]:
+        match = _FIELD_LINE.match(line)
+        if match and match.group(1) not in fields:
+            fields[match.group(1)] = match.group(2).strip().strip('「」“”"')
+    return {
+        'mark': first_line.strip()[:1],
+        'question': question,
+        'domain': domain_match.group(1).strip() if domain_match else '',
+        'quote': fields.get('金句', ''),
+        'extension': fields.get('延伸', ''),
+    }
+
+
+def parse_keywords(keywords_line):
+    """
+    Returns:
+        list[str]: 关键词行中的关键词
+    """
+    match = _KEYWORDS_LINE.match(keywords_line or '')
+    if not match:
+        return []
+    value = match.group(1)
+    bracketed = re.findall(r'[\[【]([^\]】]+)[\]】]', value)
+    if bracketed:
+        return [keyword.strip() for keyword in bracketed if keyword.strip()]
+    return [keyword for keyword in re.split(r'[\s、,，;；/]+', value) if keyword]
+
+
+class ReplySpec:
+    """从提示词推断出的回复结构"""
+
+    def __init__(self, marks, fields=(), keywords=False):
+        """
+        Args:
+            marks (str): 应出现的问题编号，如 "①②③④⑤"
+            fields (tuple[str]): 每个问题都应包含的字段
+            keywords (bool): 是否应有「本次话题关键词」行
+        """
+        self.marks = marks
+        self.fields = tuple(fields)
+        self.keywords = keywords
+
+    @classmethod
+    def from_prompt(cls, prompt):
+        """
+        Returns:
+            ReplySpec: 提示词要求的结构，提示词没有使用圆圈编号时为None
+        """
+        marks = ''.join(mark for mark in MARKS if mark in (prompt or ''))
+        if not marks:
+            return None
+        return cls(marks, [field for field in FIELDS if field in prompt], KEYWORDS_LABEL in prompt)
+
+    def check(self, text):
+        """
+        检查回复是否符合结构
+
+        Returns:
+            list[tuple[str, str]]: 问题列表，每项为 (编号, 缺少的内容)；
+                缺少的内容为 "item"（整个问题）、"truncated"（问题在回答中途被截断，全部字段都缺失）
+                或字段名，关键词行缺失时为 (None, "keywords")
+        """
+        parsed = parse_reply(text)
+        problems = []
+        for mark in self.marks:
+            block = parsed.items.get(mark)
+            if block is None:
+                problems.append((mark, 'item'))
+                continue
+            item = parse_item(block)
+            missing = [field for field, key in (('金句', 'quote'), ('延伸', 'extension'))
+                       if field in self.fields and not item[key]]
+            if missing and len(missing) == len(self.fields):
+                problems.append((mark, 'truncated'))
+            else:
+                problems.extend((mark, field) for field in missing)
+        if self.keywords and not parse_keywords(parsed.keywords_line):
+            problems.append((None, 'keywords'))
+        return problems
+
+
+def describe(problems):
+    """
+    Returns:
+        str: 问题列表的简短描述，用于日志
+    """
+    parts = []
+    for mark, missing in problems:
+        if mark is None:
+            parts.append(f"缺少{KEYWORDS_LABEL}")
+        elif missing == 'item':
+            parts.append(f"缺少{mark}")
+        elif missing == 'truncated':
+            parts.append(f"{mark}被截断")
+        else:
+            parts.append(f"{mark}缺少{missing}")
+    return '、'.join(parts)
+
+
+def followup_prompt(spec, problems):
+    """
+    生成只追问缺少部分的提示词
+
+    Returns:
+        str: 追问提示词
+    """
+    missing_items = [mark for mark, missing in problems if missing == 'item']
+    present = ''.join(mark for mark in spec.marks if mark not in missing_items)
+    lines = ["上一条回答不完整。请只补充下面列出的内容，不要重复已经完整的问题，也不要加任何说明："]
+    truncated = [mark for mark, missing in problems if missing == 'truncated']
+    fields_by_mark = {}
+    for mark, missing in problems:
+        if mark is not None and missing not in ('item', 'truncated'):
+            fields_by_mark.setdefault(mark, []).append(missing)
+    for mark in spec.marks:
+        if mark in missing_items:
+            note = f"，话题不要与{present}重复" if present else ""
+            lines.append(f"• 问题{mark}：按原格式从编号{mark}开始完整输出{note}")
+        elif mark in truncated:
+            lines.append(f"• 问题{mark}：回答被截断了，保持原来的话题，按原格式从编号{mark}开始完整输出")
+        elif mark in fields_by_mark:
+            fields = '、'.join(f"「{field}」" for field in fields_by_mark[mark])
+            lines.append(f"• 问题{mark}：只输出{fields}，第一行写编号{mark}，"
+                         f"之后每项一行，如「• {fields_by_mark[mark][0]}：……」")
+    if (None, 'keywords') in problems:
+        lines.append(f"• 最后一行输出「{KEYWORDS_LABEL}：[关键词1] [关键词2] …」，"
+                     f"包含全部{len(spec.marks)}个问题的关键词")
+    return '\n'.join(lines)
+
+
+def splice(text, reply, problems):
+    """
+    把追问得到的内容拼回原回复：缺失或被截断的问题整段替换，缺失的字段追加到原问题末尾，关键词行整行替换
+
+    Returns:
+        str: 拼接后的回复，追问结果中没有可用内容时原样返回
+    """
+    original = parse_reply(text)
+    patch = parse_reply(reply)
+    changed = False
+    for mark, missing in problems:
+        if mark is None:
+            if parse_keywords(patch.keywords_line):
+                original.keywords_line = patch.keywords_line
+                changed = True
+            continue
+        block = patch.items.get(mark)
+        if block is None:
+            continue
+        if missing in ('item', 'truncated'):
+            original.items[mark] = block
+            changed = True
+            continue
+        for line in block.splitlines():
+            match = _FIELD_LINE.match(line)
+            if match and match.group(1) == missing and match.group(2).strip():
+                original.items[mark] = f"{original.items[mark]}\n{line.strip()}"
+                changed = True
+                break
+    return original.render() if changed else text
+
+
+def repair(text, spec, ask, deadline=None):
+    """
+    检查回复，有缺失时在同一对话中追问并拼接，追问失败时返回已有的最好结果
+
+    Args:
+        text (str): 回复
+        spec (ReplySpec): 回复结构，为None时不检查
+        ask (callable): 在同一对话中发送追问并返回回复的函数
+        deadline (Deadline): 运行时间预算，剩余不足 REPAIR_MIN_SECONDS 秒时不再追问
+
+    Returns:
+        str: 修补后的回复
+    """
+    if spec is None or not getattr(config, 'REPLY_SPEC_CHECK', True):
+        return text
+    problems = spec.check(text)
+    if not problems:
+        return text
+
+    deadline = ensure_deadline(deadline)
+    logger.warning(f"回复格式不完整: {describe(problems)}")
+    metrics.FAILURES.inc(type="reply_spec")
+    for _ in range(getattr(config, 'REPLY_REPAIR_MAX_ROUNDS', 1)):
+        remaining = deadline.remaining()
+        if remaining < REPAIR_MIN_SECONDS:
+            logger.warning(f"运行预算仅剩{remaining:.0f}秒，不再追问，按现有内容发送")
+            break
+        logger.info("在同一对话中追问缺少的部分...")
+        try:
+            reply = ask(followup_prompt(spec, problems))
+        except Exception as e:
+            logger.warning(f"追问失败，按现有内容发送: {e}")
+            break
+        text = splice(text, reply, problems)
+        problems = spec.check(text)
+        if not problems:
+            logger.info("已补全回复中缺少的部分")
+            break
+        logger.warning(f"追问后仍不完整: {describe(problems)}")
+    return text
@@ -0,0 +1,295 @@
+# rollup.py
+"""
+周报/月报汇总模块
+每次运行成功后，把当天回复中的话题（问题、领域、金句、关键词）增量写入所在周和所在月的汇总文件；
+发送周报或月报时只读取一个汇总文件，按领域分组后经 html_formatter 渲染，
+耗时与历史天数无关，也不需要重新解析过去的原始回复
+
+用法：
+    python rollup.py send week             # 发送本周（截至今天）的周报
+    python rollup.py send month --last     # 发送上个月的月报
+    python rollup.py show week             # 只渲染并输出HTML，不发送
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+import config
+from atomic_file import locked, write_json
+from html_formatter import format_sections_to_html, generate_email_html
+from logger import get_logger
+from reply_spec import parse_item, parse_keywords, parse_reply
+
+logger = get_logger()
+
+ROLLUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rollups')
+
+PERIODS = ('week', 'month')
+
+PERIOD_NAMES = {'week': '周', 'month': '月'}
+
+# 没有领域标注的话题归入该分组
+UNTAGGED_DOMAIN = '其他'
+
+# 没有指定任务名称的运行（手动运行、单一定时任务）记在该名称下
+DEFAULT_JOB = 'default'
+
+_DOMAIN_SUFFIX = re.compile(r'\s*[（(][^（）()]*[)）]\s*$')
+
+_lock = threading.Lock()
+
+
+def period_key(period, day):
+    """
+    Args:
+        period (str): "week" 或 "month"
+        day (date): 日期
+
+    Returns:
+        str: 汇总文件名中的周期标识，如 "week_2025-W07"、"month_2025-02"
+    """
+    if period == 'week':
+        year, week, _ = day.isocalendar()
+        return f"week_{year}-W{week:02d}"
+    return f"month_{day:%Y-%m}"
+
+
+def _domain_group(domain):
+    # "科技/产业" 之类的多领域标注按第一个领域分组
+    group = re.split(r'[/、，,|｜]', domain or '')[0].strip()
+    return group or UNTAGGED_DOMAIN
+
+
+def extract_topics(text, source=None):
+    """
+    从一次回复中提取话题
+
+    Args:
+        text (str): Kimi回复
+        source (str): 栏目名称（多主题早报时）
+
+    Returns:
+        list[dict]: 每个话题的 mark、question、domain、quote、keywords、source
+    """
+    parsed = parse_reply(text)
+    keywords = parse_keywords(parsed.keywords_line)
+    items = [parse_item(block) for block in parsed.items.values()]
+    topics = []
+    for index, item in enumerate(items):
+        if not item['question']:
+            continue
+        # 关键词与问题数量一致时按顺序一一对应，否则每个话题都挂上全部关键词
+        if len(keywords) == len(items):
+            topic_keywords = [keywords[index]]
+        else:
+            topic_keywords = list(keywords)
+        topics.append({
+            'mark': item['mark'],
+            # 领域已体现在分组标题中，问题本身不再带括号标注
+            'question': _DOMAIN_SUFFIX.sub('', item['question']) if item['domain'] else item['question'],
+            'domain': item['domain'],
+            'quote': item['quote'],
+            'keywords': topic_keywords,
+            'source': source,
+        })
+    return topics
+
+
+class RollupStore:
+    """按周期保存的话题汇总，每个周期一个JSON文件"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or getattr(config, 'ROLLUP_DIR', None) or ROLLUP_DIR
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        """
+        Returns:
+            dict: {'period': 周期标识, 'days': {日期: {任务: [话题]}}, 'domains': {领域: [[日期, 任务, 序号]]}}
+        """
+        try:
+            with open(self.path(key), 'r', encoding='utf-8') as f:
+                aggregate = json.load(f)
+        except (OSError, ValueError):
+            return {'period': key, 'days': {}, 'domains': {}}
+        # 早期版本每天只有一份话题列表，视为默认任务的记录
+        for day_key, jobs in aggregate['days'].items():
+            if isinstance(jobs, list):
+                aggregate['days'][day_key] = {DEFAULT_JOB: jobs}
+        for refs in aggregate['domains'].values():
+            refs[:] = [[ref[0], DEFAULT_JOB, ref[1]] if len(ref) == 2 else ref for ref in refs]
+        return aggregate
+
+    def _save(self, key, aggregate):
+        write_json(self.path(key), aggregate, ensure_ascii=False, indent=1)
+
+    def add_day(self, day, topics, job=None):
+        """
+        把一天的话题写入所在周和所在月的汇总；同一任务同一天重复运行时替换该任务当天的话题，
+        不同任务（多个定时任务、提前生成任务）的记录互不覆盖
+
+        Args:
+            day (date): 日期
+            topics (list[dict]): extract_topics 的结果
+            job (str): 任务名称，默认为 DEFAULT_JOB
+        """
+        day_key = day.isoformat()
+        job = job or DEFAULT_JOB
+        with _lock:
+            for period in PERIODS:
+                key = period_key(period, day)
+                with locked(self.path(key)):
+                    aggregate = self.load(key)
+                    aggregate['days'].setdefault(day_key, {})[job] = topics
+                    # 领域索引只需去掉该任务当天旧的条目再加上新的，不必重建整个周期
+                    for refs in aggregate['domains'].values():
+                        refs[:] = [ref for ref in refs if ref[:2] != [day_key, job]]
+                    for index, topic in enumerate(topics):
+                        aggregate['domains'].setdefault(_domain_group(topic['domain']), []).append(
+                            [day_key, job, index])
+                    aggregate['domains'] = {domain: refs for domain, refs in aggregate['domains'].items() if refs}
+                    self._save(key, aggregate)
+
+
+def record(text, day=None, source=None, store=None, job=None):
+    """
+    记录一次成功运行的话题（出错只记录日志，不影响邮件发送）
+
+    Args:
+        text (str): Kimi回复
+        day (date): 日期，默认为今天
+        source (str): 栏目名称
+        store (RollupStore): 汇总存储
+        job (str): 任务名称，同一天的多个任务分别记录
+    """
+    return record_sections([(source, text)], day, store, job)
+
+
+def record_sections(sections, day=None, store=None, job=None):
+    """
+    记录多主题早报中各栏目的话题，失败的栏目（回复为None）跳过
+
+    Args:
+        sections (list[tuple[str, str]]): (栏目名称, Kimi回复) 列表
+        job (str): 任务名称，同一天的多个任务分别记录
+
+    Returns:
+        int: 记录的话题数
+    """
+    if not getattr(config, 'ROLLUP_ENABLED', True):
+        return 0
+    try:
+        topics = []
+        for source, text in sections:
+            if text:
+                topics.extend(extract_topics(text, source))
+        if topics:
+            (store or RollupStore()).add_day(day or datetime.now().date(), topics, job)
+            logger.debug("已把 %s 个话题写入周报/月报汇总", len(topics))
+        return len(topics)
+    except Exception as e:
+        logger.warning(f"写入周报/月报汇总失败: {e}")
+        return 0
+
+
+def _topic_text(day_key, topic):
+    day = datetime.strptime(day_key, '%Y-%m-%d')
+    lines = [f"• {topic['question']}（{day:%m月%d日}）"]
+    if topic.get('quote'):
+        lines.append(f"金句：{topic['quote']}")
+    if topic.get('keywords'):
+        lines.append(f"关键词：{' '.join(topic['keywords'])}")
+    return '\n'.join(lines)
+
+
+def build_digest(period, day=None, store=None):
+    """
+    生成周报或月报的HTML
+
+    Args:
+        period (str): "week" 或 "month"
+        day (date): 周期内的任意一天，默认为今天
+
+    Returns:
+        tuple[str, str]: (邮件主题, HTML)，周期内没有任何话题时为 (None, None)
+    """
+    day = day or datetime.now().date()
+    key = period_key(period, day)
+    aggregate = (store or RollupStore()).load(key)
+    if not aggregate['days']:
+        return None, None
+
+    sections = []
+    for domain in sorted(aggregate['domains'], key=lambda name: (-len(aggregate['domains'][name]), name)):
+        refs = sorted(aggregate['domains'][domain])
+        text = '\n\n'.join(_topic_text(day_key, aggregate['days'][day_key][job][index])
+                             for day_key, job, index in refs)
+        sections.append((f"{domain}（{len(refs)}）", text))
+
+    days = sorted(aggregate['days'])
+    count = sum(len(topics) for jobs in aggregate['days'].values() for topics in jobs.values())
+    label = key.split('_', 1)[1]
+    title = f"本{PERIOD_NAMES[period]}精选"
+    logger.info(f"{title} {label}: {len(days)} 天、{count} 个话题、{len(sections)} 个领域")
+    subject = f"Kimi{PERIOD_NAMES[period]}报 {label}（{days[0]} 至 {days[-1]}）"
+    html_content = generate_email_html(format_sections_to_html(sections), title=title,
+                                       date=datetime.strptime(days[-1], '%Y-%m-%d'))
+    return subject, html_content
+
+
+def send_digest(period, day=None, receivers=None, deadline=None, store=None):
+    """
+    发送周报或月报
+
+    Args:
+        store (RollupStore): 汇总存储，默认为 config.ROLLUP_DIR（多租户运行时为各租户自己的目录）
+
+    Returns:
+        bool: 是否发送成功（周期内没有话题时不发送，返回False）
+    """
+    import mailer
+
+    subject, html_content = build_digest(period, day, store)
+    if html_content is None:
+        logger.warning(f"本{PERIOD_NAMES[period]}还没有记录任何话题，不发送")
+        return False
+    return mailer.send_email(subject, html_content, receivers, deadline=deadline)
+
+
+def period_day(period, last=False):
+    """
+    Returns:
+        date: 本周/本月（last为True时为上一周/上个月）中的一天，用于 build_digest 和 send_digest
+    """
+    today = datetime.now().date()
+    if not last:
+        return today
+    if period == 'week':
+        return today - timedelta(days=7)
+    return today.replace(day=1) - timedelta(days=1)
+
+
+if __name__ == "__main__":
+    import sys
+    from logger import setup_logger_from_config
+    setup_logger_from_config(config)
+
+    parser = argparse.ArgumentParser(description="周报/月报汇总")
+    parser.add_argument("action", choices=["send", "show"], help="send: 发送邮件；show: 输出HTML")
+    parser.add_argument("period", choices=PERIODS, help="week: 周报；month: 月报")
+    parser.add_argument("--last", action="store_true", help="使用上一周/上个月，而不是本周/本月")
+    parser.add_argument("--to", nargs="+", help="收件人，默认为config.EMAIL_RECEIVER")
+    args = parser.parse_args()
+
+    target_day = period_day(args.period, args.last)
+    if args.action == "send":
+        sys.exit(0 if send_digest(args.period, target_day, args.to) else 1)
+    _, digest_html = build_digest(args.period, target_day)
+    if digest_html is None:
+        sys.exit(1)
+    sys.stdout.write(digest_html)
@@ -0,0 +1,159 @@
+# run_stats.py
+"""
+运行耗时统计模块
+记录每次运行中各阶段（页面加载、等待开始生成、生成、查找元素等）的实际耗时，
+据此推算各阶段的超时时间（p99 × 余量）和轮询节奏，代替写死的超时和检查间隔
+"""
+
+import json
+import math
+import os
+import threading
+import config
+from atomic_file import locked, write_json
+from logger import get_logger
+
+logger = get_logger()
+
+STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_stats.json')
+
+# 每个阶段保留的最近样本数
+MAX_SAMPLES = 200
+
+
+class RunStats:
+    """
+    各阶段耗时的样本库，保存在JSON文件中
+
+    每次记录都在文件锁内重新读取文件再合并写回，多个进程同时运行时不会丢失样本。
+    """
+
+    def __init__(self, path=None, max_samples=MAX_SAMPLES):
+        self.path = path or getattr(config, 'RUN_STATS_FILE', None) or STATS_FILE
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, phase, seconds):
+        """
+        记录一次阶段耗时
+
+        Args:
+            phase (str): 阶段名称
+            seconds (float): 耗时（秒）
+        """
+        with self._lock:
+            try:
+                with locked(self.path):
+                    self._data = self._load()
+                    samples = self._data.setdefault(phase, [])
+                    samples.append(round(seconds, 3))
+                    del samples[:-self.max_samples]
+                    write_json(self.path, self._data)
+            except OSError as e:
+                logger.debug("保存耗时统计失败: %s", e)
+
+    def samples(self, phase):
+        return list(self._data.get(phase, []))
+
+    def percentile(self, phase, q):
+        """
+        Args:
+            phase (str): 阶段名称
+            q (float): 百分位（0~100）
+
+        Returns:
+            float: 该阶段耗时的百分位数，样本不足时返回None
+        """
+        samples = sorted(self._data.get(phase, []))
+        if len(samples) < getattr(config, 'TIMEOUT_MIN_SAMPLES', 5):
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(q / 100 * len(samples)) - 1))
+        return samples[index]
+
+    def timeout(self, phase, default, floor=None, ceiling=None):
+        """
+        推算阶段超时：p99 × config.TIMEOUT_MARGIN，限制在 [floor, ceiling] 内
+
+        样本不足或关闭了自适应超时时返回 default。
+
+        Returns:
+            float: 超时秒数
+        """
+        if not getattr(config, 'ADAPTIVE_TIMEOUTS', True):
+            return default
+        p99 = self.percentile(phase, 99)
+        if p99 is None:
+            return default
+        value = p99 * getattr(config, 'TIMEOUT_MARGIN', 1.5)
+        if floor is not None:
+            value = max(value, floor)
+        if ceiling is not None:
+            value = min(value, ceiling)
+        return value
+
+    def expected(self, phase):
+        """
+        Returns:
+            float: 该阶段耗时的中位数，样本不足时返回None
+        """
+        return self.percentile(phase, 50)
+
+
+class PollSchedule:
+    """
+    自适应轮询间隔：离预计完成时间越远查得越少，临近预计完成时间时密集检查，
+    超过预计时间后间隔再逐渐放宽
+    """
+
+    def __init__(self, expected=None, min_interval=0.5, max_interval=5.0, default_interval=1.0):
+        """
+        Args:
+            expected (float): 预计耗时（秒），未知时使用固定间隔 default_interval
+            min_interval (float): 最短间隔
+            max_interval (float): 最长间隔
+        """
+        self.expected = expected
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+
+    def interval(self, elapsed):
+        """
+        Args:
+            elapsed (float): 已等待的秒数
+
+        Returns:
+            float: 下一次检查前应等待的秒数
+        """
+        if not self.expected:
+            return self.default_interval
+        remaining = self.expected - elapsed
+        if remaining > 0:
+            # 每次只等剩余时间的四分之一，越接近预计时间越密
+            value = remaining / 4
+        else:
+            # 已超过预计时间：按超出比例逐渐放宽
+            value = self.min_interval * (1 + (-remaining) / self.expected * 4)
+        return max(self.min_interval, min(self.max_interval, value))
+
+
+_stats = None
+
+
+def get_stats():
+    """
+    Returns:
+        RunStats: 本进程共享的统计实例
+    """
+    global _stats
+    if _stats is None:
+        _stats = RunStats()
+    return _stats
@@ -0,0 +1,421 @@
+# scheduler.py
+"""
+内置定时调度模块
+作为常驻进程运行，按类cron表达式为每个提示词安排任务：
+在预定时间前提前启动并预热浏览器，到点直接发送提示词，
+停机后自动补跑错过的任务，并保证同一浏览器目录不会被两个任务同时使用
+"""
+
+import json
+import os
+import random
+import signal
+import threading
+from datetime import datetime, timedelta
+import config
+from atomic_file import locked, write_json
+from logger import get_logger
+from profile_lock import ProfileLock
+
+logger = get_logger()
+
+STATE_FILE = os.path.join(os.path.dirname(__file__), 'scheduler_state.json')
+
+
+class CronSchedule:
+    """
+    类cron时间表达式："分 时 日 月 周"
+
+    每个字段支持 *、数字、逗号列表、a-b 范围和 /n 步长。
+    周字段中 0 和 7 都表示周日。与标准cron一致，当日和周都被限定时，
+    两者满足其一即可。
+    """
+
+    _RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression):
+        """
+        Args:
+            expression (str): cron表达式，例如 "0 8 * * 1-5"
+        """
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron表达式必须包含5个字段: '{expression}'")
+        self.expression = expression
+        parsed = [self._parse_field(field, low, high) for field, (low, high) in zip(fields, self._RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {0 if d == 7 else d for d in weekdays}
+        self._day_restricted = fields[2] != '*'
+        self._weekday_restricted = fields[4] != '*'
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step_text = part.split('/', 1)
+                step = int(step_text)
+                if step <= 0:
+                    raise ValueError(f"cron步长必须为正数: '{field}'")
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start_text, end_text = part.split('-', 1)
+                start, end = int(start_text), int(end_text)
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end:
+                raise ValueError(f"cron字段超出范围 {low}-{high}: '{field}'")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day):
+        cron_weekday = (day.weekday() + 1) % 7  # Python周一为0，cron周日为0
+        day_ok = day.day in self.days
+        weekday_ok = cron_weekday in self.weekdays
+        if self._day_restricted and self._weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment):
+        """
+        Args:
+            moment (datetime): 起始时间
+
+        Returns:
+            datetime: 严格晚于 moment 的下一个触发时间
+        """
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"cron表达式在5年内没有触发时间: '{self.expression}'")
+
+    def prev_before(self, moment):
+        """
+        Args:
+            moment (datetime): 起始时间
+
+        Returns:
+            datetime: 不晚于 moment 的最近一个触发时间
+        """
+        end = moment.replace(second=0, microsecond=0)
+        day = end.replace(hour=0, minute=0)
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                for hour in sorted(self.hours, reverse=True):
+                    for minute in sorted(self.minutes, reverse=True):
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate <= end:
+                            return candidate
+            day -= timedelta(days=1)
+        raise ValueError(f"cron表达式在5年内没有触发时间: '{self.expression}'")
+
+
+def load_state():
+    """
+    读取调度状态（每个任务最近一次完成的时间槽）
+
+    Returns:
+        dict: {任务名: ISO时间字符串}
+    """
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"读取调度状态失败，将重新开始记录: {e}")
+        return {}
+
+
+_state_lock = threading.Lock()
+
+
+def save_slot(name, slot):
+    """
+    记录某个任务已完成的时间槽
+
+    Args:
+        name (str): 任务名
+        slot (datetime): 时间槽
+    """
+    with _state_lock, locked(STATE_FILE):
+        state = load_state()
+        state[name] = slot.isoformat()
+        write_json(STATE_FILE, state, ensure_ascii=False, indent=2)
+
+
+class ScheduledJob:
+    """一个按cron表达式定时执行的任务"""
+
+    def __init__(self, entry, runner=None, uses_browser=True):
+        """
+        Args:
+            entry (dict): config.SCHEDULES 中的一项，支持的键：
+                name, cron, prompt, target_chat, use_existing_chat,
+                prewarm_seconds, jitter_seconds, user_data_dir, deadline_seconds
+            runner (callable): 到点执行的函数，接收浏览器会话（不使用浏览器时为None）和本次运行的时间预算；
+                默认执行 main.run 完成一次获取并发送
+            uses_browser (bool): 任务是否需要浏览器；不需要时不预热、不占用目录锁
+        """
+        self.name = entry['name']
+        self.schedule = CronSchedule(entry['cron'])
+        self.prompt = entry.get('prompt')
+        self.target_chat = entry.get('target_chat')
+        self.use_existing_chat = entry.get('use_existing_chat', True)
+        self.prewarm_seconds = entry.get('prewarm_seconds', getattr(config, 'SCHEDULER_PREWARM_SECONDS', 120))
+        self.jitter_seconds = entry.get('jitter_seconds', getattr(config, 'SCHEDULER_JITTER_SECONDS', 0))
+        self.user_data_dir = entry.get('user_data_dir', config.USER_DATA_DIR)
+        self.deadline_seconds = entry.get('deadline_seconds', getattr(config, 'RUN_DEADLINE_SECONDS', None))
+        self.runner = runner or self._run_main
+        self.uses_browser = uses_browser
+        if not uses_browser or getattr(config, 'KIMI_ENGINE', 'browser') == 'http':
+            # HTTP接口引擎不启动浏览器，无需预热（回退到浏览器时现场启动）
+            self.prewarm_seconds = 0
+        self.thread = None
+        self.slot = None
+        self.fire_time = None
+        self.deadline = None
+
+    def plan_next(self, now):
+        """计算下一个时间槽及加入随机抖动后的实际执行时间"""
+        self.slot = self.schedule.next_after(now)
+        jitter = random.uniform(0, self.jitter_seconds) if self.jitter_seconds else 0
+        self.fire_time = self.slot + timedelta(seconds=jitter)
+        logger.info(f"任务 [{self.name}] 下次执行时间: {self.fire_time:%Y-%m-%d %H:%M:%S}")
+
+    @property
+    def wake_time(self):
+        """需要开始工作（预热浏览器）的时间"""
+        return self.fire_time - timedelta(seconds=self.prewarm_seconds)
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def cancel(self, reason):
+        """取消正在执行的运行：各步骤在下一次等待或网络请求前停止"""
+        if self.is_running() and self.deadline is not None:
+            self.deadline.cancel(reason)
+
+    def start(self, slot, fire_time, stop_event, prewarm=True):
+        """在后台线程中执行一个时间槽"""
+        self.thread = threading.Thread(
+            target=self._run_slot,
+            args=(slot, fire_time, stop_event, prewarm),
+            name=f"job-{self.name}",
+            daemon=True
+        )
+        self.thread.start()
+
+    def _run_main(self, session, deadline):
+        import main
+        main.run(
+            use_existing_chat=self.use_existing_chat,
+            prompt=self.prompt,
+            session=session,
+            target_chat_name=self.target_chat,
+            deadline=deadline,
+            job=self.name
+        )
+
+    def _finish_slot(self, slot):
+        """记录时间槽已完成；被取消的运行不记录，重启后会补跑"""
+        if self.deadline is not None and self.deadline.cancelled:
+            logger.warning(f"任务 [{self.name}] 已被取消，时间槽 {slot:%Y-%m-%d %H:%M} 留待补跑")
+            return
+        save_slot(self.name, slot)
+
+    def _start_deadline(self):
+        """到点开始执行时创建本次运行的时间预算"""
+        from deadline import Deadline
+        self.deadline = Deadline(self.deadline_seconds)
+        return self.deadline
+
+    def _run_slot(self, slot, fire_time, stop_event, prewarm):
+        if not self.uses_browser:
+            self._wait_until(fire_time, stop_event)
+            if stop_event.is_set():
+                return
+            try:
+                self.runner(None, self._start_deadline())
+                self._finish_slot(slot)
+            except Exception as e:
+                logger.error(f"任务 [{self.name}] 执行失败: {e}")
+            return
+
+        lock = ProfileLock(self.user_data_dir)
+        if lock.locked():
+            logger.warning(f"任务 [{self.name}] 的浏览器目录正被其他任务使用，排队等待...")
+        lock.acquire()
+        try:
+            from kimi_handler import KimiSession
+
+            from login_probe import breaker_for
+
+            session = None
+            if prewarm and self.prewarm_seconds and not breaker_for(KimiSession(self.user_data_dir)).allow():
+                logger.warning(f"任务 [{self.name}] 的登录处于熔断状态，不预热浏览器")
+                prewarm = False
+            if prewarm and self.prewarm_seconds:
+                try:
+                    logger.info(f"任务 [{self.name}] 预热浏览器...")
+                    session = KimiSession(self.user_data_dir).start()
+                    logger.info(f"任务 [{self.name}] 浏览器预热完成，等待到点执行")
+                except Exception as e:
+                    logger.warning(f"任务 [{self.name}] 预热浏览器失败，将在执行时重新启动: {e}")
+                    session = None
+
+            self._wait_until(fire_time, stop_event)
+            if stop_event.is_set():
+                if session is not None:
+                    session.close()
+                return
+
+            if session is None:
+                session = KimiSession(self.user_data_dir)
+
+            logger.info(f"任务 [{self.name}] 开始执行 (时间槽: {slot:%Y-%m-%d %H:%M})")
+            self.runner(session, self._start_deadline())
+            self._finish_slot(slot)
+        except Exception as e:
+            logger.error(f"任务 [{self.name}] 执行失败: {e}")
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _wait_until(moment, stop_event):
+        remaining = (moment - datetime.now()).total_seconds()
+        if remaining > 0:
+            stop_event.wait(remaining)
+
+
+def build_jobs():
+    """
+    根据配置创建全部定时任务
+
+    Returns:
+        list[ScheduledJob]: 任务列表
+    """
+    entries = getattr(config, 'SCHEDULES', None)
+    if entries is None:
+        entries = [{'name': 'default', 'cron': '0 8 * * *'}]
+    jobs = [ScheduledJob(entry) for entry in entries]
+
+    # 提前生成任务拆成两个定时任务：生成时段开始时生成，投递时间准时投递
+    import prefetch
+    for prefetch_job in prefetch.load_jobs():
+        jobs.append(ScheduledJob(
+            {'name': f"{prefetch_job.name}:prefetch", 'cron': prefetch_job.window_cron,
+             'user_data_dir': prefetch_job.user_data_dir},
+            runner=lambda session, deadline, job=prefetch_job: prefetch.generate(job, session=session,
+                                                                                 deadline=deadline)
+        ))
+        jobs.append(ScheduledJob(
+            {'name': f"{prefetch_job.name}:deliver", 'cron': prefetch_job.deliver_cron, 'jitter_seconds': 0},
+            runner=lambda session, deadline, job=prefetch_job: prefetch.deliver_due(name=job.name),
+            uses_browser=False
+        ))
+
+    # 周报/月报只读取汇总文件，不需要浏览器
+    for period, cron in (getattr(config, 'ROLLUP_SCHEDULES', None) or {}).items():
+        jobs.append(ScheduledJob(
+            {'name': f"rollup:{period}", 'cron': cron, 'jitter_seconds': 0},
+            runner=lambda session, deadline, period=period: _send_rollup(period, deadline),
+            uses_browser=False
+        ))
+    return jobs
+
+
+def _send_rollup(period, deadline):
+    import rollup
+
+    # 汇总截至昨天所在的周期：在新周期的第一天发送时，就是刚结束的上一周/上个月
+    rollup.send_digest(period, datetime.now().date() - timedelta(days=1), deadline=deadline)
+
+
+def catch_up(jobs, now, stop_event):
+    """
+    补跑停机期间错过的任务
+
+    只补跑每个任务最近一次错过的时间槽，且该时间槽距今不超过
+    SCHEDULER_CATCHUP_HOURS 小时；从未运行过的任务不补跑。
+
+    Returns:
+        list[ScheduledJob]: 已开始补跑的任务
+    """
+    state = load_state()
+    catchup_window = timedelta(hours=getattr(config, 'SCHEDULER_CATCHUP_HOURS', 6))
+    started = []
+    for job in jobs:
+        last_slot = state.get(job.name)
+        if last_slot is None:
+            save_slot(job.name, now.replace(second=0, microsecond=0))
+            continue
+        missed_slot = job.schedule.prev_before(now)
+        if missed_slot > datetime.fromisoformat(last_slot) and now - missed_slot <= catchup_window:
+            logger.warning(f"任务 [{job.name}] 错过了 {missed_slot:%Y-%m-%d %H:%M} 的执行，立即补跑")
+            job.start(missed_slot, now, stop_event, prewarm=False)
+            started.append(job)
+    return started
+
+
+def run_forever(stop_event=None):
+    """
+    调度主循环，直到收到停止信号
+
+    Args:
+        stop_event (threading.Event): 停止事件，为None时内部创建并绑定SIGINT/SIGTERM
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda signum, frame: stop_event.set())
+
+    http_port = getattr(config, 'METRICS_HTTP_PORT', None)
+    if http_port:
+        import metrics
+        metrics.start_http_server(http_port)
+
+    jobs = build_jobs()
+    if not jobs:
+        logger.error("没有配置任何定时任务（SCHEDULES / PREFETCH_JOBS），调度器退出")
+        return
+    now = datetime.now()
+    catch_up(jobs, now, stop_event)
+    for job in jobs:
+        job.plan_next(now)
+
+    logger.info(f"调度器已启动，共 {len(jobs)} 个任务")
+    while not stop_event.is_set():
+        now = datetime.now()
+        for job in jobs:
+            if now >= job.wake_time and not job.is_running():
+                job.start(job.slot, job.fire_time, stop_event)
+                job.plan_next(job.slot)
+
+        next_wake = min(job.wake_time for job in jobs)
+        sleep_seconds = min(max((next_wake - datetime.now()).total_seconds(), 0.5), 30)
+        stop_event.wait(sleep_seconds)
+
+    logger.info("调度器正在停止，取消并等待运行中的任务结束...")
+    for job in jobs:
+        job.cancel("调度器正在停止")
+    for job in jobs:
+        if job.thread is not None:
+            job.thread.join()
+    logger.info("调度器已停止")
+
+
+if __name__ == "__main__":
+    from logger import setup_logger_from_config
+    setup_logger_from_config(config)
+    run_forever()
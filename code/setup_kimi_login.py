@@ -3,11 +3,23 @@
 
 from playwright.sync_api import sync_playwright
 import config
+from profile_lock import ProfileLock
 
 def setup_kimi_login():
     """
     打开浏览器，让用户手动登录Kimi，保存登录状态以供后续自动化使用。
+    登录期间占用浏览器目录，避免定时任务或缓存清理同时使用该目录。
     """
+    lock = ProfileLock(config.USER_DATA_DIR)
+    if not lock.acquire(timeout=0):
+        print(f"浏览器目录正被其他任务使用，请稍后再试: {config.USER_DATA_DIR}")
+        return False
+    try:
+        return _setup_kimi_login()
+    finally:
+        lock.release()
+
+def _setup_kimi_login():
     with sync_playwright() as p:
         print("正在启动浏览器进行Kimi登录设置...")
         print("请在浏览器中手动登录您的Kimi账户。")
@@ -61,6 +73,9 @@ if __name__ == "__main__":
     success = setup_kimi_login()
     
     if success:
+        # 重新登录后解除之前的登录熔断，下次运行立即恢复
+        from login_probe import AuthCircuitBreaker
+        AuthCircuitBreaker(config.USER_DATA_DIR).record_success()
         print("\n✅ 设置完成！")
         print("现在您可以运行 'python main.py' 来测试自动化工具了。")
     else:
@@ -0,0 +1,260 @@
+# smtp_transport.py
+"""
+SMTP连接方式协商模块
+并发试探SSL（465）、STARTTLS（587）和25端口几种连接方式，记住每个SMTP服务器最快可用的一种，
+之后直接使用；只有用记住的方式发送失败后才重新试探，配置有误或不稳定的服务器不必每次都先失败一次
+
+登录前连接必须已经加密：25端口的服务器不支持STARTTLS时拒绝使用，
+只有设置了 config.SMTP_ALLOW_PLAINTEXT 才允许明文登录
+"""
+
+import json
+import os
+import smtplib
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import config
+from atomic_file import locked, write_json
+from logger import get_logger
+
+logger = get_logger()
+
+TRANSPORT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'smtp_transport.json')
+
+# 候选连接方式：(方式, 端口)
+# ssl      连接即加密（SMTPS）
+# starttls 明文连接后必须升级为TLS
+# plain    明文连接后升级为TLS，服务器不支持STARTTLS时只有允许明文才可用
+CANDIDATES = (('ssl', 465), ('starttls', 587), ('plain', 25))
+
+# 单个候选方式的试探超时（秒）
+PROBE_TIMEOUT = 5
+
+
+def allow_plaintext():
+    """
+    Returns:
+        bool: 是否允许在未加密的连接上登录（config.SMTP_ALLOW_PLAINTEXT，默认不允许）
+    """
+    return bool(getattr(config, 'SMTP_ALLOW_PLAINTEXT', False))
+
+
+class Transport:
+    """一种SMTP连接方式"""
+
+    def __init__(self, mode, port, seconds=None):
+        """
+        Args:
+            mode (str): "ssl"、"starttls" 或 "plain"
+            port (int): 端口
+            seconds (float): 试探时建立连接的耗时
+        """
+        self.mode = mode
+        self.port = port
+        self.seconds = seconds
+
+    @classmethod
+    def from_port(cls, port):
+        """按端口推断连接方式（与早期版本相同：465用SSL，587用STARTTLS，其余为plain）"""
+        return cls({465: 'ssl', 587: 'starttls'}.get(port, 'plain'), port)
+
+    def to_dict(self):
+        return {'mode': self.mode, 'port': self.port, 'seconds': self.seconds}
+
+    def connect(self, host, timeout=None):
+        """
+        建立连接（尚未登录）
+
+        Args:
+            host (str): SMTP服务器地址
+            timeout (float): 连接超时（秒）
+
+        Returns:
+            smtplib.SMTP: 已完成TLS协商的连接（只有允许明文时才可能未加密）
+
+        Raises:
+            smtplib.SMTPNotSupportedError: 服务器不支持STARTTLS，且不允许明文登录
+        """
+        context = ssl.create_default_context()
+        if self.mode == 'ssl':
+            return smtplib.SMTP_SSL(host, self.port, context=context, timeout=timeout)
+        server = smtplib.SMTP(host, self.port, timeout=timeout)
+        try:
+            server.ehlo()
+            if server.has_extn('starttls'):
+                server.starttls(context=context)
+                server.ehlo()
+            elif self.mode == 'starttls' or not allow_plaintext():
+                raise smtplib.SMTPNotSupportedError(f"{host}:{self.port} 不支持STARTTLS，拒绝明文登录")
+            else:
+                logger.warning(f"{host}:{self.port} 不支持STARTTLS，按 SMTP_ALLOW_PLAINTEXT 设置使用明文连接")
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def yagmail_options(self):
+        """
+        Returns:
+            dict: 传给 yagmail.SMTP 的端口和加密参数
+        """
+        return {
+            'port': self.port,
+            'smtp_ssl': self.mode == 'ssl',
+            # plain 方式不允许明文时同样要求STARTTLS
+            'smtp_starttls': self.mode == 'starttls' or (self.mode == 'plain' and not allow_plaintext()),
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, Transport) and (self.mode, self.port) == (other.mode, other.port)
+
+    def __hash__(self):
+        return hash((self.mode, self.port))
+
+    def __repr__(self):
+        return f"{self.mode}:{self.port}"
+
+
+def probe(host, transport, timeout=PROBE_TIMEOUT):
+    """
+    试探一种连接方式：建立连接并完成TLS协商后立即断开
+
+    Returns:
+        Transport: 记录了耗时的连接方式
+
+    Raises:
+        Exception: 连接失败
+    """
+    start_time = time.perf_counter()
+    server = transport.connect(host, timeout)
+    seconds = time.perf_counter() - start_time
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+    return Transport(transport.mode, transport.port, round(seconds, 3))
+
+
+def _candidates(port=None):
+    candidates = [Transport(mode, candidate_port) for mode, candidate_port in CANDIDATES]
+    if port and all(candidate.port != port for candidate in candidates):
+        candidates.append(Transport.from_port(port))
+    return candidates
+
+
+def negotiate(host, port=None, timeout=PROBE_TIMEOUT):
+    """
+    并发试探全部候选方式，返回最先完成连接的一种
+
+    Args:
+        host (str): SMTP服务器地址
+        port (int): 配置的端口，不在候选列表中时一并试探
+        timeout (float): 单个候选方式的超时（秒）
+
+    Returns:
+        Transport: 最快可用的连接方式，全部失败时为None
+    """
+    candidates = _candidates(port)
+    executor = ThreadPoolExecutor(max_workers=len(candidates))
+    futures = {executor.submit(probe, host, candidate, timeout): candidate for candidate in candidates}
+    winner = None
+    try:
+        for future in as_completed(futures):
+            try:
+                winner = future.result()
+                break
+            except Exception as e:
+                logger.debug("SMTP连接方式 %s 不可用: %s", futures[future], e)
+    finally:
+        # 不等待较慢的试探，它们会在各自的超时内结束
+        executor.shutdown(wait=False)
+    if winner is not None:
+        logger.info(f"SMTP服务器 {host} 最快的连接方式: {winner}（{winner.seconds:.2f} 秒）")
+    else:
+        logger.warning(f"SMTP服务器 {host} 的全部连接方式都无法连接")
+    return winner
+
+
+class TransportCache:
+    """每个SMTP服务器选定的连接方式，保存在JSON文件中"""
+
+    def __init__(self, path=None):
+        self.path = path or getattr(config, 'SMTP_TRANSPORT_FILE', None) or TRANSPORT_FILE
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, data):
+        try:
+            write_json(self.path, data, indent=2)
+        except OSError as e:
+            logger.debug("保存SMTP连接方式失败: %s", e)
+
+    def get(self, host):
+        """
+        Returns:
+            Transport: 记住的连接方式，没有时为None
+        """
+        entry = self._load().get(host)
+        if not entry:
+            return None
+        return Transport(entry['mode'], entry['port'], entry.get('seconds'))
+
+    def put(self, host, transport):
+        with self._lock, locked(self.path):
+            data = self._load()
+            data[host] = transport.to_dict()
+            self._save(data)
+
+    def forget(self, host):
+        with self._lock, locked(self.path):
+            data = self._load()
+            if data.pop(host, None) is not None:
+                self._save(data)
+
+
+def choose(host, port=None, renegotiate=False, cache=None, timeout=None):
+    """
+    选择连接方式：优先使用记住的方式，没有或要求重新试探时并发试探并记住结果
+
+    未启用 config.SMTP_NEGOTIATE 或试探全部失败时，按配置的端口推断连接方式。
+
+    Args:
+        host (str): SMTP服务器地址
+        port (int): 配置的端口
+        renegotiate (bool): 忽略记住的方式，重新试探
+        cache (TransportCache): 连接方式缓存，默认使用 config.SMTP_TRANSPORT_FILE
+        timeout (float): 单个候选方式的试探超时，默认为 config.SMTP_PROBE_TIMEOUT
+
+    Returns:
+        Transport: 连接方式
+    """
+    if not getattr(config, 'SMTP_NEGOTIATE', True):
+        return Transport.from_port(port)
+
+    cache = cache or TransportCache()
+    if not renegotiate:
+        transport = cache.get(host)
+        if transport is not None:
+            return transport
+
+    if timeout is None:
+        timeout = getattr(config, 'SMTP_PROBE_TIMEOUT', PROBE_TIMEOUT)
+    transport = negotiate(host, port, timeout)
+    if transport is None:
+        cache.forget(host)
+        return Transport.from_port(port)
+    cache.put(host, transport)
+    return transport
+
+
+def forget(host, cache=None):
+    """用记住的方式发送失败后调用，下次发送时重新试探"""
+    (cache or TransportCache()).forget(host)
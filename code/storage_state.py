@@ -0,0 +1,213 @@
+# storage_state.py
+"""
+登录状态文件模块
+把持久化浏览器目录中的Kimi登录状态导出为Playwright的 storage_state JSON 文件，
+之后每次运行都可以从该文件创建全新、隔离的浏览器上下文，
+多个上下文可以共享同一个浏览器并发运行，不再受限于只能被一个进程打开的用户数据目录
+"""
+
+import base64
+import glob
+import json
+import os
+import re
+import time
+import config
+from atomic_file import write_json
+from logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kimi_storage_state.json')
+
+# localStorage中保存Kimi登录令牌的键
+TOKEN_KEYS = ('access_token', 'refresh_token')
+
+_JWT_RE = re.compile(rb'(access_token|refresh_token).{0,16}?(eyJ[\w-]+\.eyJ[\w-]+\.[\w-]+)', re.DOTALL)
+
+
+def state_file_path():
+    """
+    Returns:
+        str: 配置的登录状态文件路径
+    """
+    return getattr(config, 'STORAGE_STATE_FILE', None) or DEFAULT_STATE_FILE
+
+
+def export_storage_state(user_data_dir=None, path=None, headless=True):
+    """
+    打开持久化浏览器目录，导出其中的登录状态
+
+    Args:
+        user_data_dir (str): 用户数据目录，默认为 config.USER_DATA_DIR
+        path (str): 导出文件路径，默认为 state_file_path()
+        headless (bool): 是否使用无头模式
+
+    Returns:
+        str: 导出文件路径
+    """
+    from playwright.sync_api import sync_playwright
+    from kimi_handler import KIMI_URL
+
+    user_data_dir = user_data_dir or config.USER_DATA_DIR
+    path = path or state_file_path()
+    logger.info(f"从浏览器目录导出登录状态: {user_data_dir}")
+
+    with sync_playwright() as p:
+        context = p.chromium.launch_persistent_context(
+            user_data_dir=user_data_dir,
+            headless=headless,
+            args=['--no-sandbox']
+        )
+        try:
+            page = context.new_page()
+            # 打开页面让网站有机会刷新令牌，再导出最新的状态
+            page.goto(KIMI_URL, timeout=60000)
+            page.wait_for_load_state('domcontentloaded', timeout=20000)
+            page.wait_for_timeout(3000)
+            state = context.storage_state()
+        finally:
+            context.close()
+
+    _write_state(state, path)
+    logger.info(f"登录状态已导出: {path} ({len(state.get('cookies', []))} 个cookie)")
+    return path
+
+
+def _write_state(state, path):
+    # 文件中包含登录凭据，只允许本人读取
+    write_json(path, state, mode=0o600, ensure_ascii=False)
+
+
+def load_storage_state(path=None):
+    """
+    Returns:
+        dict: storage_state 内容，文件不存在时返回None
+    """
+    path = path or state_file_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def decode_jwt_expiry(token):
+    """
+    读取JWT令牌的过期时间（不校验签名）
+
+    Returns:
+        float: 过期时间的Unix时间戳，无法解析时返回None
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except Exception:
+        return None
+
+
+def find_tokens(state):
+    """
+    从storage_state的localStorage中找出Kimi的登录令牌
+
+    Returns:
+        dict: {键名: 令牌}
+    """
+    tokens = {}
+    for origin in state.get('origins', []):
+        for item in origin.get('localStorage', []):
+            if item.get('name') in TOKEN_KEYS and item.get('value'):
+                tokens[item['name']] = item['value']
+    return tokens
+
+
+def profile_tokens(user_data_dir):
+    """
+    从浏览器目录的localStorage（LevelDB）中找出最新的登录令牌
+
+    LevelDB文件是追加写入的，同一个键后出现的值更新，按修改时间顺序扫描即可。
+
+    Returns:
+        dict: {键名: 令牌}
+    """
+    tokens = {}
+    pattern = os.path.join(user_data_dir, 'Default', 'Local Storage', 'leveldb', '*')
+    files = [path for path in glob.glob(pattern) if path.endswith(('.log', '.ldb'))]
+    for path in sorted(files, key=os.path.getmtime):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        for match in _JWT_RE.finditer(data):
+            tokens[match.group(1).decode()] = match.group(2).decode()
+    return tokens
+
+
+def update_tokens(tokens, path=None):
+    """
+    把刷新后的登录令牌写回登录状态文件（只替换已存在的键）
+
+    Args:
+        tokens (dict): {键名: 新令牌}
+        path (str): 登录状态文件路径
+    """
+    path = path or state_file_path()
+    state = load_storage_state(path)
+    if state is None:
+        return
+    for origin in state.get('origins', []):
+        for item in origin.get('localStorage', []):
+            if item.get('name') in tokens and tokens[item['name']]:
+                item['value'] = tokens[item['name']]
+    _write_state(state, path)
+
+
+def check_storage_state(path=None, min_valid_hours=0):
+    """
+    检查登录状态文件是否存在以及是否已过期
+
+    以 refresh_token 的过期时间为准（access_token 会由网站自动刷新）；
+    没有令牌时退而检查会话cookie的过期时间。
+
+    Args:
+        path (str): 登录状态文件路径
+        min_valid_hours (float): 要求至少还剩多少小时有效
+
+    Returns:
+        dict: {'ok': bool, 'expires_at': float或None, 'reason': str}
+    """
+    path = path or state_file_path()
+    state = load_storage_state(path)
+    if state is None:
+        return {'ok': False, 'expires_at': None, 'reason': f"登录状态文件不存在: {path}"}
+
+    now = time.time()
+    tokens = find_tokens(state)
+    expires_at = None
+    for key in ('refresh_token', 'access_token'):
+        if key in tokens:
+            expires_at = decode_jwt_expiry(tokens[key])
+            if expires_at is not None:
+                break
+
+    if expires_at is None:
+        cookie_expiries = [
+            cookie['expires'] for cookie in state.get('cookies', [])
+            if 'moonshot' in cookie.get('domain', '') or 'kimi' in cookie.get('domain', '')
+            if cookie.get('expires', -1) > 0
+        ]
+        if cookie_expiries:
+            expires_at = min(cookie_expiries)
+
+    if expires_at is None:
+        if tokens:
+            return {'ok': True, 'expires_at': None, 'reason': "找到了登录令牌，但无法判断过期时间"}
+        return {'ok': False, 'expires_at': None, 'reason': "登录状态文件中没有找到Kimi的登录令牌或cookie"}
+
+    remaining_hours = (expires_at - now) / 3600
+    if remaining_hours <= min_valid_hours:
+        reason = "登录状态已过期" if remaining_hours <= 0 else f"登录状态将在 {remaining_hours:.1f} 小时后过期"
+        return {'ok': False, 'expires_at': expires_at, 'reason': reason}
+    return {'ok': True, 'expires_at': expires_at, 'reason': f"登录状态有效，剩余 {remaining_hours:.1f} 小时"}
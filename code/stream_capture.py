@@ -0,0 +1,369 @@
+# stream_capture.py
+"""
+网络层回复捕获模块
+监听页面对Kimi流式对话接口的请求，直接从接口返回的数据流中拼出回复内容，
+并以数据流结束作为生成完成的信号，不再依赖页面DOM结构和发送按钮SVG的变化
+"""
+
+import json
+import re
+import time
+import config
+import metrics
+from logger import get_logger
+from run_stats import get_stats
+
+logger = get_logger()
+
+# Kimi网页版的流式对话接口（Server-Sent Events）
+DEFAULT_STREAM_URL_PATTERN = r'/api/chat/[^/]+/completion/stream'
+
+# 注入页面的脚本：包装 window.fetch，把匹配接口的响应复制一份，
+# 边接收边通过 __kimiStreamChunk 回传给Python，不影响页面自身的读取
+_TAP_SCRIPT = """
+(pattern) => {
+    if (window.__kimiStreamTap) return;
+    window.__kimiStreamTap = true;
+    const matcher = new RegExp(pattern);
+    const originalFetch = window.fetch;
+    let sequence = 0;
+    window.fetch = async function (...args) {
+        const response = await originalFetch.apply(this, args);
+        try {
+            const input = args[0];
+            const url = typeof input === 'string' ? input : (input && input.url) || '';
+            if (matcher.test(url) && response.body && window.__kimiStreamChunk) {
+                const streamId = ++sequence;
+                const reader = response.clone().body.getReader();
+                const decoder = new TextDecoder();
+                (async () => {
+                    try {
+                        while (true) {
+                            const { done, value } = await reader.read();
+                            if (done) break;
+                            window.__kimiStreamChunk(streamId, decoder.decode(value, { stream: true }), false, null);
+                        }
+                        window.__kimiStreamChunk(streamId, decoder.decode(), true, null);
+                    } catch (e) {
+                        window.__kimiStreamChunk(streamId, '', true, String(e));
+                    }
+                })();
+            }
+        } catch (e) {}
+        return response;
+    };
+}
+"""
+
+
+_CITATION_RE = re.compile(r'\[\^\d+\^\]')
+_LINK_RE = re.compile(r'\[([^\]]+)\]\((?:https?://)[^)]*\)')
+_HEADING_RE = re.compile(r'^#{1,6}\s+', re.MULTILINE)
+
+
+def plain_text(markdown):
+    """
+    把数据流中的Markdown原文转成与页面显示一致的纯文本
+
+    去掉引用角标 [^1^]、加粗标记、标题井号，链接只保留文字。
+
+    Args:
+        markdown (str): 数据流拼出的原文
+
+    Returns:
+        str: 纯文本
+    """
+    text = _CITATION_RE.sub('', markdown)
+    text = _LINK_RE.sub(r'\1', text)
+    text = _HEADING_RE.sub('', text)
+    text = text.replace('**', '')
+    return text.strip()
+
+
+class KimiStreamParser:
+    """
+    增量解析Kimi的SSE数据流
+
+    数据流由 "data: {json}" 行组成，event 为 cmpl 的事件携带新增文本，
+    all_done 表示回复结束，error 表示生成出错。数据块可能在任意位置被截断，
+    未完整的行会保留到下一次 feed。
+    """
+
+    def __init__(self):
+        self.text_parts = []
+        self.done = False
+        self.error = None
+        self.events = 0
+        self._buffer = ""
+
+    @property
+    def text(self):
+        return ''.join(self.text_parts)
+
+    def feed(self, chunk):
+        """
+        解析一段数据
+
+        Args:
+            chunk (str): 新收到的数据
+
+        Returns:
+            int: 本次解析出的事件数量
+        """
+        self._buffer += chunk
+        lines = self._buffer.split('\n')
+        self._buffer = lines.pop()
+        count = 0
+        for line in lines:
+            if self._handle_line(line):
+                count += 1
+        return count
+
+    def close(self):
+        """数据流结束：处理缓冲区中剩余的最后一行"""
+        if self._buffer:
+            self._handle_line(self._buffer)
+            self._buffer = ""
+
+    def _handle_line(self, line):
+        line = line.strip()
+        if not line.startswith('data:'):
+            return False
+        try:
+            event = json.loads(line[5:].strip())
+        except ValueError:
+            return False
+        if not isinstance(event, dict):
+            return False
+
+        self.events += 1
+        event_type = event.get('event')
+        if event_type == 'cmpl':
+            self.text_parts.append(event.get('text', ''))
+        elif event_type == 'all_done':
+            self.done = True
+        elif event_type == 'error':
+            self.error = event.get('error_type') or event.get('message') or json.dumps(event, ensure_ascii=False)
+            self.done = True
+        return True
+
+
+class StreamCapture:
+    """
+    在页面上捕获Kimi流式对话接口的数据
+
+    install 之后，每次发送前调用 reset，之后页面发起的最新一个流式请求会被逐块解析。
+    同时监听 response/requestfinished 事件：如果页面没有通过 fetch 读取数据流，
+    就在请求结束后从完整的响应体中解析。
+    """
+
+    def __init__(self, page, url_pattern=None):
+        self.page = page
+        self.url_pattern = url_pattern or getattr(config, 'KIMI_STREAM_URL_PATTERN', DEFAULT_STREAM_URL_PATTERN)
+        self._matcher = re.compile(self.url_pattern)
+        self._installed = False
+        self.reset()
+
+    def install(self):
+        """
+        注入数据流监听脚本并注册网络事件
+
+        Returns:
+            StreamCapture: 自身，便于链式调用
+        """
+        if self._installed:
+            return self
+        self.page.expose_function('__kimiStreamChunk', self._on_chunk)
+        script = f"({_TAP_SCRIPT})({json.dumps(self.url_pattern)})"
+        self.page.add_init_script(script)  # 之后的页面跳转同样生效
+        self.page.evaluate(script)         # 当前已加载的页面立即生效
+        self.page.on('response', self._on_response)
+        self.page.on('requestfinished', self._on_request_finished)
+        self._installed = True
+        logger.debug("已开始监听Kimi流式接口: %s", self.url_pattern)
+        return self
+
+    def reset(self):
+        """清空上一次的捕获结果（每次发送提示词前调用）"""
+        self.parser = KimiStreamParser()
+        self.stream_id = None
+        self.seen = False              # 是否观察到流式请求的响应
+        self.finished = False          # 数据流是否已结束
+        self.started_at = time.time()
+        self.first_chunk_at = None
+        self._finished_request = None
+
+    @property
+    def text(self):
+        return self.parser.text
+
+    @property
+    def done(self):
+        return self.finished or self.parser.done
+
+    @property
+    def error(self):
+        return self.parser.error
+
+    def _on_chunk(self, stream_id, chunk, final, error):
+        if stream_id != self.stream_id:
+            # 页面发起了新的流式请求，以最新的一个为准
+            self.stream_id = stream_id
+            self.parser = KimiStreamParser()
+            logger.debug("开始接收数据流 #%s", stream_id)
+        self.seen = True
+        if chunk:
+            if self.first_chunk_at is None:
+                self.first_chunk_at = time.time()
+                logger.info(f"收到回复的第一段数据 (耗时: {self.first_chunk_at - self.started_at:.1f}秒)")
+            self.parser.feed(chunk)
+        if final:
+            self.parser.close()
+            self.finished = True
+            if error:
+                logger.warning(f"读取数据流时出错: {error}")
+                self.parser.error = self.parser.error or error
+
+    def _on_response(self, response):
+        if self._matcher.search(response.url):
+            self.seen = True
+            logger.debug("观察到流式接口响应: %s (%s)", response.url, response.status)
+
+    def _on_request_finished(self, request):
+        if self._matcher.search(request.url):
+            self._finished_request = request
+
+    def poll(self):
+        """
+        处理页面事件并检查数据流是否结束
+
+        Returns:
+            bool: 数据流是否已结束
+        """
+        # 同步API只在调用Playwright方法时派发页面事件，这里主动让出一次
+        self.page.wait_for_timeout(10)
+        if not self.done and self._finished_request is not None and self.stream_id is None:
+            # 页面没有通过fetch读取数据流，从完整响应体中解析
+            request, self._finished_request = self._finished_request, None
+            try:
+                self.parser.feed(request.response().body().decode('utf-8', errors='replace'))
+                self.parser.close()
+                self.finished = True
+                logger.debug("从完整响应体中解析出回复 (%s 个事件)", self.parser.events)
+            except Exception as e:
+                logger.debug("读取流式接口响应体失败: %s", e)
+        return self.done
+
+
+class StreamMonitor:
+    """
+    以数据流结束作为生成完成信号的监测器，与 GenerationMonitor 接口相同
+
+    如果在 first_chunk_timeout 秒内没有观察到流式请求（例如接口地址变化），
+    回退到原有的DOM监测器判断完成状态。运行预算沿用DOM监测器的 deadline。
+    """
+
+    def __init__(self, capture, fallback, first_chunk_timeout=None):
+        """
+        Args:
+            capture (StreamCapture): 已 reset 的捕获器
+            fallback (GenerationMonitor): 原有的DOM监测器，同时提供最长等待时间
+            first_chunk_timeout (float): 等待流式请求出现的最长秒数
+        """
+        self.capture = capture
+        self.fallback = fallback
+        if first_chunk_timeout is None:
+            first_chunk_timeout = getattr(config, 'STREAM_FIRST_CHUNK_TIMEOUT', 30)
+        self.first_chunk_timeout = first_chunk_timeout
+        self.start_time = time.time()
+        self.completed = False
+        self._fell_back = False
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def next_interval(self):
+        """
+        Returns:
+            float: 距下一次 poll 应等待的秒数
+        """
+        return self.fallback.next_interval()
+
+    @property
+    def captured_text(self):
+        """数据流中拼出的回复，未完整捕获时为空字符串"""
+        if self.completed and not self.capture.error:
+            return plain_text(self.capture.text)
+        return ""
+
+    @property
+    def partial_text(self):
+        """生成过程中已从数据流收到的内容，用于暂存已写完的段落；已回退到页面监测或数据流出错时为空字符串"""
+        if self._fell_back or self.capture.error:
+            return ""
+        return plain_text(self.capture.text)
+
+    def poll(self):
+        """
+        检查一次生成状态
+
+        Returns:
+            bool: 是否已结束等待（生成完成或超时）
+
+        Raises:
+            DeadlineExceeded: 运行预算已用完或已被取消
+        """
+        if self._fell_back:
+            return self.fallback.poll()
+
+        self.fallback.deadline.check("等待Kimi生成")
+
+        if self.capture.poll():
+            if self.capture.error:
+                logger.warning(f"Kimi数据流返回错误: {self.capture.error}")
+            else:
+                logger.info(f"数据流结束，Kimi回复生成完成 (总耗时: {self.elapsed:.1f}秒)")
+            self.completed = True
+            return True
+
+        if not self.capture.seen and self.elapsed >= self.first_chunk_timeout:
+            logger.warning(f"{self.first_chunk_timeout}秒内未观察到流式接口请求，改用页面监测判断生成状态")
+            self._fell_back = True
+            return self.fallback.poll()
+
+        if self.elapsed >= self.fallback.hard_limit:
+            logger.warning(f"等待{self.fallback.hard_limit}秒后数据流仍未结束，使用已收到的内容")
+            return True
+        return False
+
+    def finish(self):
+        """结束等待：记录生成耗时"""
+        if self._fell_back:
+            self.fallback.finish()
+            return
+        if not self.fallback.record_stats:
+            return
+        metrics.GENERATION_SECONDS.observe(self.elapsed)
+        if self.completed and not self.capture.error:
+            stats = get_stats()
+            stats.record('generation', self.elapsed)
+            if self.capture.first_chunk_at is not None:
+                stats.record('generation_start', self.capture.first_chunk_at - self.start_time)
+
+    def wait(self, check_interval=None, on_poll=None):
+        """
+        阻塞等待直到数据流结束或超时
+
+        Args:
+            check_interval (float): 固定的检查间隔（秒），为None时按历史耗时自适应
+            on_poll (callable): 每次检查后调用（生成尚未完成时），用于暂存已生成的内容
+        """
+        logger.debug("开始监听数据流，最长等待%.0f秒...", self.fallback.hard_limit)
+        while not self.poll():
+            if on_poll is not None:
+                on_poll()
+            # 使用页面等待而不是time.sleep，等待期间页面事件才会被派发
+            interval = min(check_interval or self.next_interval(), self.fallback.deadline.remaining())
+            self.capture.page.wait_for_timeout(interval * 1000)
+        self.finish()
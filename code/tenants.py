@@ -0,0 +1,274 @@
+# tenants.py
+"""
+多租户运行模块
+按租户清单为多个Kimi账号并行执行任务：每个租户有独立的浏览器目录、提示词、
+目标会话和收件人。租户在进程池中运行，每个worker同一时刻只运行一个浏览器，
+单个租户的失败不会影响其他租户，日志按租户分文件记录，最后汇总成运行报告
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import config
+import metrics
+from logger import get_logger, reset_logger, setup_logger_from_config
+
+logger = get_logger()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DIR = os.path.join(BASE_DIR, 'reports')
+
+# 各租户的周报/月报汇总和网页归档默认放在 tenant_data/<租户名称>/ 下，与本机所有者的数据分开
+TENANT_DATA_DIR = os.path.join(BASE_DIR, 'tenant_data')
+
+
+def _resolve_path(path, manifest_dir):
+    if os.path.isabs(path):
+        return path
+    return os.path.join(manifest_dir, path)
+
+
+def load_manifest(path=None):
+    """
+    读取租户清单
+
+    清单为JSON文件，格式如下（相对路径相对于清单文件所在目录）：
+        {"tenants": [
+            {"name": "alice", "user_data_dir": "profiles/alice",
+             "prompt_file": "prompts/alice.txt", "target_chat": "每日推送",
+             "recipients": ["alice@example.com"]}
+        ]}
+    每个租户必须有 name、user_data_dir 和 recipients；
+    prompt / prompt_file 缺省时使用 config.KIMI_PROMPT。
+    可选 storage_state：登录状态文件路径，配置后该租户使用隔离的临时上下文运行，不再打开浏览器目录。
+    可选 rollup_dir / archive_dir：该租户的周报/月报汇总目录和网页归档目录，
+    默认为 tenant_data/<name>/rollups 和 tenant_data/<name>/web_archive；可选 archive_url：网页归档的网址。
+
+    Args:
+        path (str): 清单路径，默认为 config.TENANT_MANIFEST
+
+    Returns:
+        list[dict]: 规范化后的租户列表
+    """
+    path = path or getattr(config, 'TENANT_MANIFEST', os.path.join(BASE_DIR, 'tenants.json'))
+    manifest_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    tenants = []
+    seen = set()
+    for entry in manifest.get('tenants', []):
+        name = entry['name']
+        if name in seen:
+            raise ValueError(f"租户名称重复: {name}")
+        seen.add(name)
+
+        prompt = entry.get('prompt')
+        if not prompt and entry.get('prompt_file'):
+            with open(_resolve_path(entry['prompt_file'], manifest_dir), 'r', encoding='utf-8') as f:
+                prompt = f.read()
+
+        recipients = entry['recipients']
+        if isinstance(recipients, str):
+            recipients = [recipients]
+
+        tenants.append({
+            'name': name,
+            'user_data_dir': _resolve_path(entry['user_data_dir'], manifest_dir),
+            'storage_state': _resolve_path(entry['storage_state'], manifest_dir) if entry.get('storage_state') else None,
+            'prompt': prompt or config.KIMI_PROMPT,
+            'target_chat': entry.get('target_chat'),
+            'use_existing_chat': entry.get('use_existing_chat', True),
+            'recipients': recipients,
+            'rollup_dir': _resolve_path(entry.get('rollup_dir') or os.path.join(TENANT_DATA_DIR, name, 'rollups'),
+                                        manifest_dir),
+            'archive_dir': _resolve_path(entry.get('archive_dir') or os.path.join(TENANT_DATA_DIR, name, 'web_archive'),
+                                         manifest_dir),
+            'archive_url': entry.get('archive_url', ''),
+        })
+    return tenants
+
+
+def run_tenant(tenant):
+    """
+    在worker进程中执行单个租户的任务
+
+    Args:
+        tenant (dict): load_manifest 返回的租户项
+
+    Returns:
+        dict: 该租户的运行结果
+    """
+    # 每个租户写入独立的日志文件
+    reset_logger()
+    setup_logger_from_config(config, log_file_prefix=f"tenant_{tenant['name']}")
+    # 租户的话题写入租户自己的周报/月报汇总和网页归档，不混入本机所有者的数据（worker进程只运行租户任务）
+    config.ROLLUP_DIR = tenant['rollup_dir']
+    config.ARCHIVE_DIR = tenant['archive_dir']
+    config.ARCHIVE_BASE_URL = tenant['archive_url']
+
+    from profile_lock import ProfileLock
+    from deadline import Deadline
+    from kimi_handler import KimiSession
+    import main
+
+    report = {
+        'name': tenant['name'],
+        'result': 'error',
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'duration_seconds': 0.0,
+        'error': None,
+    }
+    start_time = time.perf_counter()
+    # 使用登录状态文件时不会打开浏览器目录，无需加锁
+    lock = None if tenant.get('storage_state') else ProfileLock(tenant['user_data_dir'])
+    if lock is not None and not lock.acquire(timeout=getattr(config, 'TENANT_LOCK_TIMEOUT', 0)):
+        report['result'] = 'profile_busy'
+        report['error'] = f"浏览器目录正被其他进程使用: {tenant['user_data_dir']}"
+        logger.error(report['error'])
+        return report
+
+    try:
+        logger.info(f"租户 [{tenant['name']}] 开始执行")
+        session = KimiSession(tenant['user_data_dir'], headless=getattr(config, 'TENANT_HEADLESS', True),
+                              storage_state=tenant.get('storage_state'))
+        report['result'] = main.run_once(
+            use_existing_chat=tenant['use_existing_chat'],
+            prompt=tenant['prompt'],
+            session=session,
+            target_chat_name=tenant['target_chat'],
+            receivers=tenant['recipients'],
+            deadline=Deadline.from_config()
+        )
+    except Exception as e:
+        report['error'] = f"{type(e).__name__}: {e}"
+        logger.error(f"租户 [{tenant['name']}] 执行失败: {report['error']}")
+    finally:
+        if lock is not None:
+            lock.release()
+        report['duration_seconds'] = round(time.perf_counter() - start_time, 1)
+        logger.info(f"租户 [{tenant['name']}] 执行结束: {report['result']} (耗时 {report['duration_seconds']} 秒)")
+    return report
+
+
+def run_all(tenants, max_workers=None):
+    """
+    在进程池中并行执行全部租户
+
+    Args:
+        tenants (list[dict]): 租户列表
+        max_workers (int): 最大并行worker数，默认为 config.TENANT_MAX_WORKERS
+
+    Returns:
+        dict: 汇总运行报告
+    """
+    max_workers = max(1, min(max_workers or getattr(config, 'TENANT_MAX_WORKERS', 4), len(tenants) or 1))
+    logger.info(f"开始多租户运行：{len(tenants)} 个租户，{max_workers} 个worker")
+
+    start_time = time.perf_counter()
+    results = []
+    # 统一使用spawn，避免fork继承浏览器/日志线程状态，且与Windows行为一致
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        futures = {executor.submit(run_tenant, tenant): tenant for tenant in tenants}
+        for future in as_completed(futures):
+            tenant = futures[future]
+            try:
+                report = future.result()
+            except BrokenProcessPool as e:
+                report = {'name': tenant['name'], 'result': 'worker_crashed', 'error': str(e)}
+            except Exception as e:
+                report = {'name': tenant['name'], 'result': 'error', 'error': f"{type(e).__name__}: {e}"}
+            results.append(report)
+            metrics.RUNS.inc(result=report['result'])
+            if report['result'] != 'success':
+                metrics.FAILURES.inc(type=f"tenant_{report['result']}")
+            logger.info(f"[{len(results)}/{len(tenants)}] 租户 [{report['name']}]: {report['result']}")
+
+    summary = {}
+    for report in results:
+        summary[report['result']] = summary.get(report['result'], 0) + 1
+
+    run_report = {
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'duration_seconds': round(time.perf_counter() - start_time, 1),
+        'workers': max_workers,
+        'summary': summary,
+        'tenants': sorted(results, key=lambda r: r['name']),
+    }
+    metrics.LAST_RUN_TIMESTAMP.set(time.time(), result='tenants')
+    metrics.export(config)
+    return run_report
+
+
+def send_digests(tenants, period, day=None):
+    """
+    把各租户自己的周报或月报发给该租户的收件人
+
+    Args:
+        tenants (list[dict]): 租户列表
+        period (str): "week" 或 "month"
+        day (date): 周期内的任意一天，默认为今天
+
+    Returns:
+        dict: {租户名称: 是否发送成功}
+    """
+    import rollup
+
+    results = {}
+    for tenant in tenants:
+        try:
+            results[tenant['name']] = rollup.send_digest(period, day, tenant['recipients'],
+                                                         store=rollup.RollupStore(tenant['rollup_dir']))
+        except Exception as e:
+            logger.error(f"租户 [{tenant['name']}] 的{rollup.PERIOD_NAMES[period]}报发送失败: {e}")
+            results[tenant['name']] = False
+    return results
+
+
+def write_report(run_report):
+    """
+    把汇总报告写入 reports 目录
+
+    Returns:
+        str: 报告文件路径
+    """
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    path = os.path.join(REPORT_DIR, f"tenants_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run_report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+if __name__ == "__main__":
+    setup_logger_from_config(config)
+
+    parser = argparse.ArgumentParser(description="多租户并行运行")
+    parser.add_argument("--manifest", help="租户清单路径（默认 config.TENANT_MANIFEST）")
+    parser.add_argument("--workers", type=int, help="最大并行worker数")
+    parser.add_argument("--only", nargs="+", help="只运行指定名称的租户")
+    parser.add_argument("--digest", choices=["week", "month"], help="不运行任务，发送各租户的周报/月报")
+    parser.add_argument("--last", action="store_true", help="与 --digest 一起使用：上一周/上个月")
+    args = parser.parse_args()
+
+    all_tenants = load_manifest(args.manifest)
+    if args.only:
+        all_tenants = [t for t in all_tenants if t['name'] in args.only]
+
+    if args.digest:
+        import sys
+        from rollup import period_day
+        digest_results = send_digests(all_tenants, args.digest, period_day(args.digest, args.last))
+        logger.info(f"租户周报/月报发送完成: {digest_results}")
+        sys.exit(0 if all(digest_results.values()) else 1)
+
+    metrics.reset()
+    final_report = run_all(all_tenants, args.workers)
+    report_path = write_report(final_report)
+    logger.info(f"多租户运行完成 (耗时 {final_report['duration_seconds']} 秒): {final_report['summary']}")
+    logger.info(f"运行报告: {report_path}")
@@ -0,0 +1,33 @@
+# conftest.py
+"""
+测试公共设置：把 code 目录加入导入路径；没有 config.py 时用 config.py.template 作为配置，
+关闭日志文件，测试之间不互相影响
+"""
+
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+import pytest
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+
+try:
+    import config
+except ImportError:
+    template = os.path.join(CODE_DIR, 'config.py.template')
+    spec = importlib.util.spec_from_loader('config', importlib.machinery.SourceFileLoader('config', template))
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    sys.modules['config'] = config
+
+config.LOG_TO_FILE = False
+config.LOG_LEVEL = 'WARNING'
+
+
+@pytest.fixture
+def config_module(monkeypatch):
+    """配置模块，测试中用 monkeypatch.setattr 修改的配置在测试结束后恢复"""
+    return config
@@ -0,0 +1,70 @@
+# test_atomic_file.py
+"""状态文件：原子写入，多个进程同时读改写不丢失修改"""
+
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from atomic_file import locked, write_json
+from run_stats import RunStats
+
+
+def _record_samples(path, count):
+    stats = RunStats(path, max_samples=1000)
+    for index in range(count):
+        stats.record('generation', index)
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="需要fork")
+def test_concurrent_processes_keep_all_samples(tmp_path):
+    path = str(tmp_path / 'run_stats.json')
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_record_samples, args=(path, 25)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert len(RunStats(path, max_samples=1000).samples('generation')) == 100
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
+
+
+def test_failed_write_keeps_original(tmp_path):
+    path = str(tmp_path / 'state.json')
+    write_json(path, {'a': 1})
+    with pytest.raises(TypeError):
+        write_json(path, {'a': object()})
+
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == {'a': 1}
+    assert os.listdir(tmp_path) == ['state.json']
+
+
+def test_write_json_mode(tmp_path):
+    path = str(tmp_path / 'secret.json')
+    write_json(path, {}, mode=0o600)
+    if os.name != 'nt':
+        assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_locked_times_out_when_held(tmp_path):
+    path = str(tmp_path / 'state.json')
+    with locked(path):
+        # 同一进程内另一个任务等待超时
+        errors = []
+
+        def wait():
+            try:
+                with locked(path, timeout=0.1):
+                    pass
+            except TimeoutError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        thread.join()
+    assert len(errors) == 1
@@ -0,0 +1,99 @@
+# test_delivery.py
+"""邮件交付：发送失败时不写入汇总和网页归档，送达时间在发送完成后立即记录"""
+
+import time
+
+import pytest
+
+import mailer
+import main
+import prompt_catalog
+import rollup
+import web_archive
+from deadline import ensure as ensure_deadline
+from delivery import EarlyDelivery
+
+REPLY = "① 问题：测试话题（科技）\n• 回答：\n内容。"
+
+
+@pytest.fixture
+def outputs(monkeypatch):
+    """记录汇总和归档调用；send_email 的返回值由 outputs['sent'] 决定"""
+    calls = {'sent': True, 'mail': [], 'content': [], 'rollup': [], 'archive': []}
+
+    def send_email(subject, content, receivers=None, deadline=None, text=None):
+        calls['mail'].append(subject)
+        calls['content'].append(content)
+        return calls['sent']
+
+    monkeypatch.setattr(mailer, 'send_email', send_email)
+    monkeypatch.setattr(rollup, 'record', lambda *args, **kwargs: calls['rollup'].append(args))
+    monkeypatch.setattr(rollup, 'record_sections', lambda *args, **kwargs: calls['rollup'].append(args))
+    monkeypatch.setattr(web_archive, 'publish', lambda *args, **kwargs: calls['archive'].append(args))
+    return calls
+
+
+def _run_main(response, rendered=None):
+    deadline = ensure_deadline(None)
+    delivery = EarlyDelivery(lambda reply, html: main._deliver(reply, None, deadline, deadline,
+                                                               on_sent=delivery.mark_sent, rendered=html))
+    if rendered is not None:
+        delivery.start(response, rendered)
+    return delivery, delivery.finish(response)
+
+
+def test_send_failure_skips_rollup_and_archive(outputs):
+    outputs['sent'] = False
+    delivery, result = _run_main(REPLY)
+
+    assert result == "mail_failed"
+    assert len(outputs['mail']) == 1
+    assert outputs['rollup'] == [] and outputs['archive'] == []
+    assert delivery.delivered_at is None
+
+
+def test_success_records_outputs(outputs):
+    delivery, result = _run_main(REPLY)
+
+    assert result == "success"
+    assert len(outputs['rollup']) == 1 and len(outputs['archive']) == 1
+    assert delivery.delivered_at is not None
+
+
+def test_digest_send_failure(outputs):
+    outputs['sent'] = False
+    catalog = [{'name': '科技'}, {'name': '财经'}]
+    result = prompt_catalog._deliver_digest(catalog, {'科技': REPLY, '财经': None}, None, ensure_deadline(None))
+
+    assert result == "mail_failed"
+    assert outputs['rollup'] == [] and outputs['archive'] == []
+
+
+def test_delivered_at_stamped_before_archive(outputs, monkeypatch):
+    stamps = {}
+
+    def slow_publish(*args, **kwargs):
+        stamps['archive'] = time.time()
+        time.sleep(0.05)
+
+    monkeypatch.setattr(web_archive, 'publish', slow_publish)
+    delivery, result = _run_main(REPLY)
+
+    assert result == "success"
+    assert delivery.delivered_at <= stamps['archive']
+
+
+def test_prerendered_html_is_sent(outputs):
+    delivery, result = _run_main(REPLY, '<div class="qa-item">已格式化</div>')
+
+    assert result == "success"
+    assert '已格式化' in outputs['content'][0]
+
+
+def test_digest_uses_prerendered_sections(outputs):
+    catalog = [{'name': '科技'}, {'name': '财经'}]
+    prompt_catalog._deliver_digest(catalog, {'科技': REPLY, '财经': REPLY}, None, ensure_deadline(None),
+                                   rendered={'科技': '<p>科技已格式化</p>'})
+
+    assert '科技已格式化' in outputs['content'][0]
+    assert outputs['content'][0].count('测试话题') == 1
@@ -0,0 +1,192 @@
+# test_kimi_api.py
+"""HTTP接口引擎：对本地替身服务器验证会话查找、流式回复、连接复用和各种错误"""
+
+import http.client
+
+import pytest
+
+import kimi_api
+from kimi_api import ConnectionPool, KimiApiClient, KimiApiError, KimiAuthError, KimiReplyError
+from mock_kimi_server import SAMPLE_REPLY, MockKimiState, start_in_thread
+
+
+@pytest.fixture
+def mock_kimi():
+    """启动替身服务器，返回 (服务器, 会话数据)；用 mock_kimi.state 修改服务器行为"""
+    servers = []
+
+    def start(**options):
+        state = MockKimiState(chunk_delay=0, token='access-ok', refresh_token='refresh-ok', **options)
+        server = start_in_thread(state=state)
+        servers.append(server)
+        return server, state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_find_chat_and_stream_reply(mock_kimi):
+    server, state = mock_kimi()
+    client = KimiApiClient('access-ok', base_url=server.base_url)
+
+    assert client.find_chat('EMAIL_return')['id'] == 'chat-default'
+    assert client.ask("测试", target_chat_name='email_return') == SAMPLE_REPLY.strip()
+    client.ask("测试", target_chat_name='不存在的会话')
+    assert state.chats[0]['name'] == '不存在的会话'
+    assert client.last_chat_id == state.chats[0]['id']
+
+
+def test_pool_reuses_connection(mock_kimi):
+    server, state = mock_kimi()
+    client = KimiApiClient('access-ok', base_url=server.base_url)
+    for _ in range(3):
+        client.list_chats()
+    client.ask("测试", target_chat_name='email_return')
+
+    assert state.connections == 1
+
+
+def test_pool_reconnects_after_server_drops_idle_connection(mock_kimi):
+    server, state = mock_kimi(drop_connections=True)
+    client = KimiApiClient('access-ok', base_url=server.base_url)
+
+    assert client.list_chats()
+    # 池中的连接已被服务端关闭，复用失败后换新连接重试
+    assert client.list_chats()
+    assert state.connections == 2
+
+
+def test_pool_closes_connection_when_full():
+    pool = ConnectionPool('http://127.0.0.1:1/', max_idle=1)
+    first, reused = pool.get()
+    second, _ = pool.get()
+    assert not reused
+
+    pool.put(first)
+    pool.put(second)
+    assert pool.get() == (first, True)
+    assert second.sock is None
+
+
+def test_refreshes_expired_token(mock_kimi):
+    server, _ = mock_kimi()
+    client = KimiApiClient('access-expired', 'refresh-ok', base_url=server.base_url)
+
+    assert client.ask("测试") == SAMPLE_REPLY.strip()
+    assert client.access_token == 'access-ok'
+
+
+def test_rejected_token_raises_auth_error(mock_kimi):
+    server, _ = mock_kimi()
+    with pytest.raises(KimiAuthError):
+        KimiApiClient('access-expired', 'refresh-bad', base_url=server.base_url).list_chats()
+
+
+def test_malformed_json_raises_api_error(mock_kimi):
+    server, _ = mock_kimi(fault='bad_json')
+    with pytest.raises(KimiApiError, match="无法解析"):
+        KimiApiClient('access-ok', base_url=server.base_url).list_chats()
+
+
+def test_error_event_raises_reply_error(mock_kimi):
+    server, _ = mock_kimi(fault='error_event')
+    with pytest.raises(KimiReplyError, match="rate_limit"):
+        KimiApiClient('access-ok', base_url=server.base_url).ask("测试", target_chat_name='email_return')
+
+
+def test_truncated_stream_raises_reply_error(mock_kimi):
+    server, _ = mock_kimi(fault='truncated_stream')
+    with pytest.raises(KimiReplyError):
+        KimiApiClient('access-ok', base_url=server.base_url).ask("测试", target_chat_name='email_return')
+
+
+def test_unreachable_server_raises_api_error():
+    with pytest.raises(KimiApiError):
+        KimiApiClient('access-ok', base_url='http://127.0.0.1:1/').list_chats()
+
+
+def test_get_kimi_response_falls_back_on_protocol_errors(monkeypatch, config_module):
+    """接口抛出解析或协议错误时回退到浏览器方式，而不是让异常中断运行"""
+    import kimi_handler
+
+    monkeypatch.setattr(config_module, 'KIMI_ENGINE', 'http')
+    browser_calls = []
+    monkeypatch.setattr(kimi_handler, 'get_kimi_response',
+                        lambda prompt, *args, **kwargs: browser_calls.append(prompt) or "浏览器回复")
+
+    for error in (ValueError("bad json"), KeyError('id'), http.client.IncompleteRead(b'')):
+        def fail(*args, error=error, **kwargs):
+            raise error
+
+        monkeypatch.setattr(kimi_api, '_client', fail)
+        assert kimi_api.get_kimi_response("测试") == "浏览器回复"
+    assert len(browser_calls) == 3
+
+
+@pytest.mark.parametrize('fault', ['error_event', 'truncated_stream'])
+def test_errors_after_send_do_not_fall_back(mock_kimi, monkeypatch, tmp_path, config_module, fault):
+    """消息发出后出错时不回退到浏览器方式，目标会话中只有一次提问"""
+    import kimi_handler
+
+    server, state = mock_kimi(fault=fault)
+    monkeypatch.setattr(config_module, 'KIMI_ENGINE', 'http')
+    monkeypatch.setattr(config_module, 'PARTIAL_REPLY_DIR', str(tmp_path))
+    monkeypatch.setattr(kimi_api, '_client',
+                        lambda session=None, deadline=None: KimiApiClient('access-ok', base_url=server.base_url))
+    monkeypatch.setattr(kimi_handler, 'get_kimi_response', lambda *args, **kwargs: pytest.fail("不应回退到浏览器"))
+
+    response = kimi_api.get_kimi_response("测试", target_chat_name='email_return')
+
+    assert response.startswith(("（本次回复未能完整生成", "自动化获取内容失败"))
+    assert len(state.chats[0]['messages']) == 1
+
+
+def test_error_event_salvages_received_part(mock_kimi, monkeypatch, tmp_path, config_module):
+    server, _ = mock_kimi(fault='error_event')
+    monkeypatch.setattr(config_module, 'KIMI_ENGINE', 'http')
+    monkeypatch.setattr(config_module, 'PARTIAL_REPLY_DIR', str(tmp_path))
+    monkeypatch.setattr(kimi_api, '_client',
+                        lambda session=None, deadline=None: KimiApiClient('access-ok', base_url=server.base_url))
+
+    response = kimi_api.get_kimi_response("测试", target_chat_name='email_return')
+
+    assert response.startswith("（本次回复未能完整生成")
+    assert "本地替身服务器示例话题" in response
+
+
+def test_missing_chat_uses_shared_default(mock_kimi, monkeypatch, config_module):
+    """找不到目标会话时两种引擎使用同一个默认值（未配置时使用最近的会话）"""
+    server, state = mock_kimi()
+    monkeypatch.delattr(config_module, 'CREATE_NEW_IF_NOT_FOUND', raising=False)
+    client = KimiApiClient('access-ok', base_url=server.base_url)
+
+    assert not kimi_api.create_new_if_not_found()
+    client.ask("测试", target_chat_name='不存在的会话')
+    assert len(state.chats) == 1
+    assert client.last_chat_id == 'chat-default'
+
+
+def test_client_from_profile_tokens(tmp_path, monkeypatch, config_module):
+    """没有登录状态文件时使用浏览器目录中的访问令牌"""
+    import base64
+    import json
+    import time
+
+    def jwt(expires_at):
+        payload = base64.urlsafe_b64encode(json.dumps({'exp': expires_at}).encode()).decode().rstrip('=')
+        return f"eyJhbGciOiJIUzI1NiJ9.{payload}.sig"
+
+    monkeypatch.setattr(config_module, 'STORAGE_STATE_FILE', str(tmp_path / 'missing.json'))
+    leveldb = tmp_path / 'profile' / 'Default' / 'Local Storage' / 'leveldb'
+    leveldb.mkdir(parents=True)
+    token = jwt(time.time() + 3600)
+    (leveldb / '000003.log').write_bytes(b'\x00_https://kimi.moonshot.cn\x00\x01access_token\x01' + token.encode())
+    monkeypatch.setattr(config_module, 'USER_DATA_DIR', str(tmp_path / 'profile'))
+
+    assert kimi_api._client().access_token == token
+
+    (leveldb / '000003.log').write_bytes(b'\x01access_token\x01' + jwt(time.time() - 10).encode())
+    with pytest.raises(KimiAuthError):
+        kimi_api._client()
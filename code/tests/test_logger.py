@@ -0,0 +1,62 @@
+# test_logger.py
+"""日志：按第一条日志的时间轮转，每个日志器有自己的后台线程"""
+
+import logging
+import os
+import time
+
+import logger as log_module
+from logger import CompressedRotatingFileHandler, reset_logger, setup_logger
+
+
+def _record():
+    return logging.LogRecord('test', logging.INFO, __file__, 1, "消息", None, None)
+
+
+def _write_log(path, started):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"{time.strftime(CompressedRotatingFileHandler.TIME_FORMAT, time.localtime(started))} | INFO | x\n")
+
+
+def test_time_rotation_uses_first_line_not_mtime(tmp_path):
+    path = str(tmp_path / 'app.log')
+    _write_log(path, time.time() - 2 * 86400)
+    # 文件刚被写过，修改时间是现在
+    os.utime(path, None)
+
+    handler = CompressedRotatingFileHandler(path, interval_hours=24)
+    try:
+        assert handler.shouldRollover(_record())
+        handler.doRollover()
+        assert not handler.shouldRollover(_record())
+        assert len([name for name in os.listdir(tmp_path) if name.endswith('.gz')]) == 1
+    finally:
+        handler.close()
+
+
+def test_recent_file_not_rotated(tmp_path):
+    path = str(tmp_path / 'app.log')
+    _write_log(path, time.time() - 3600)
+
+    handler = CompressedRotatingFileHandler(path, interval_hours=24)
+    try:
+        assert not handler.shouldRollover(_record())
+        assert abs(handler.rollover_at - (time.time() + 23 * 3600)) < 5
+    finally:
+        handler.close()
+
+
+def test_one_listener_per_logger_name(capsys):
+    first = setup_logger('TestLoggerA', log_to_file=False)
+    second = setup_logger('TestLoggerB', log_to_file=False)
+    try:
+        # 设置第二个日志器不会停止第一个的后台线程
+        assert log_module._listeners['TestLoggerA'] is not log_module._listeners['TestLoggerB']
+        first.info("来自A")
+        second.info("来自B")
+    finally:
+        reset_logger('TestLoggerA')
+        reset_logger('TestLoggerB')
+    output = capsys.readouterr().out
+    assert "来自A" in output and "来自B" in output
+    assert 'TestLoggerA' not in log_module._listeners
@@ -0,0 +1,85 @@
+# test_login_breaker.py
+"""登录熔断：预检通过但运行中认证失败时，连续失败应触发熔断"""
+
+import pytest
+
+import login_probe
+from kimi_api import KimiAuthError
+
+
+@pytest.fixture
+def breaker_env(monkeypatch, tmp_path, config_module):
+    monkeypatch.setattr(login_probe, 'BREAKER_DIR', str(tmp_path / 'auth_state'))
+    monkeypatch.setattr(config_module, 'LOGIN_PROBE_ENABLED', True)
+    monkeypatch.setattr(config_module, 'AUTH_BREAKER_THRESHOLD', 3)
+    monkeypatch.setattr(config_module, 'KIMI_ENGINE', 'http')
+    monkeypatch.setattr(config_module, 'STORAGE_STATE_FILE', str(tmp_path / 'state.json'))
+    # 预检总是通过（例如没有令牌时跳过在线检查）
+    monkeypatch.setattr(login_probe, 'probe', lambda *args, **kwargs: None)
+    alerts = []
+    monkeypatch.setattr(login_probe, 'send_alert', lambda breaker, receivers=None: alerts.append(breaker))
+    return alerts
+
+
+def _failing_run():
+    """与 main.run_once 相同的顺序：预检，然后运行中发现登录失效"""
+    result = login_probe.preflight()
+    if result is not None:
+        return result
+    login_probe.record_auth_failure(None, KimiAuthError("找不到输入框"))
+    return "auth_failed"
+
+
+def test_consecutive_run_failures_open_breaker(breaker_env):
+    results = [_failing_run() for _ in range(5)]
+
+    assert results == ["auth_failed"] * 3 + ["circuit_open"] * 2
+    assert len(breaker_env) == 1
+    breaker = login_probe.breaker_for()
+    assert breaker.is_open
+    assert len(breaker.state['failures']) == 3
+
+
+def test_reply_resets_breaker(breaker_env):
+    _failing_run()
+    _failing_run()
+    assert login_probe.preflight() is None
+    login_probe.record_auth_success()
+
+    assert login_probe.breaker_for().state['failures'] == []
+    assert _failing_run() == "auth_failed"
+    assert not login_probe.breaker_for().is_open
+
+
+class MissingInputBox:
+    """找不到输入框的页面"""
+
+    def locator(self, selector):
+        return self
+
+    @property
+    def first(self):
+        return self
+
+    def wait_for(self, timeout=None):
+        raise TimeoutError("等待输入框超时")
+
+
+def test_missing_input_box_confirmed_by_probe(monkeypatch):
+    import kimi_handler
+
+    def expired(*args, **kwargs):
+        raise KimiAuthError("登录已过期")
+
+    monkeypatch.setattr(login_probe, 'probe', expired)
+    with pytest.raises(KimiAuthError):
+        kimi_handler._find_input_box(MissingInputBox())
+
+
+def test_missing_input_box_with_valid_login_is_page_error(monkeypatch):
+    import kimi_handler
+
+    monkeypatch.setattr(login_probe, 'probe', lambda *args, **kwargs: None)
+    with pytest.raises(RuntimeError) as excinfo:
+        kimi_handler._find_input_box(MissingInputBox())
+    assert not isinstance(excinfo.value, KimiAuthError)
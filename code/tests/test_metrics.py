@@ -0,0 +1,29 @@
+# test_metrics.py
+"""运行指标：守护进程中一次运行不能清空其他运行的指标"""
+
+import main
+import metrics
+
+
+def _value(counter, **labels):
+    return counter._series.get(counter._key(labels), 0)
+
+
+def test_run_keeps_counters_of_other_runs(monkeypatch):
+    monkeypatch.setattr(main, 'run_once', lambda *args: "success")
+    metrics.FAILURES.inc(type="in_flight")
+    before = _value(metrics.RUNS, result="success")
+
+    main.run()
+    main.run()
+
+    assert _value(metrics.FAILURES, type="in_flight") == 1
+    assert _value(metrics.RUNS, result="success") == before + 2
+
+
+def test_counter_renders_total():
+    counter = metrics.Counter("test_events", "测试事件", ("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+
+    assert 'kimi_auto_mail_test_events_total{kind="a"} 3' in counter.render()
@@ -0,0 +1,98 @@
+# test_mime_message.py
+"""邮件报文：压缩HTML保留行内空格，超出预算时按段落截断，编码后整封邮件不超过预算"""
+
+import pytest
+
+import mime_message
+from html_formatter import format_text_to_html, generate_email_html
+
+
+def _reply(count, length=400):
+    return '\n\n'.join(f"{index} 问题：第{index}个话题\n• 回答：\n" + "内容" * length for index in range(count))
+
+
+def _build(text, budget_kb, config_module, monkeypatch):
+    monkeypatch.setattr(config_module, 'EMAIL_SIZE_BUDGET_KB', budget_kb)
+    html = generate_email_html(format_text_to_html(text))
+    return mime_message.build_message("主题", html, 'a@example.com', ['b@example.com'], text)
+
+
+def test_minify_keeps_space_between_inline_tags():
+    content = '<div>\n    <p><b>Golden</b> <i>quote</i></p>\n    <p>next</p>\n</div>'
+    assert mime_message.minify_html(content) == '<div><p><b>Golden</b> <i>quote</i></p><p>next</p></div>'
+
+
+def test_minify_strips_comments_and_css_whitespace():
+    content = '<!-- x -->\n<style>\n  p {\n    color: red;\n  }\n</style>\n<p>a<br>\n b</p>'
+    assert mime_message.minify_html(content) == '<style>p{color:red}</style><p>a<br>b</p>'
+
+
+def test_truncate_html_keeps_footer_and_reports_omitted():
+    html = mime_message.minify_html(generate_email_html(format_text_to_html(_reply(10))))
+    budget = len(html.encode('utf-8')) // 2
+
+    truncated, omitted = mime_message.truncate_html(html, budget)
+
+    assert len(truncated.encode('utf-8')) <= budget
+    assert 0 < omitted < 10
+    assert truncated.count('<p class="content-para">') == 10 - omitted
+    assert f"后面 {omitted} 个段落已省略{mime_message.TEXT_HINT}" in truncated
+    assert truncated.endswith(html[html.rfind('<div class="footer">'):])
+    assert truncated.count('<div') == truncated.count('</div>')
+
+
+def test_truncate_html_without_content_div_is_unchanged():
+    assert mime_message.truncate_html('<p>' + 'x' * 100 + '</p>', 10) == ('<p>' + 'x' * 100 + '</p>', 0)
+
+
+def test_truncate_text_by_paragraph():
+    text = '\n\n'.join(['甲' * 100, '乙' * 100, '丙' * 100])
+
+    truncated, omitted = mime_message.truncate_text(text, 700)
+
+    assert omitted == 1
+    assert len(truncated.encode('utf-8')) <= 700
+    assert truncated.startswith('甲' * 100 + '\n\n' + '乙' * 100 + '\n\n')
+    assert truncated.endswith(mime_message.TEXT_TRUNCATED_NOTE.format(count=1))
+    assert mime_message.truncate_text(text, 10000) == (text, 0)
+
+
+def test_small_message_is_untouched(config_module, monkeypatch):
+    msg, content, report = _build(_reply(2, 10), 100, config_module, monkeypatch)
+
+    assert (report.omitted, report.text_omitted) == (0, 0)
+    assert not report.over_budget
+    assert report.encoded == len(msg.as_bytes())
+    plain, html = msg.get_payload()
+    assert plain.get_content_type() == 'text/plain' and html.get_content_type() == 'text/html'
+    assert html.get_payload(decode=True).decode('utf-8') == content
+
+
+@pytest.mark.parametrize('budget_kb', [20, 50])
+def test_budget_bounds_encoded_message(config_module, monkeypatch, budget_kb):
+    msg, content, report = _build(_reply(40), budget_kb, config_module, monkeypatch)
+
+    assert len(msg.as_bytes()) <= budget_kb * 1024
+    assert not report.over_budget
+    assert report.omitted and report.text_omitted
+    plain = msg.get_payload()[0].get_payload(decode=True).decode('utf-8')
+    assert plain.endswith(mime_message.TEXT_TRUNCATED_NOTE.format(count=report.text_omitted))
+    assert mime_message.TEXT_HINT not in content
+
+
+def test_short_text_kept_whole_when_only_html_is_trimmed(config_module, monkeypatch):
+    monkeypatch.setattr(config_module, 'EMAIL_SIZE_BUDGET_KB', 20)
+    html = generate_email_html(format_text_to_html(_reply(40)))
+
+    msg, content, report = mime_message.build_message("主题", html, 'a@example.com', ['b@example.com'], "摘要")
+
+    assert len(msg.as_bytes()) <= 20 * 1024
+    assert report.omitted and not report.text_omitted
+    assert mime_message.TEXT_HINT in content
+
+
+def test_zero_budget_disables_truncation(config_module, monkeypatch):
+    msg, content, report = _build(_reply(40), 0, config_module, monkeypatch)
+
+    assert (report.omitted, report.text_omitted) == (0, 0)
+    assert report.encoded > 100 * 1024 and not report.over_budget
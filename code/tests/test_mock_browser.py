@@ -0,0 +1,34 @@
+# test_mock_browser.py
+"""浏览器方式：用无头Chromium对本地替身服务器分别以DOM提取和网络捕获取回回复（需要安装Playwright浏览器）"""
+
+import pytest
+
+from mock_kimi_server import SAMPLE_REPLY, start_in_thread
+
+
+@pytest.fixture(scope='module')
+def chromium():
+    sync_api = pytest.importorskip('playwright.sync_api')
+    try:
+        with sync_api.sync_playwright() as playwright:
+            playwright.chromium.launch(headless=True).close()
+    except Exception as e:
+        pytest.skip(f"无法启动无头Chromium: {str(e).splitlines()[0]}")
+
+
+@pytest.mark.parametrize('mode', ['dom', 'network'])
+def test_browser_capture(chromium, monkeypatch, tmp_path, config_module, mode):
+    import kimi_handler
+
+    server = start_in_thread()
+    monkeypatch.setattr(kimi_handler, 'KIMI_URL', server.base_url)
+    monkeypatch.setattr(config_module, 'CAPTURE_MODE', mode)
+    try:
+        session = kimi_handler.KimiSession(str(tmp_path / 'profile'), headless=True)
+        response = kimi_handler.get_kimi_response("替身服务器测试", session=session,
+                                                  target_chat_name='email_return')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.strip() == SAMPLE_REPLY.strip()
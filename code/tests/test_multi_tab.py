@@ -0,0 +1,107 @@
+# test_multi_tab.py
+"""多标签页生成：追问补全在全部标签页结束后才进行，不阻塞其他标签页的轮询；全部登录失效时交给熔断器"""
+
+import pytest
+
+import kimi_handler
+
+
+class FakeMonitor:
+    def __init__(self, name, polls, events):
+        self.name = name
+        self.polls = polls
+        self.events = events
+
+    def poll(self):
+        self.polls -= 1
+        self.events.append(('poll', self.name))
+        return self.polls <= 0
+
+    def finish(self):
+        pass
+
+    def next_interval(self):
+        return 0
+
+
+class FakeSession:
+    page = 'page-0'
+
+    def new_page(self, deadline=None):
+        return 'page-n'
+
+    def dump(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_repairs_run_after_all_tabs_finish(monkeypatch):
+    events = []
+    polls = {'快': 1, '慢': 3}
+    monitors = iter([FakeMonitor(name, count, events) for name, count in polls.items()])
+
+    monkeypatch.setattr(kimi_handler, '_start_capture', lambda page: None)
+    monkeypatch.setattr(kimi_handler, '_open_chat', lambda *args: (True, False))
+    monkeypatch.setattr(kimi_handler, '_find_input_box', lambda *args: None)
+    monkeypatch.setattr(kimi_handler, '_mark_page', lambda page: None)
+    monkeypatch.setattr(kimi_handler, '_send_prompt', lambda *args: next(monitors))
+    monkeypatch.setattr(kimi_handler.PartialReply, 'start', classmethod(lambda cls, name='reply': None))
+    monkeypatch.setattr(kimi_handler, '_read_response',
+                        lambda page, monitor, prompt, marker: events.append(('read', monitor.name)) or monitor.name)
+
+    def repair(page, prompt, response_text, capture=None, deadline=None):
+        events.append(('repair', response_text))
+        return response_text + '（已补全）'
+
+    monkeypatch.setattr(kimi_handler, '_repair_response', repair)
+    monkeypatch.setattr(kimi_handler, '_rename_new_chat', lambda *args: None)
+
+    requests = [{'name': name, 'prompt': name} for name in polls]
+    delivered = []
+    results = kimi_handler.get_kimi_responses(requests, session=FakeSession(),
+                                              on_results=lambda responses, rendered: delivered.append(responses))
+
+    assert results == {'快': '快（已补全）', '慢': '慢（已补全）'}
+    first_repair = events.index(('repair', '快'))
+    assert events.index(('read', '慢')) < first_repair
+    assert ('poll', '慢') not in events[first_repair:]
+    assert delivered == [results]
+
+
+def test_all_tabs_auth_failed_raises(monkeypatch):
+    def no_input_box(*args):
+        raise kimi_handler.KimiAuthError("登录已过期")
+
+    monkeypatch.setattr(kimi_handler, '_start_capture', lambda page: None)
+    monkeypatch.setattr(kimi_handler, '_open_chat', lambda *args: (True, False))
+    monkeypatch.setattr(kimi_handler, '_find_input_box', no_input_box)
+
+    requests = [{'name': name, 'prompt': name} for name in ('科技', '财经')]
+    delivered = []
+    with pytest.raises(kimi_handler.KimiAuthError):
+        kimi_handler.get_kimi_responses(requests, session=FakeSession(),
+                                        on_results=lambda responses, rendered: delivered.append(responses))
+    assert delivered == []
+
+
+def test_digest_auth_failure_trips_breaker(monkeypatch, config_module):
+    import kimi_api
+    import login_probe
+    import mailer
+    import prompt_catalog
+
+    def auth_failed(*args, **kwargs):
+        raise kimi_api.KimiAuthError("登录已过期")
+
+    failures = []
+    monkeypatch.setattr(config_module, 'KIMI_ENGINE', 'browser')
+    monkeypatch.setattr(kimi_handler, 'get_kimi_responses', auth_failed)
+    monkeypatch.setattr(login_probe, 'record_auth_failure',
+                        lambda session, error, receivers=None: failures.append(str(error)))
+    monkeypatch.setattr(mailer, 'send_email', lambda *args, **kwargs: pytest.fail("不应发送错误邮件"))
+
+    catalog = [{'name': '科技', 'prompt': '科技'}, {'name': '财经', 'prompt': '财经'}]
+    assert prompt_catalog.run_digest(catalog) == "auth_failed"
+    assert failures == ["登录已过期"]
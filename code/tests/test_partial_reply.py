@@ -0,0 +1,103 @@
+# test_partial_reply.py
+"""回复暂存：段落重写、已完成问题的判断、中断后的摘要，以及复用已格式化的问题"""
+
+import pytest
+
+from html_formatter import format_text_to_html
+from partial_reply import PartialReply
+
+
+def _item(mark, question, quote=True, extension=True):
+    lines = [f"{mark} 问题：{question}（科技）", "• 回答：这是一段足够长的回答内容，用来拼出可以发送的摘要。"]
+    if quote:
+        lines.append(f"• 金句：{question}的金句")
+    if extension:
+        lines.append(f"• 延伸：{question}的延伸")
+    return '\n'.join(lines)
+
+
+@pytest.fixture
+def progress(tmp_path):
+    return PartialReply(str(tmp_path / 'reply'))
+
+
+def test_update_keeps_last_paragraph_until_next_one(progress):
+    assert progress.update(["第一段", "第二段（生成中"]) == 1
+    assert progress.paragraphs == ["第一段"]
+    assert progress.update(["第一段", "第二段（生成完毕）", "第三段"]) == 1
+    assert progress.update(["第一段", "第二段（生成完毕）", "第三段"], final=True) == 1
+    assert progress.paragraphs == ["第一段", "第二段（生成完毕）", "第三段"]
+    with open(progress.text_path, encoding='utf-8') as f:
+        assert f.read() == "第一段\n\n第二段（生成完毕）\n\n第三段\n\n"
+
+
+def test_update_rewrites_when_page_rerenders_paragraph(progress):
+    progress.update(["**标题", "正文", "生成中"])
+    # 页面补全了Markdown格式，已保存的段落以页面为准重写
+    assert progress.update(["标题", "正文", "下一段", "生成中"]) == 3
+
+    assert progress.paragraphs == ["标题", "正文", "下一段"]
+    with open(progress.text_path, encoding='utf-8') as f:
+        assert f.read() == "标题\n\n正文\n\n下一段\n\n"
+
+
+def test_completed_items_waits_for_last_item(progress):
+    progress.update([_item('①', '话题一'), _item('②', '话题二', extension=False), ""])
+    assert list(progress.completed_items()) == ['①']
+
+    progress.update([_item('①', '话题一'), _item('②', '话题二'), ""])
+    assert list(progress.completed_items()) == ['①', '②']
+
+
+def test_completed_items_final_includes_partial_last_item(progress):
+    progress.update([_item('①', '话题一'), _item('②', '话题二', quote=False, extension=False)], final=True)
+
+    assert list(progress.completed_items()) == ['①']
+    assert list(progress.completed_items(final=True)) == ['①', '②']
+
+
+def test_digest_uses_completed_items_and_keywords(progress):
+    progress.update([_item('①', '话题一'), _item('②', '话题二'), "本次话题关键词：甲 乙", _item('③', '话题三', False, False)],
+                    final=True)
+
+    digest = progress.digest()
+    assert digest.startswith("（本次回复未能完整生成，以下是已完成的 2 个话题）")
+    assert "话题二的延伸" in digest and "本次话题关键词：甲 乙" in digest
+    assert "话题三" not in digest
+
+
+def test_digest_without_items(progress):
+    assert progress.digest() is None
+    progress.update(["没有编号的回复，" * 10, "第二段"], final=True)
+
+    assert progress.digest().startswith("（本次回复未能完整生成，以下是已生成的部分）")
+
+
+def test_render_reuses_completed_items(progress, monkeypatch):
+    import partial_reply
+
+    paragraphs = ["今日推送：", _item('①', '话题一'), _item('②', '话题二'), "本次话题关键词：甲 乙"]
+    progress.update(paragraphs + [""])
+    text = '\n\n'.join(paragraphs)
+
+    formatted = []
+    monkeypatch.setattr(partial_reply, 'format_text_to_html', lambda block: formatted.append(block) or
+                        format_text_to_html(block))
+    html = progress.render(text)
+
+    assert html == format_text_to_html(text)
+    assert formatted == ["今日推送：", "本次话题关键词：甲 乙"]
+
+
+def test_render_reformats_repaired_item(progress):
+    progress.update([_item('①', '话题一'), _item('②', '话题二', extension=False), ""])
+    repaired = '\n\n'.join([_item('①', '话题一'), _item('②', '话题二')])
+
+    assert progress.render(repaired) == format_text_to_html(repaired)
+
+
+def test_render_falls_back_for_unsplittable_text(progress):
+    progress.update([_item('①', '话题一'), ""])
+    text = f"前言\n{_item('①', '话题一')}\n\n{_item('①', '重复编号')}"
+
+    assert progress.render(text) == format_text_to_html(text)
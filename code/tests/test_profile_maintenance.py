@@ -0,0 +1,92 @@
+# test_profile_maintenance.py
+"""浏览器目录维护：只删除缓存、保留登录状态；目录被其他任务占用时不清理"""
+
+import os
+import threading
+
+import pytest
+
+import profile_maintenance
+from profile_lock import ProfileLock
+
+KEPT = ['Default/Cookies', 'Default/Network/Cookies', 'Default/Local Storage/leveldb/000003.log',
+        'Default/IndexedDB/https_kimi.moonshot.cn_0.indexeddb.leveldb/LOG', 'Default/Preferences', 'Local State']
+PRUNED = ['Default/Cache/Cache_Data/data_0', 'Default/Code Cache/js/index', 'Default/Service Worker/Database/LOG',
+          'Profile 1/GPUCache/data_1', 'GrShaderCache/data_0']
+
+
+@pytest.fixture
+def profile(tmp_path, monkeypatch, config_module):
+    monkeypatch.setattr(config_module, 'PROFILE_PRUNE_INDEXEDDB', False)
+    monkeypatch.setattr(config_module, 'PROFILE_AUTO_MAINTENANCE', True)
+    monkeypatch.setattr(config_module, 'PROFILE_CACHE_MAX_MB', 0)
+    monkeypatch.setattr(config_module, 'PROFILE_MAINTENANCE_FILE', str(tmp_path / 'maintenance.json'))
+    user_data_dir = tmp_path / 'profile'
+    for name in KEPT + PRUNED:
+        path = user_data_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * 100)
+    return str(user_data_dir)
+
+
+def _exists(user_data_dir, name):
+    return os.path.exists(os.path.join(user_data_dir, name))
+
+
+def test_cache_dirs_excludes_login_state(profile):
+    found = {os.path.relpath(path, profile).replace(os.sep, '/') for path in profile_maintenance.cache_dirs(profile)}
+
+    assert found == {'Default/Cache', 'Default/Code Cache', 'Default/Service Worker', 'Profile 1/GPUCache',
+                     'GrShaderCache'}
+
+
+def test_prune_keeps_cookies_and_local_storage(profile):
+    freed = profile_maintenance.prune(profile)
+
+    assert freed == 100 * len(PRUNED)
+    assert all(_exists(profile, name) for name in KEPT)
+    assert not any(_exists(profile, name) for name in PRUNED)
+
+
+def test_prune_indexeddb_only_when_enabled(profile, monkeypatch, config_module):
+    monkeypatch.setattr(config_module, 'PROFILE_PRUNE_INDEXEDDB', True)
+    profile_maintenance.prune(profile)
+
+    assert not _exists(profile, 'Default/IndexedDB')
+    assert _exists(profile, 'Default/Local Storage/leveldb/000003.log')
+
+
+def test_maybe_maintain_skips_busy_profile(profile):
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold():
+        with ProfileLock(profile):
+            acquired.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    acquired.wait(5)
+    try:
+        assert profile_maintenance.maybe_maintain(profile) is None
+    finally:
+        release.set()
+        thread.join()
+    assert all(_exists(profile, name) for name in PRUNED)
+
+
+def test_maybe_maintain_under_callers_lock(profile):
+    with ProfileLock(profile):
+        entry = profile_maintenance.maybe_maintain(profile)
+
+    assert entry['freed'] == 100 * len(PRUNED)
+    assert all(_exists(profile, name) for name in KEPT)
+    assert not ProfileLock(profile).locked()
+
+
+def test_maybe_maintain_takes_lock_itself(profile):
+    entry = profile_maintenance.maybe_maintain(profile)
+
+    assert entry['trigger'] == 'auto'
+    assert not any(_exists(profile, name) for name in PRUNED)
+    assert not ProfileLock(profile).locked()
@@ -0,0 +1,144 @@
+# test_reply_spec.py
+"""回复格式检查：找出缺失或被截断的问题、缺少的字段和关键词行，只追问缺少的部分再拼回原回复"""
+
+import pytest
+
+import reply_spec
+from deadline import Deadline
+
+PROMPT = "请输出①②③三个问题，每个问题包含金句和延伸，最后一行写「本次话题关键词」"
+KEYWORDS = "本次话题关键词：[芯片] [消费] [文旅]"
+
+
+def _item(mark, topic, quote=True, extension=True):
+    lines = [f"{mark} 问题：{topic}的最新进展？（科技）", "• 回答：", f"{topic}的回答。"]
+    if quote:
+        lines.append(f"• 金句：{topic}的金句。")
+    if extension:
+        lines.append(f"• 延伸：{topic}的延伸？")
+    return '\n'.join(lines)
+
+
+def _reply(*items, keywords=KEYWORDS):
+    blocks = ["以下是今天的话题："] + list(items)
+    if keywords:
+        blocks.append(keywords)
+    return '\n\n'.join(blocks)
+
+
+@pytest.fixture
+def spec():
+    return reply_spec.ReplySpec.from_prompt(PROMPT)
+
+
+def test_from_prompt_reads_marks_fields_and_keywords(spec):
+    assert (spec.marks, spec.fields, spec.keywords) == ('①②③', ('金句', '延伸'), True)
+    assert reply_spec.ReplySpec.from_prompt("随便聊聊") is None
+
+
+def test_parse_reply_splits_items_and_keeps_first_duplicate():
+    text = _reply(_item('①', '芯片'), _item('②', '消费'), _item('①', '重复')) + "\n\n谢谢阅读"
+
+    parsed = reply_spec.parse_reply(text)
+
+    assert parsed.preamble == "以下是今天的话题："
+    assert list(parsed.items) == ['①', '②']
+    assert "芯片" in parsed.items['①'] and "重复" not in parsed.items['①']
+    assert parsed.keywords_line == KEYWORDS
+    assert parsed.tail == "谢谢阅读"
+    assert reply_spec.parse_keywords(parsed.keywords_line) == ['芯片', '消费', '文旅']
+
+
+def test_complete_reply_has_no_problems(spec):
+    assert spec.check(_reply(_item('①', '芯片'), _item('②', '消费'), _item('③', '文旅'))) == []
+
+
+def test_check_finds_missing_truncated_field_and_keywords(spec):
+    text = _reply(_item('①', '芯片', extension=False), _item('②', '消费', quote=False, extension=False),
+                  keywords=None)
+
+    problems = spec.check(text)
+
+    assert problems == [('①', '延伸'), ('②', 'truncated'), ('③', 'item'), (None, 'keywords')]
+    assert reply_spec.describe(problems) == "①缺少延伸、②被截断、缺少③、缺少本次话题关键词"
+
+
+def test_followup_prompt_asks_only_for_missing_parts(spec):
+    problems = [('①', '延伸'), ('②', 'truncated'), ('③', 'item'), (None, 'keywords')]
+
+    prompt = reply_spec.followup_prompt(spec, problems)
+
+    lines = prompt.splitlines()[1:]
+    assert lines[0].startswith("• 问题①：只输出「延伸」")
+    assert lines[1].startswith("• 问题②：回答被截断了")
+    assert lines[2] == "• 问题③：按原格式从编号③开始完整输出，话题不要与①②重复"
+    assert f"「{reply_spec.KEYWORDS_LABEL}：" in lines[3] and "全部3个问题" in lines[3]
+
+
+def test_splice_missing_item(spec):
+    text = _reply(_item('①', '芯片'), _item('②', '消费'))
+
+    spliced = reply_spec.splice(text, _item('③', '文旅'), [('③', 'item')])
+
+    assert spec.check(spliced) == []
+    assert spliced.index("芯片") < spliced.index("文旅") < spliced.index(KEYWORDS)
+
+
+def test_splice_replaces_truncated_item(spec):
+    text = _reply(_item('①', '芯片'), "② 问题：消费的最新进展？（经济）\n• 回答：\n消费", _item('③', '文旅'))
+
+    spliced = reply_spec.splice(text, "好的，补充如下：\n\n" + _item('②', '消费'), [('②', 'truncated')])
+
+    assert spec.check(spliced) == []
+    assert reply_spec.parse_reply(spliced).items['②'] == _item('②', '消费')
+    assert "补充如下" not in spliced
+
+
+def test_splice_appends_missing_field(spec):
+    text = _reply(_item('①', '芯片', quote=False), _item('②', '消费'), _item('③', '文旅'))
+
+    spliced = reply_spec.splice(text, "①\n• 金句：补上的金句。", [('①', '金句')])
+
+    assert spec.check(spliced) == []
+    item = reply_spec.parse_item(reply_spec.parse_reply(spliced).items['①'])
+    assert item['quote'] == "补上的金句。" and item['extension'] == "芯片的延伸？"
+
+
+def test_splice_replaces_keywords_line(spec):
+    text = _reply(_item('①', '芯片'), _item('②', '消费'), _item('③', '文旅'), keywords="本次话题关键词：")
+
+    spliced = reply_spec.splice(text, "本次话题关键词：[芯片] [消费] [文旅]", [(None, 'keywords')])
+
+    assert spec.check(spliced) == []
+    assert spliced.endswith(KEYWORDS) and spliced.count(reply_spec.KEYWORDS_LABEL) == 1
+
+
+def test_splice_without_usable_patch_returns_original():
+    text = _reply(_item('①', '芯片', quote=False), keywords=None)
+    problems = [('①', '金句'), ('②', 'item'), (None, 'keywords')]
+
+    assert reply_spec.splice(text, "抱歉，我无法补充。", problems) is text
+    assert reply_spec.splice(text, "①\n• 金句：", problems) is text
+
+
+def test_repair_asks_once_and_splices(spec, config_module, monkeypatch):
+    monkeypatch.setattr(config_module, 'REPLY_REPAIR_MAX_ROUNDS', 2)
+    text = _reply(_item('①', '芯片'), _item('②', '消费'))
+    asked = []
+
+    def ask(prompt):
+        asked.append(prompt)
+        return _item('③', '文旅')
+
+    repaired = reply_spec.repair(text, spec, ask, Deadline(600))
+
+    assert spec.check(repaired) == []
+    assert len(asked) == 1 and "问题③" in asked[0]
+
+
+def test_repair_skips_when_budget_is_low(spec):
+    text = _reply(_item('①', '芯片'))
+
+    repaired = reply_spec.repair(text, spec, lambda prompt: pytest.fail("预算不足时不应追问"), Deadline(10))
+
+    assert repaired == text
@@ -0,0 +1,129 @@
+# test_rollup.py
+"""周报/月报汇总：同一天的多个任务分别记录，各租户写入自己的汇总"""
+
+import json
+import os
+import sys
+import types
+from datetime import date
+
+import pytest
+
+import main
+import rollup
+import tenants
+
+DAY = date(2025, 2, 12)
+
+
+def _reply(*questions):
+    items = [f"{'①②③'[index]} 问题：{question}（{domain}）\n• 回答：\n内容。"
+             for index, (question, domain) in enumerate(questions)]
+    return '\n\n'.join(items)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, config_module):
+    monkeypatch.setattr(config_module, 'ROLLUP_ENABLED', True)
+    return rollup.RollupStore(str(tmp_path))
+
+
+def _questions(store, day=DAY):
+    aggregate = store.load(rollup.period_key('week', day))
+    return sorted(topic['question'] for jobs in aggregate['days'].values()
+                  for topics in jobs.values() for topic in topics)
+
+
+def test_jobs_on_same_day_do_not_overwrite(store):
+    rollup.record(_reply(("早间话题", "科技")), day=DAY, store=store, job='morning')
+    rollup.record(_reply(("晚间话题", "经济")), day=DAY, store=store, job='evening')
+
+    assert _questions(store) == ["早间话题", "晚间话题"]
+    subject, html = rollup.build_digest('week', DAY, store)
+    assert "早间话题" in html and "晚间话题" in html
+
+
+def test_rerun_of_same_job_replaces_its_topics(store):
+    rollup.record(_reply(("第一次", "科技")), day=DAY, store=store, job='morning')
+    rollup.record(_reply(("晚间话题", "经济")), day=DAY, store=store, job='evening')
+    rollup.record(_reply(("重跑", "科技")), day=DAY, store=store, job='morning')
+
+    assert _questions(store) == ["晚间话题", "重跑"]
+    aggregate = store.load(rollup.period_key('week', DAY))
+    assert sorted(aggregate['domains']) == ['科技', '经济']
+    assert aggregate['domains']['科技'] == [[DAY.isoformat(), 'morning', 0]]
+
+
+def test_loads_files_without_job_keys(store):
+    key = rollup.period_key('week', DAY)
+    os.makedirs(store.directory, exist_ok=True)
+    with open(store.path(key), 'w', encoding='utf-8') as f:
+        json.dump({'period': key,
+                   'days': {DAY.isoformat(): [{'mark': '①', 'question': '旧话题', 'domain': '科技',
+                                               'quote': None, 'keywords': [], 'source': None}]},
+                   'domains': {'科技': [[DAY.isoformat(), 0]]}}, f, ensure_ascii=False)
+
+    rollup.record(_reply(("新话题", "科技")), day=DAY, store=store, job='evening')
+
+    assert _questions(store) == ["新话题", "旧话题"]
+    assert "旧话题" in rollup.build_digest('week', DAY, store)[1]
+
+
+def _tenant(tmp_path, name):
+    return {'name': name, 'user_data_dir': f'/nonexistent/{name}', 'storage_state': 'x.json',
+            'prompt': 'p', 'target_chat': None, 'use_existing_chat': True, 'recipients': [f'{name}@example.com'],
+            'rollup_dir': str(tmp_path / name / 'rollups'), 'archive_dir': str(tmp_path / name / 'web_archive'),
+            'archive_url': ''}
+
+
+def test_tenant_runs_record_into_tenant_rollup(tmp_path, monkeypatch, config_module):
+    owner_dir = tmp_path / 'owner'
+    monkeypatch.setattr(config_module, 'ROLLUP_ENABLED', True)
+    monkeypatch.setattr(config_module, 'ROLLUP_DIR', str(owner_dir))
+    monkeypatch.setattr(config_module, 'ARCHIVE_DIR', str(tmp_path / 'owner_archive'))
+    monkeypatch.setattr(config_module, 'ARCHIVE_BASE_URL', 'https://owner.example.com')
+
+    def run_once(**kwargs):
+        rollup.record(_reply((f"{kwargs['receivers'][0]} 的话题", "科技")), day=DAY)
+        return "success"
+
+    monkeypatch.setattr(main, 'run_once', run_once)
+    monkeypatch.setitem(sys.modules, 'kimi_handler', types.SimpleNamespace(KimiSession=lambda *args, **kwargs: None))
+    for name in ('alice', 'bob'):
+        assert tenants.run_tenant(_tenant(tmp_path, name))['result'] == "success"
+        assert config_module.ARCHIVE_DIR == str(tmp_path / name / 'web_archive')
+        assert config_module.ARCHIVE_BASE_URL == ''
+
+    assert not owner_dir.exists()
+    for name in ('alice', 'bob'):
+        assert _questions(rollup.RollupStore(str(tmp_path / name / 'rollups'))) == [f"{name}@example.com 的话题"]
+
+
+def test_tenant_digests_go_to_tenant_recipients(tmp_path, monkeypatch, config_module):
+    import mailer
+
+    monkeypatch.setattr(config_module, 'ROLLUP_ENABLED', True)
+    alice, bob = _tenant(tmp_path, 'alice'), _tenant(tmp_path, 'bob')
+    rollup.record(_reply(("爱丽丝的话题", "科技")), day=DAY, store=rollup.RollupStore(alice['rollup_dir']))
+    sent = []
+    monkeypatch.setattr(mailer, 'send_email',
+                        lambda subject, html, receivers, **kwargs: sent.append((receivers, html)) or True)
+
+    assert tenants.send_digests([alice, bob], 'week', DAY) == {'alice': True, 'bob': False}
+    assert len(sent) == 1
+    assert sent[0][0] == ['alice@example.com'] and "爱丽丝的话题" in sent[0][1]
+
+
+def test_manifest_defaults_tenant_data_dirs(tmp_path):
+    manifest = tmp_path / 'tenants.json'
+    manifest.write_text(json.dumps({'tenants': [
+        {'name': 'alice', 'user_data_dir': 'profiles/alice', 'recipients': 'alice@example.com'},
+        {'name': 'bob', 'user_data_dir': 'profiles/bob', 'recipients': ['bob@example.com'],
+         'rollup_dir': 'data/bob', 'archive_url': 'https://bob.example.com'},
+    ]}), encoding='utf-8')
+
+    alice, bob = tenants.load_manifest(str(manifest))
+    assert alice['rollup_dir'] == os.path.join(tenants.TENANT_DATA_DIR, 'alice', 'rollups')
+    assert alice['archive_dir'] == os.path.join(tenants.TENANT_DATA_DIR, 'alice', 'web_archive')
+    assert bob['rollup_dir'] == str(tmp_path / 'data' / 'bob')
+    assert bob['archive_url'] == 'https://bob.example.com'
@@ -0,0 +1,117 @@
+# test_scheduler.py
+"""定时调度：cron表达式解析（日与周的「或」规则、7表示周日、步长与范围）和停机后补跑错过的时间槽"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import scheduler
+from scheduler import CronSchedule
+
+# 2025-02-12 是周三
+WEDNESDAY = datetime(2025, 2, 12, 9, 30)
+
+
+def test_fields_support_lists_ranges_and_steps():
+    schedule = CronSchedule("*/15 9-10,18 * * *")
+    assert schedule.minutes == {0, 15, 30, 45}
+    assert schedule.hours == {9, 10, 18}
+    assert CronSchedule("5/20 1-10/3 * * *").minutes == {5, 25, 45}
+    assert CronSchedule("5/20 1-10/3 * * *").hours == {1, 4, 7, 10}
+
+
+@pytest.mark.parametrize('expression', ["0 8 * *", "60 8 * * *", "0 24 * * *", "*/0 8 * * *", "0 8 0 * *",
+                                        "0 8 * 13 *", "0 8 * * 8", "0 10-8 * * *"])
+def test_invalid_expressions_raise(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_seven_is_sunday():
+    schedule = CronSchedule("0 8 * * 7")
+    assert schedule.weekdays == {0}
+    assert schedule.next_after(WEDNESDAY) == datetime(2025, 2, 16, 8, 0)
+    assert CronSchedule("0 8 * * 0").next_after(WEDNESDAY) == datetime(2025, 2, 16, 8, 0)
+
+
+def test_weekday_range_skips_weekend():
+    schedule = CronSchedule("0 8 * * 1-5")
+    assert schedule.next_after(datetime(2025, 2, 14, 9, 0)) == datetime(2025, 2, 17, 8, 0)
+
+
+def test_day_and_weekday_match_either():
+    schedule = CronSchedule("0 8 1 * 1")
+    # 周一先到
+    assert schedule.next_after(WEDNESDAY) == datetime(2025, 2, 17, 8, 0)
+    # 3月1日（周六）比下一个周一早
+    assert schedule.next_after(datetime(2025, 2, 25, 9, 0)) == datetime(2025, 3, 1, 8, 0)
+
+
+def test_only_day_restricted_ignores_weekday():
+    schedule = CronSchedule("0 8 13 * *")
+    assert schedule.next_after(WEDNESDAY) == datetime(2025, 2, 13, 8, 0)
+    assert schedule.next_after(datetime(2025, 2, 13, 8, 0)) == datetime(2025, 3, 13, 8, 0)
+
+
+def test_next_after_is_strict_and_prev_before_is_inclusive():
+    schedule = CronSchedule("0 8 * * *")
+    at_slot = datetime(2025, 2, 12, 8, 0, 30)
+    assert schedule.next_after(at_slot) == datetime(2025, 2, 13, 8, 0)
+    assert schedule.prev_before(at_slot) == datetime(2025, 2, 12, 8, 0)
+    assert schedule.prev_before(datetime(2025, 2, 12, 7, 59)) == datetime(2025, 2, 11, 8, 0)
+
+
+def test_month_restriction_and_leap_day():
+    assert CronSchedule("30 6 29 2 *").next_after(WEDNESDAY) == datetime(2028, 2, 29, 6, 30)
+    assert CronSchedule("0 0 1 1,7 *").prev_before(WEDNESDAY) == datetime(2025, 1, 1, 0, 0)
+
+
+def test_plan_next_applies_prewarm(config_module, monkeypatch):
+    monkeypatch.setattr(config_module, 'KIMI_ENGINE', 'browser')
+    job = scheduler.ScheduledJob({'name': 'morning', 'cron': '0 8 * * *', 'prewarm_seconds': 120,
+                                  'jitter_seconds': 0})
+
+    job.plan_next(WEDNESDAY)
+
+    assert job.slot == job.fire_time == datetime(2025, 2, 13, 8, 0)
+    assert job.wake_time == datetime(2025, 2, 13, 7, 58)
+
+
+@pytest.fixture
+def state_file(tmp_path, monkeypatch, config_module):
+    path = tmp_path / 'scheduler_state.json'
+    monkeypatch.setattr(scheduler, 'STATE_FILE', str(path))
+    monkeypatch.setattr(config_module, 'SCHEDULER_CATCHUP_HOURS', 6)
+    return path
+
+
+def _job(name, cron, started):
+    job = scheduler.ScheduledJob({'name': name, 'cron': cron}, runner=lambda session, deadline: None,
+                                 uses_browser=False)
+    job.start = lambda slot, fire_time, stop_event, prewarm=True: started.append((name, slot, fire_time, prewarm))
+    return job
+
+
+def test_catch_up_runs_latest_missed_slot(state_file):
+    scheduler.save_slot('morning', datetime(2025, 2, 11, 8, 0))
+    started = []
+
+    jobs = scheduler.catch_up([_job('morning', '0 8 * * *', started)], WEDNESDAY, stop_event=None)
+
+    assert [job.name for job in jobs] == ['morning']
+    assert started == [('morning', datetime(2025, 2, 12, 8, 0), WEDNESDAY, False)]
+
+
+def test_catch_up_skips_done_stale_and_new_jobs(state_file):
+    scheduler.save_slot('done', datetime(2025, 2, 12, 8, 0))
+    scheduler.save_slot('stale', datetime(2025, 2, 10, 8, 0))
+    started = []
+    jobs = [_job('done', '0 8 * * *', started), _job('stale', '0 1 * * *', started),
+            _job('new', '0 8 * * *', started)]
+
+    assert scheduler.catch_up(jobs, WEDNESDAY, stop_event=None) == []
+    assert started == []
+    # 从未运行过的任务从现在开始记录，之后错过的时间槽才会补跑
+    assert scheduler.load_state()['new'] == WEDNESDAY.replace(second=0).isoformat()
+    later = WEDNESDAY + timedelta(days=1)
+    assert [job.name for job in scheduler.catch_up(jobs[2:], later, stop_event=None)] == ['new']
@@ -0,0 +1,73 @@
+# test_smtp_transport.py
+"""SMTP连接方式：登录前必须完成TLS协商，明文连接只能显式开启"""
+
+import smtplib
+
+import pytest
+
+import smtp_transport
+from smtp_transport import Transport
+
+
+class FakeSMTP:
+    """不联网的 smtplib.SMTP，按 starttls 参数决定服务器是否支持STARTTLS"""
+
+    starttls_supported = False
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.tls = False
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def ehlo(self):
+        pass
+
+    def has_extn(self, name):
+        return name == 'starttls' and self.starttls_supported
+
+    def starttls(self, context=None):
+        self.tls = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_smtp(monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr(smtplib, 'SMTP', FakeSMTP)
+    return FakeSMTP
+
+
+@pytest.mark.parametrize('mode, port', [('plain', 25), ('starttls', 587)])
+def test_refuses_connection_without_starttls(fake_smtp, monkeypatch, config_module, mode, port):
+    monkeypatch.setattr(config_module, 'SMTP_ALLOW_PLAINTEXT', False)
+    with pytest.raises(smtplib.SMTPNotSupportedError):
+        Transport(mode, port).connect('smtp.example.com')
+    assert fake_smtp.instances[0].closed
+
+
+def test_plain_upgrades_to_tls(fake_smtp, monkeypatch):
+    monkeypatch.setattr(fake_smtp, 'starttls_supported', True)
+    server = Transport('plain', 25).connect('smtp.example.com')
+    assert server.tls
+
+
+def test_plaintext_requires_opt_in(fake_smtp, monkeypatch, config_module):
+    monkeypatch.setattr(config_module, 'SMTP_ALLOW_PLAINTEXT', True)
+    server = Transport('plain', 25).connect('smtp.example.com')
+    assert not server.tls
+    assert Transport('plain', 25).yagmail_options()['smtp_starttls'] is False
+
+
+def test_yagmail_plain_requires_starttls(monkeypatch, config_module):
+    monkeypatch.setattr(config_module, 'SMTP_ALLOW_PLAINTEXT', False)
+    assert Transport('plain', 25).yagmail_options() == {'port': 25, 'smtp_ssl': False, 'smtp_starttls': True}
+
+
+def test_negotiate_skips_cleartext_candidate(fake_smtp, monkeypatch, config_module):
+    monkeypatch.setattr(config_module, 'SMTP_ALLOW_PLAINTEXT', False)
+    monkeypatch.setattr(smtplib, 'SMTP_SSL', lambda *args, **kwargs: (_ for _ in ()).throw(OSError("refused")))
+    # 只有25端口能连上，但不支持STARTTLS，不能被选中
+    assert smtp_transport.negotiate('smtp.example.com', timeout=1) is None
@@ -0,0 +1,67 @@
+# test_stream_monitor.py
+"""网络捕获：生成过程中就能读到数据流中已收到的内容，用于逐段暂存"""
+
+from stream_capture import KimiStreamParser, StreamMonitor
+
+
+class FakeCapture:
+    def __init__(self):
+        self.parser = KimiStreamParser()
+        self.seen = False
+
+    @property
+    def text(self):
+        return self.parser.text
+
+    @property
+    def error(self):
+        return self.parser.error
+
+    def poll(self):
+        return self.parser.done
+
+
+class FakeDeadline:
+    def check(self, what):
+        pass
+
+
+class FakeFallback:
+    hard_limit = 600
+    deadline = FakeDeadline()
+
+    def poll(self):
+        return False
+
+
+def _cmpl(text):
+    return f'data: {{"event":"cmpl","text":"{text}"}}\n\n'
+
+
+def test_partial_text_available_while_streaming():
+    capture = FakeCapture()
+    monitor = StreamMonitor(capture, FakeFallback(), first_chunk_timeout=30)
+    capture.seen = True
+    capture.parser.feed(_cmpl("① 第一段 **重点**\\n\\n② 第二段"))
+
+    assert not monitor.poll()
+    assert monitor.partial_text == "① 第一段 重点\n\n② 第二段"
+    # 完整回复仍然只在数据流结束后提供
+    assert monitor.captured_text == ""
+
+    capture.parser.feed(_cmpl("写完了") + 'data: {"event":"all_done"}\n\n')
+    assert monitor.poll()
+    assert monitor.captured_text == monitor.partial_text == "① 第一段 重点\n\n② 第二段写完了"
+
+
+def test_partial_text_empty_after_error_or_fallback():
+    capture = FakeCapture()
+    monitor = StreamMonitor(capture, FakeFallback(), first_chunk_timeout=0)
+    assert not monitor.poll()  # 没有观察到流式请求，回退到页面监测
+    capture.parser.feed(_cmpl("迟到的内容"))
+    assert monitor.partial_text == ""
+
+    capture = FakeCapture()
+    monitor = StreamMonitor(capture, FakeFallback(), first_chunk_timeout=30)
+    capture.parser.feed(_cmpl("部分") + 'data: {"event":"error","error_type":"rate_limit"}\n\n')
+    assert monitor.partial_text == ""
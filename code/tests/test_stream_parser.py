@@ -0,0 +1,65 @@
+# test_stream_parser.py
+"""KimiStreamParser：录制的SSE数据流按任意位置切块后都能还原出完整回复"""
+
+import codecs
+import os
+
+import pytest
+
+from stream_capture import KimiStreamParser, plain_text
+
+RECORDED_STREAM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'kimi_stream.sse')
+
+EXPECTED_TEXT = ("①【科技】(领域：人工智能) 大模型推理成本下降\n\n核心事实：多家厂商下调了接口价格，"
+                 "降幅约 **50%**。\n\n金句：慢慢来，比较快。")
+
+
+@pytest.fixture(scope='module')
+def recorded():
+    with open(RECORDED_STREAM, 'rb') as f:
+        return f.read()
+
+
+def _parse(data, chunk_size):
+    parser = KimiStreamParser()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for start in range(0, len(data), chunk_size):
+        parser.feed(decoder.decode(data[start:start + chunk_size]))
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    return parser
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 16, 64, 1 << 20])
+def test_recorded_stream_any_chunking(recorded, chunk_size):
+    # 小于一个汉字的切块会截断多字节字符和JSON行
+    parser = _parse(recorded, chunk_size)
+
+    assert parser.done and parser.error is None
+    assert parser.text == EXPECTED_TEXT
+    assert plain_text(parser.text).endswith("降幅约 50%。\n\n金句：慢慢来，比较快。")
+
+
+def test_ignores_comments_and_malformed_lines():
+    parser = KimiStreamParser()
+    count = parser.feed(': keep-alive\n\ndata: {broken\n\ndata: [1, 2]\n\n'
+                        'data: {"event":"cmpl","text":"好"}\n\n')
+
+    assert count == 1
+    assert parser.text == "好" and not parser.done
+
+
+def test_error_event_ends_stream():
+    parser = KimiStreamParser()
+    parser.feed('data: {"event":"cmpl","text":"部分"}\n\ndata: {"event":"error","error_type":"rate_limit"}\n\n')
+
+    assert parser.done
+    assert parser.error == "rate_limit"
+
+
+def test_last_line_without_newline_handled_on_close():
+    parser = KimiStreamParser()
+    parser.feed('data: {"event":"cmpl","text":"好"}\n\ndata: {"event":"all_done"}')
+    assert not parser.done
+    parser.close()
+    assert parser.done
@@ -0,0 +1,245 @@
+# web_archive.py
+"""
+静态网页归档模块
+与邮件发送并列的输出步骤：把每次推送写成一个静态网页（与邮件相同的样式），
+并维护目录页、按月归档页和Atom订阅源，可直接用任意静态网页服务器或对象存储发布
+
+每次只重建当天的页面、当天所在月份的归档页、目录页和订阅源；写入前比较内容哈希，
+内容未变化的文件不会重写，发布耗时不随归档天数增长
+
+目录结构（ARCHIVE_DIR 下）：
+    index.html              最近 ARCHIVE_INDEX_DAYS 天的推送和全部月份的链接
+    feed.xml                最近 ARCHIVE_FEED_ENTRIES 天的Atom订阅源
+    days/YYYY-MM-DD.html    每天的推送
+    months/YYYY-MM.html     每月的推送列表
+    _state/                 每月的条目清单（标题、摘要、内容哈希）
+"""
+
+import hashlib
+import html
+import json
+import os
+import threading
+from datetime import datetime
+from xml.sax.saxutils import escape as xml_escape
+import config
+from atomic_file import locked, write_text
+from html_formatter import generate_email_html
+from logger import get_logger
+
+logger = get_logger()
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web_archive')
+
+DEFAULT_TITLE = 'Kimi每日推送'
+
+_lock = threading.Lock()
+
+
+def _hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _summary(texts):
+    # 摘要只列出各问题的标题，解析失败时为空
+    from rollup import extract_topics
+
+    questions = []
+    for text in texts:
+        try:
+            questions.extend(topic['question'] for topic in extract_topics(text))
+        except Exception as e:
+            logger.debug("提取摘要失败: %s", e)
+    return questions
+
+
+class WebArchive:
+    """静态网页归档"""
+
+    def __init__(self, directory=None, base_url=None, title=None):
+        self.directory = directory or getattr(config, 'ARCHIVE_DIR', None) or ARCHIVE_DIR
+        self.base_url = (base_url if base_url is not None else getattr(config, 'ARCHIVE_BASE_URL', '')).rstrip('/')
+        self.title = title or getattr(config, 'ARCHIVE_TITLE', DEFAULT_TITLE)
+        self.index_days = getattr(config, 'ARCHIVE_INDEX_DAYS', 30)
+        self.feed_entries = getattr(config, 'ARCHIVE_FEED_ENTRIES', 20)
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def _write_if_changed(self, relative_path, content):
+        """
+        内容哈希与现有文件不同时才写入
+
+        Returns:
+            bool: 是否写入
+        """
+        path = self._path(relative_path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                if _hash(f.read()) == _hash(content):
+                    return False
+        except OSError:
+            pass
+        write_text(path, content)
+        return True
+
+    def _load_json(self, name, default):
+        try:
+            with open(self._path('_state', name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def _save_json(self, name, data):
+        self._write_if_changed(os.path.join('_state', name), json.dumps(data, ensure_ascii=False, indent=1))
+
+    def month_entries(self, month):
+        """
+        Returns:
+            dict: {日期: 条目}，条目包含 subject、summary、hash、published、updated
+        """
+        return self._load_json(f"{month}.json", {})
+
+    def months(self):
+        """
+        Returns:
+            dict: {月份: 该月的推送天数}
+        """
+        return self._load_json('months.json', {})
+
+    def recent_entries(self, limit):
+        """
+        从最近的月份往前读取，直到凑够 limit 条
+
+        Returns:
+            list[tuple[str, dict]]: (日期, 条目) 列表，最新的在前
+        """
+        entries = []
+        for month in sorted(self.months(), reverse=True):
+            entries.extend(sorted(self.month_entries(month).items(), reverse=True))
+            if len(entries) >= limit:
+                break
+        return entries[:limit]
+
+    def publish(self, subject, content, texts=(), day=None):
+        """
+        发布一天的推送
+
+        Args:
+            subject (str): 邮件主题，作为页面和订阅条目的标题
+            content (str): 格式化后的HTML内容（generate_email_html 的 content 参数）
+            texts (list[str]): 原始回复，用于生成目录和订阅源中的摘要
+            day (date): 推送日期，默认为今天
+
+        Returns:
+            list[str]: 实际写入的文件（相对路径），内容与已发布的相同时为空列表
+        """
+        day = day or datetime.now().date()
+        day_key = day.isoformat()
+        month = day_key[:7]
+        page = generate_email_html(
+            f'{content}\n<p class="content-para"><a href="../index.html">← 往期推送</a></p>',
+            date=datetime(day.year, day.month, day.day)
+        )
+        page_hash = _hash(page)
+
+        # 多个进程可能同时发布，清单的读改写在文件锁内进行
+        with _lock, locked(self._path('_state', 'months.json')):
+            entries = self.month_entries(month)
+            entry = entries.get(day_key)
+            if entry is not None and entry['hash'] == page_hash:
+                logger.debug("%s 的网页内容未变化，跳过发布", day_key)
+                return []
+
+            now = datetime.now().astimezone().isoformat(timespec='seconds')
+            entries[day_key] = {
+                'subject': subject,
+                'summary': _summary(texts),
+                'hash': page_hash,
+                'published': entry['published'] if entry else now,
+                'updated': now,
+            }
+            months = self.months()
+            months[month] = len(entries)
+
+            written = [path for path, content in (
+                (os.path.join('days', f"{day_key}.html"), page),
+                (os.path.join('months', f"{month}.html"), self._render_month(month, entries)),
+            ) if self._write_if_changed(path, content)]
+            # 页面写入成功后才保存清单，目录页和订阅源从清单读取最近的条目
+            self._save_json(f"{month}.json", entries)
+            self._save_json('months.json', months)
+            written.extend(path for path, content in (
+                ('index.html', self._render_index(months)),
+                ('feed.xml', self._render_feed()),
+            ) if self._write_if_changed(path, content))
+        logger.info(f"已发布到网页归档: {', '.join(written)}")
+        return written
+
+    def _entry_html(self, day_key, entry, prefix):
+        summary = ''.join(f'<br>• {html.escape(question)}' for question in entry['summary'])
+        return (f'<div class="qa-item"><a href="{prefix}days/{day_key}.html">{day_key}</a> '
+                f'{html.escape(entry["subject"])}{summary}</div>')
+
+    def _render_month(self, month, entries):
+        items = '\n'.join(self._entry_html(day_key, entry, '../')
+                          for day_key, entry in sorted(entries.items(), reverse=True))
+        content = f'{items}\n<p class="content-para"><a href="../index.html">← 往期推送</a></p>'
+        return generate_email_html(content, title=f"{self.title} {month}",
+                                   date=datetime.strptime(max(entries), '%Y-%m-%d'))
+
+    def _render_index(self, months):
+        recent = self.recent_entries(self.index_days)
+        items = '\n'.join(self._entry_html(day_key, entry, '') for day_key, entry in recent)
+        links = ' '.join(f'<a href="months/{month}.html">{month}（{count}）</a>'
+                         for month, count in sorted(months.items(), reverse=True))
+        content = (f'<div class="section-title">最近推送 · <a href="feed.xml">订阅</a></div>\n{items}\n'
+                   f'<div class="section-title">按月归档</div>\n<p class="content-para">{links}</p>')
+        return generate_email_html(content, title=self.title, date=datetime.strptime(recent[0][0], '%Y-%m-%d'))
+
+    def _url(self, relative_path):
+        return f"{self.base_url}/{relative_path}" if self.base_url else relative_path
+
+    def _render_feed(self):
+        recent = self.recent_entries(self.feed_entries)
+        lines = [
+            '<?xml version="1.0" encoding="utf-8"?>',
+            '<feed xmlns="http://www.w3.org/2005/Atom">',
+            f'  <title>{xml_escape(self.title)}</title>',
+            f'  <id>{xml_escape(self._url("feed.xml") if self.base_url else "urn:kimi-auto-mail:feed")}</id>',
+            f'  <link rel="alternate" href="{xml_escape(self._url("index.html"))}"/>',
+            f'  <link rel="self" href="{xml_escape(self._url("feed.xml"))}"/>',
+            # 订阅源的更新时间取自最新条目，内容未变化时文件保持不变
+            f'  <updated>{max(entry["updated"] for _, entry in recent)}</updated>',
+        ]
+        for day_key, entry in recent:
+            page_url = self._url(f"days/{day_key}.html")
+            summary = '\n'.join(f"• {question}" for question in entry['summary']) or entry['subject']
+            lines.extend([
+                '  <entry>',
+                f'    <title>{xml_escape(entry["subject"])}</title>',
+                f'    <id>{xml_escape(page_url if self.base_url else f"urn:kimi-auto-mail:{day_key}")}</id>',
+                f'    <link rel="alternate" type="text/html" href="{xml_escape(page_url)}"/>',
+                f'    <published>{entry["published"]}</published>',
+                f'    <updated>{entry["updated"]}</updated>',
+                f'    <summary>{xml_escape(summary)}</summary>',
+                '  </entry>',
+            ])
+        lines.append('</feed>')
+        return '\n'.join(lines) + '\n'
+
+
+def publish(subject, content, texts=(), day=None):
+    """
+    按配置发布到网页归档（未启用 config.ARCHIVE_ENABLED 时不做任何事，出错只记录日志，不影响邮件发送）
+
+    Returns:
+        list[str]: 实际写入的文件
+    """
+    if not getattr(config, 'ARCHIVE_ENABLED', False):
+        return []
+    try:
+        return WebArchive().publish(subject, content, texts, day)
+    except Exception as e:
+        logger.warning(f"发布到网页归档失败: {e}")
+        return []